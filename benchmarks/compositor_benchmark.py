@@ -0,0 +1,141 @@
+# --------------------------------------------------------------------------------------------------
+# Name:        Compositor Benchmark
+# Purpose:     Flattens frames of 16 and 32 layers with the compositor and by drawing every layer
+#              whole with QPainter, checking both give the same pixels. 'cached' is the compositor
+#              with the layer bounds surfaces keep between edits. Run from the repository root:
+#
+#                  python -m benchmarks.compositor_benchmark
+#--------------------------------------------------------------------------------------------------
+
+import time
+
+import numpy as np
+from PyQt5.QtGui import QGuiApplication, QPainter
+
+import src.helpers.utils as utils
+import src.model.compositor as compositor
+
+
+SIZE = 1024
+REPEAT = 5
+
+
+def _premultiplied(alpha, random):
+
+    channels = [(random.randint(0, 256, alpha.shape) * alpha + 127) // 255 for _ in range(3)]
+
+    return (alpha.astype(np.uint32) << 24) | (channels[0].astype(np.uint32) << 16) | \
+           (channels[1].astype(np.uint32) << 8) | channels[2].astype(np.uint32)
+
+
+def _sprite_layer(random):
+
+    # An opaque blob with soft edges covering a small part of the frame, like a
+    # body part or an effect on its own layer
+    y, x = np.mgrid[0:SIZE, 0:SIZE]
+
+    radius = random.randint(SIZE // 16, SIZE // 6)
+    center_x, center_y = random.randint(radius, SIZE - radius, 2)
+
+    distance = np.hypot(x - center_x, y - center_y)
+
+    alpha = np.clip((radius - distance) * 32, 0, 255).astype(np.uint32)
+
+    return _premultiplied(alpha, random)
+
+
+def _dense_layer(random):
+
+    alpha = random.randint(0, 256, (SIZE, SIZE)).astype(np.uint32)
+    alpha[random.rand(SIZE, SIZE) < 0.3] = 255
+
+    return _premultiplied(alpha, random)
+
+
+def _to_image(pixels):
+
+    return utils.array_to_image(pixels).copy()
+
+
+def _to_array(image):
+
+    return utils.image_to_array(image, writable=False).copy()
+
+
+def _qpainter_flatten(images, opacities, modes):
+
+    result = utils.create_image(SIZE, SIZE)
+
+    painter = QPainter(result)
+
+    for image, opacity, mode in zip(images, opacities, modes):
+        painter.setCompositionMode(compositor.COMPOSITION_MODES[mode])
+        painter.setOpacity(opacity)
+        painter.drawImage(0, 0, image)
+
+    painter.end()
+
+    return result
+
+
+def _time(function, *args):
+
+    best = float('inf')
+    result = None
+
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - start)
+
+    return best * 1000.0, result
+
+
+def run():
+
+    application = QGuiApplication([])
+
+    random = np.random.RandomState(0)
+
+    print('{0}x{0} frames, best of {1} runs (ms)'.format(SIZE, REPEAT))
+    print('{0:<28}{1:>12}{2:>10}{3:>10}{4:>8}'.format('frame', 'compositor', 'cached',
+                                                      'qpainter', 'exact'))
+
+    for label, make_layer, count in (('16 sprite layers', _sprite_layer, 16),
+                                     ('32 sprite layers', _sprite_layer, 32),
+                                     ('16 sprite layers, blended', _sprite_layer, 16),
+                                     ('16 dense layers', _dense_layer, 16)):
+
+        arrays = [make_layer(random) for _ in range(count)]
+        images = [_to_image(pixels) for pixels in arrays]
+
+        if 'blended' in label:
+            modes = [compositor.BLEND_MODES[index % len(compositor.BLEND_MODES)]
+                     for index in range(count)]
+            opacities = [1.0 if index % 3 else 0.6 for index in range(count)]
+        else:
+            modes = [compositor.BLEND_NORMAL] * count
+            opacities = [1.0] * count
+
+        buffers = [image.constBits().asstring(image.byteCount()) for image in images]
+
+        layers = list(zip(buffers, opacities, modes, [None] * count))
+
+        cached_layers = list(zip(buffers, opacities, modes,
+                                 [compositor.content_bounds(pixels) for pixels in arrays]))
+
+        compositor_time, flattened = _time(compositor.flatten, layers, SIZE, SIZE)
+        cached_time, cached = _time(compositor.flatten, cached_layers, SIZE, SIZE)
+        qpainter_time, reference = _time(_qpainter_flatten, images, opacities, modes)
+
+        exact = np.array_equal(_to_array(flattened), _to_array(reference)) and \
+            np.array_equal(_to_array(cached), _to_array(reference))
+
+        print('{0:<28}{1:>12.1f}{2:>10.1f}{3:>10.1f}{4:>8}'.format(
+            label, compositor_time, cached_time, qpainter_time, 'yes' if exact else 'NO'))
+
+    del application
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,147 @@
+# --------------------------------------------------------------------------------------------------
+# Name:        Ink Benchmark
+# Purpose:     Draws the same strokes and rect batches with every ink, once through a QPainter with
+#              one blit per dab and once through the batched blit_mask / blit_rects path, checking
+#              both give the same pixels. Run from the repository root:
+#
+#                  python -m benchmarks.ink_benchmark
+#--------------------------------------------------------------------------------------------------
+
+import time
+
+import numpy as np
+from PyQt5.QtGui import QColor, QGuiApplication, QPainter
+
+import src.helpers.drawing as drawing
+import src.helpers.utils as utils
+import src.model.brushes as brushes
+import src.model.inks as inks
+
+
+SIZE = 512
+REPEAT = 5
+
+
+def _surface(random):
+
+    # Half the surface empty, the rest a few flat colors like pixel art
+    palette = np.array([0, 0, 0xFF203040, 0xFFC0A080, 0x80402010, 0xFFFFFFFF], np.uint32)
+
+    return palette[random.randint(0, len(palette), (SIZE, SIZE))]
+
+
+def _stroke(random, count):
+
+    steps = random.randint(-12, 13, (count, 2))
+
+    return [tuple(point) for point in np.clip(np.cumsum(steps, axis=0) + SIZE // 2, 0,
+                                              SIZE - 1).tolist()]
+
+
+def _time(function, pixels):
+
+    best = float('inf')
+    result = None
+
+    for _ in range(REPEAT):
+
+        target = pixels.copy()
+
+        start = time.perf_counter()
+        function(target)
+        best = min(best, time.perf_counter() - start)
+
+        result = target
+
+    return best * 1000.0, result
+
+
+def _row(label, painter_time, batched_time, exact):
+
+    print('{0:<36}{1:>10.2f}{2:>10.2f}{3:>9.1f}x{4:>7}'.format(
+        label, painter_time, batched_time, painter_time / batched_time,
+        'yes' if exact else 'NO'))
+
+
+def run():
+
+    application = QGuiApplication([])
+
+    random = np.random.RandomState(0)
+
+    pixels = _surface(random)
+
+    stroke = _stroke(random, 400)
+
+    # Rects of up to 16x16 pixels, each in its own cell of a 16 pixel grid so that one blit
+    # per rect draws each pixel once, like blit_rects
+    cells = np.argwhere(random.rand(SIZE // 16, SIZE // 16) < 0.5) * 16
+    sizes = random.randint(1, 17, (len(cells), 2))
+
+    rects = np.column_stack([cells[:, ::-1] + random.randint(0, 17 - sizes), sizes])
+
+    all_inks = (inks.Solid(), inks.Eraser(), inks.Dither(), inks.Lighten(), inks.Darken(),
+                inks.ReplaceColor())
+
+    print('{0}x{0} surface, 400 point strokes and {2} rects, best of {1} runs (ms)'.format(
+        SIZE, REPEAT, len(rects)))
+    print('{0:<36}{1:>10}{2:>10}{3:>10}{4:>7}'.format('ink', 'painter', 'batched', 'speedup',
+                                                      'exact'))
+
+    for color in (QColor(200, 40, 90), QColor(40, 200, 90, 140)):
+
+        for brush_name, size, spacing in (('Square', 1, 100), ('Square', 4, 100),
+                                          ('Circle', 8, 25)):
+
+            rect, mask, block_size = drawing.clip_mask(
+                *brushes.get(brush_name).rasterize([(x - x % size, y - y % size)
+                                                    for x, y in stroke], size, spacing),
+                SIZE, SIZE)
+
+            for ink in all_inks:
+
+                def painter_path(target):
+                    ink.begin_stroke(target, *stroke[0])
+                    inks.Ink.blit_mask(ink, target, rect, mask, block_size, color)
+
+                def batched_path(target):
+                    ink.begin_stroke(target, *stroke[0])
+                    ink.blit_mask(target, rect, mask, block_size, color)
+
+                painter_time, reference = _time(painter_path, pixels)
+                batched_time, result = _time(batched_path, pixels)
+
+                _row('{0} {1} {2}px {3}'.format(ink.name, brush_name, size,
+                                                'opaque' if color.alpha() == 255 else 'alpha'),
+                     painter_time, batched_time, np.array_equal(reference, result))
+
+        for ink in all_inks:
+
+            def painter_rects(target):
+
+                ink.begin_stroke(target, *rects[0, :2])
+
+                image = utils.array_to_image(target)
+
+                painter = QPainter(image)
+
+                for x, y, w, h in rects.tolist():
+                    ink.blit(x, y, w, h, color, painter)
+
+                painter.end()
+
+            def batched_rects(target):
+                ink.begin_stroke(target, *rects[0, :2])
+                ink.blit_rects(target, rects, color)
+
+            painter_time, reference = _time(painter_rects, pixels)
+            batched_time, result = _time(batched_rects, pixels)
+
+            _row('{0} rects {1}'.format(ink.name, 'opaque' if color.alpha() == 255 else 'alpha'),
+                 painter_time, batched_time, np.array_equal(reference, result))
+
+    del application
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,134 @@
+# --------------------------------------------------------------------------------------------------
+# Name:        Packer Benchmark
+# Purpose:     Packs thousands of sprite sized rectangles with the MaxRects and Skyline packers and
+#              with the original RectanglePacker, checking no two placements overlap. Run from the
+#              repository root:
+#
+#                  python -m benchmarks.packer_benchmark
+#--------------------------------------------------------------------------------------------------
+
+import time
+
+import numpy as np
+
+import src.helpers.packing as packing
+from src.helpers.packer import RectanglePacker
+
+
+MAX_SIZE = 4096
+
+
+def _sizes(random, count):
+
+    # Cropped animation frames: mostly similar sizes, with some wide and tall ones
+    widths = random.randint(12, 64, count)
+    heights = random.randint(12, 64, count)
+
+    stretched = random.rand(count) < 0.1
+    widths[stretched] *= 3
+
+    return list(zip(widths.tolist(), heights.tolist()))
+
+
+def _overlapping(rects):
+
+    rects = np.array(rects, np.int64).reshape(-1, 4)
+
+    order = np.argsort(rects[:, 0])
+    rects = rects[order]
+
+    for index in range(len(rects)):
+
+        x, y, w, h = rects[index]
+
+        # Only rects starting left of this one's right edge can overlap it
+        others = rects[index + 1:np.searchsorted(rects[:, 0], x + w)]
+
+        if ((others[:, 1] < y + h) & (others[:, 1] + others[:, 3] > y)).any():
+            return True
+
+    return False
+
+
+def _legacy(sizes):
+
+    packer = RectanglePacker(MAX_SIZE, MAX_SIZE)
+
+    rects = []
+
+    for width, height in sizes:
+
+        point = packer.pack(width, height)
+
+        if point is None:
+            return None
+
+        rects.append((point.x, point.y, width, height))
+
+    return rects, packer.actual_packing_area_width(), packer.actual_packing_area_height()
+
+
+def _packer(name, sizes, sort, **options):
+
+    packer = packing.create_packer(name, MAX_SIZE, MAX_SIZE, **options)
+
+    if sort:
+        placements = packer.pack_all(sizes)
+    else:
+        placements = [packer.pack(width, height) for width, height in sizes]
+
+    if placements is None or None in placements:
+        return None
+
+    rects = [(placement.x, placement.y, placement.width, placement.height)
+             for placement in placements]
+
+    return rects, packer.width, packer.height
+
+
+def run():
+
+    random = np.random.RandomState(0)
+
+    print('{0:<34}{1:>7}{2:>10}{3:>13}{4:>8}{5:>8}'.format('packer', 'rects', 'ms', 'sheet',
+                                                          'fill', 'valid'))
+
+    for count in (500, 2000, 5000):
+
+        sizes = _sizes(random, count)
+
+        area = sum(width * height for width, height in sizes)
+
+        runs = [('RectanglePacker', lambda: _legacy(sizes))] if count <= 2000 else []
+
+        for name in sorted(packing.PACKERS):
+            runs.append((name, lambda name=name: _packer(name, sizes, False)))
+            runs.append((name + ' sorted', lambda name=name: _packer(name, sizes, True)))
+            runs.append((name + ' sorted rotated', lambda name=name: _packer(
+                name, sizes, True, allow_rotation=True)))
+
+        runs.append(('maxrects-bssf padded extruded', lambda: _packer(
+            'maxrects-bssf', sizes, True, padding=2, extrude=1)))
+
+        for label, function in runs:
+
+            start = time.perf_counter()
+            result = function()
+            elapsed = (time.perf_counter() - start) * 1000.0
+
+            if result is None:
+                print('{0:<34}{1:>7}{2:>10.0f}{3:>13}'.format(label, count, elapsed, 'no fit'))
+                continue
+
+            rects, width, height = result
+
+            inside = all(x >= 0 and y >= 0 and x + w <= width and y + h <= height
+                         for x, y, w, h in rects)
+
+            print('{0:<34}{1:>7}{2:>10.0f}{3:>13}{4:>8.1%}{5:>8}'.format(
+                label, count, elapsed, '{0}x{1}'.format(width, height), area / (width * height),
+                'yes' if inside and not _overlapping(rects) else 'NO'))
+
+
+if __name__ == '__main__':
+    run()
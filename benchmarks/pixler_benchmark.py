@@ -0,0 +1,136 @@
+# --------------------------------------------------------------------------------------------------
+# Name:        Pixler Benchmark
+# Purpose:     Compares the NumPy pixel kernels against the compiled quickpixler extension on
+#              4096x4096 surfaces, and times fills of 2048x2048 tilesets. Run from the
+#              repository root:
+#
+#                  python -m benchmarks.pixler_benchmark
+#--------------------------------------------------------------------------------------------------
+
+import time
+
+import numpy as np
+
+import src.helpers.pixler as pixler
+
+try:
+    import src.helpers.quickpixler as quickpixler
+except ImportError:
+    quickpixler = None
+
+
+SIZE = 4096
+FILL_SIZE = 2048
+REPEAT = 5
+
+
+def _blank_surface(size=SIZE):
+
+    return bytearray(size * size * 4)
+
+
+def _tiled_surface():
+
+    buffer = _blank_surface()
+
+    pixels = pixler.pixel_view(buffer, SIZE, SIZE)
+    pixels[::7, :] = 0xFF000000
+    pixels[:, ::13] = 0xFF000000
+
+    return buffer
+
+
+def _maze_surface():
+
+    buffer = _blank_surface()
+
+    pixels = pixler.pixel_view(buffer, SIZE, SIZE)
+    pixels[::2, :] = 0xFF000000
+    pixels[::4, 1] = 0
+    pixels[2::4, -2] = 0
+
+    return buffer
+
+
+def _tileset_surface():
+
+    # 16x16 tiles outlined by one pixel lines
+    buffer = _blank_surface(FILL_SIZE)
+
+    pixels = pixler.pixel_view(buffer, FILL_SIZE, FILL_SIZE)
+    pixels[::16, :] = 0xFF000000
+    pixels[:, ::16] = 0xFF000000
+
+    return buffer
+
+
+def _noise_surface():
+
+    buffer = _blank_surface(FILL_SIZE)
+
+    pixels = pixler.pixel_view(buffer, FILL_SIZE, FILL_SIZE)
+    pixels[:] = np.random.RandomState(0).randint(0, 2, pixels.shape) * 0xFF000000
+
+    return buffer
+
+
+def _time(function, make_buffer, *args):
+
+    best = float('inf')
+
+    for _ in range(REPEAT):
+
+        buffer = make_buffer()
+
+        start = time.perf_counter()
+        function(buffer, *args)
+        best = min(best, time.perf_counter() - start)
+
+    return best * 1000.0
+
+
+def run():
+
+    cases = [
+        ('floodFill  blank', 'floodFill', _blank_surface, (5, 5, SIZE, SIZE, 255, 0, 0)),
+        ('floodFill  tiled', 'floodFill', _tiled_surface, (1, 1, SIZE, SIZE, 255, 0, 0)),
+        ('floodFill  maze', 'floodFill', _maze_surface, (0, 1, SIZE, SIZE, 255, 0, 0)),
+        ('movePixels', 'movePixels', _blank_surface, (SIZE, SIZE, 3, 2)),
+    ]
+
+    print('{0}x{0} surfaces, best of {1} runs (ms)'.format(SIZE, REPEAT))
+    print('{0:<20}{1:>12}{2:>12}'.format('kernel', 'numpy', 'cython'))
+
+    for label, name, make_buffer, args in cases:
+
+        numpy_time = _time(getattr(pixler, name), make_buffer, *args)
+
+        if quickpixler is not None:
+            cython_time = '{0:.1f}'.format(_time(getattr(quickpixler, name), make_buffer, *args))
+        else:
+            cython_time = 'n/a'
+
+        print('{0:<20}{1:>12.1f}{2:>12}'.format(label, numpy_time, cython_time))
+
+    fills = [
+        ('blank', lambda: _blank_surface(FILL_SIZE), (5, 5), {}),
+        ('tileset, a tile', _tileset_surface, (5, 5), {}),
+        ('tileset, lines', _tileset_surface, (0, 0), {}),
+        ('noise', _noise_surface, (5, 5), {}),
+        ('noise, 8-connected', _noise_surface, (5, 5), {'diagonals': True}),
+        ('noise, global', _noise_surface, (5, 5), {'contiguous': False})
+    ]
+
+    print()
+    print('{0}x{0} fills, best of {1} runs (ms)'.format(FILL_SIZE, REPEAT))
+
+    for label, make_buffer, (x, y), options in fills:
+
+        fill_time = _time(lambda buffer: pixler.fill(buffer, x, y, FILL_SIZE, FILL_SIZE,
+                                                     (255, 0, 0, 255), **options), make_buffer)
+
+        print('{0:<20}{1:>12.1f}'.format(label, fill_time))
+
+
+if __name__ == '__main__':
+    run()
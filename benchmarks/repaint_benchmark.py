@@ -0,0 +1,136 @@
+# --------------------------------------------------------------------------------------------------
+# Name:        Repaint Benchmark
+# Purpose:     Draws a pen stroke on one layer of a 1024x1024 frame of 8 dense layers, repainting
+#              the area of every dab through DisplaySpriteObject.paint at 32x zoom, like the Canvas
+#              does while drawing. Compares bringing the cached frame composite up to date over
+#              the dab with compositing the whole frame again, and checks both end up with the
+#              same pixels. Run from the repository root:
+#
+#                  python -m benchmarks.repaint_benchmark
+#--------------------------------------------------------------------------------------------------
+
+import time
+
+import numpy as np
+from PyQt5.QtCore import QRectF
+from PyQt5.QtGui import QColor, QPainter
+from PyQt5.QtWidgets import QApplication, QStyleOptionGraphicsItem
+
+import src.helpers.utils as utils
+import src.model.brushes as brushes
+import src.model.compositor as compositor
+import src.model.inks as inks
+from src.model.sprite import Sprite
+from src.view.display_sprite_object import DisplaySpriteObject
+
+
+SIZE = 1024
+LAYERS = 8
+DABS = 200
+DAB_SIZE = 4
+ZOOM = 32
+
+
+def _make_sprite():
+
+    sprite = Sprite.create(SIZE, SIZE)
+
+    frame = sprite.current_animation.current_frame
+
+    for _ in range(LAYERS - 1):
+        frame.add_surface(utils.create_image(SIZE, SIZE))
+
+    random = np.random.RandomState(0)
+
+    for surface in frame.surfaces:
+
+        alpha = random.randint(0, 256, (SIZE, SIZE)).astype(np.uint32)
+        alpha[random.rand(SIZE, SIZE) < 0.3] = 255
+
+        gray = (random.randint(0, 256, (SIZE, SIZE)) * alpha + 127) // 255
+
+        surface.pixel_array[:] = (alpha << 24) | (gray.astype(np.uint32) * 0x010101)
+        surface.mark_dirty()
+
+    return sprite
+
+
+def _stroke(full_repaint):
+
+    sprite = _make_sprite()
+
+    frame = sprite.current_animation.current_frame
+    surface = frame.surfaces[LAYERS // 2]
+
+    display = DisplaySpriteObject()
+    display.set_sprite(sprite)
+
+    origin = display.boundingRect().topLeft()
+
+    viewport = utils.create_image(DAB_SIZE * ZOOM * 2, DAB_SIZE * ZOOM * 2)
+
+    brush = brushes.get('Square')
+    ink = inks.Solid()
+    color = QColor(200, 40, 40)
+
+    option = QStyleOptionGraphicsItem()
+
+    # The frame is on screen before the stroke starts
+    frame.flatten()
+
+    times = []
+
+    for index in range(DABS):
+
+        x = y = 100 + index * DAB_SIZE // 2
+
+        start = time.perf_counter()
+
+        rect, mask, size = brush.rasterize([(x, y)], DAB_SIZE)
+
+        ink.blit_mask(surface.pixel_array, rect, mask, size, color)
+        surface.mark_dirty(rect)
+
+        if full_repaint:
+            sprite.composites.discard(frame)
+
+        option.exposedRect = QRectF(rect).translated(origin)
+
+        painter = QPainter(viewport)
+        painter.scale(ZOOM, ZOOM)
+        painter.translate(-option.exposedRect.topLeft())
+
+        display.paint(painter, option)
+
+        painter.end()
+
+        times.append(time.perf_counter() - start)
+
+    return np.median(times) * 1000.0, utils.image_to_array(frame.flatten()).copy(), frame
+
+
+def run():
+
+    application = QApplication([])
+
+    print('{0}x{0} frame, {1} dense layers, {2} dabs of {3}x{3} at {4}x zoom'.format(
+        SIZE, LAYERS, DABS, DAB_SIZE, ZOOM))
+    print('{0:<28}{1:>16}'.format('repaint', 'ms per dab'))
+
+    full_time, full_pixels, _ = _stroke(True)
+    patched_time, patched_pixels, frame = _stroke(False)
+
+    reference_image = compositor.flatten(frame.layers(), SIZE, SIZE)
+    reference = utils.image_to_array(reference_image)
+
+    exact = np.array_equal(patched_pixels, reference) and np.array_equal(full_pixels, reference)
+
+    print('{0:<28}{1:>16.2f}'.format('full composite', full_time))
+    print('{0:<28}{1:>16.2f}'.format('composite over the dab', patched_time))
+    print('exact: {0}'.format('yes' if exact else 'NO'))
+
+    del application
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,130 @@
+# --------------------------------------------------------------------------------------------------
+# Name:        Reuse Benchmark
+# Purpose:     Builds a sprite where most frames are copies of a few drawn ones, like idle holds,
+#              and compares pixel memory, save time, file size and export time with the copies
+#              sharing their pixels and with every copy holding pixels of its own. Run from the
+#              repository root:
+#
+#                  python -m benchmarks.reuse_benchmark
+#--------------------------------------------------------------------------------------------------
+
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from PyQt5.QtGui import QGuiApplication
+
+from src.model.sprite import Sprite, ExportJob
+
+
+SIZE = 256
+DRAWN_FRAMES = 20
+COPIES = 15
+
+
+def _make_sprite():
+
+    sprite = Sprite.create(SIZE, SIZE)
+
+    animation = sprite.current_animation
+
+    random = np.random.RandomState(0)
+
+    for index in range(DRAWN_FRAMES):
+
+        if index > 0:
+            animation.add_empty_frame()
+
+        surface = animation.last_frame.current_surface
+
+        # A blob of noisy pixels, so frames trim and compress to something real
+        x, y = random.randint(0, SIZE // 2, 2)
+
+        surface.pixel_array[y:y + SIZE // 2, x:x + SIZE // 2] = random.randint(
+            0, 8, (SIZE // 2, SIZE // 2)).astype(np.uint32) * 0x1F1F1F | 0xFF000000
+        surface.mark_dirty()
+
+    # Every drawn frame is held for a few more frames
+    for index in reversed(range(DRAWN_FRAMES)):
+
+        for _ in range(COPIES):
+            animation._frames.insert(index + 1, animation.frame_at(index).clone())
+
+    return sprite
+
+
+def _surfaces(sprite):
+
+    return [surface for animation in sprite.animations for frame in animation.frames
+            for surface in frame.surfaces]
+
+
+def _pixel_bytes(sprite):
+
+    slots = {id(surface._slot): surface._slot.size for surface in _surfaces(sprite)}
+
+    return sum(slots.values())
+
+
+def _measure(sprite, directory):
+
+    # A new file every time, so each run is a full save
+    directory = tempfile.mkdtemp(dir=directory)
+
+    path = os.path.join(directory, 'sprite.spr')
+
+    start = time.perf_counter()
+    Sprite.save(sprite, path)
+    save_time = time.perf_counter() - start
+
+    file_size = os.path.getsize(path)
+
+    start = time.perf_counter()
+    ExportJob(sprite, directory).run_now()
+    export_time = time.perf_counter() - start
+
+    return _pixel_bytes(sprite), save_time * 1000.0, file_size, export_time * 1000.0
+
+
+def run():
+
+    application = QGuiApplication([])
+
+    directory = tempfile.mkdtemp()
+
+    try:
+
+        print('{0} frames of {1}x{1}, {2} of them drawn'.format(
+            DRAWN_FRAMES * (COPIES + 1), SIZE, DRAWN_FRAMES))
+        print('{0:<12}{1:>12}{2:>12}{3:>12}{4:>12}'.format('pixels', 'memory KB', 'save ms',
+                                                           'file KB', 'export ms'))
+
+        sprite = _make_sprite()
+
+        shared = _measure(sprite, directory)
+
+        # Touching every surface for writing gives each its own copy of the pixels, as
+        # cloned frames used to have. Nothing knows the copies are the same until they are
+        # hashed again on save
+        for surface in _surfaces(sprite):
+            surface.pixel_data
+            surface.mark_dirty()
+
+        copied = _measure(sprite, directory)
+
+        for label, (memory, save_time, file_size, export_time) in (('copied', copied),
+                                                                   ('shared', shared)):
+            print('{0:<12}{1:>12.0f}{2:>12.1f}{3:>12.0f}{4:>12.1f}'.format(
+                label, memory / 1024.0, save_time, file_size / 1024.0, export_time))
+
+    finally:
+
+        shutil.rmtree(directory)
+
+    del application
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,131 @@
+# --------------------------------------------------------------------------------------------------
+# Name:        Save Benchmark
+# Purpose:     Times a full save of a 200 frame sprite with a growing number of encoding workers,
+#              and an incremental save after editing a single frame. Run from the repository root:
+#
+#                  python -m benchmarks.save_benchmark
+#--------------------------------------------------------------------------------------------------
+
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from PyQt5.QtGui import QGuiApplication
+
+from src.model.sprite import Sprite, SaveJob
+from src.helpers.workers import default_worker_count
+
+
+SIZE = 512
+FRAMES = 200
+REPEAT = 3
+
+
+def _make_sprite():
+
+    sprite = Sprite.create(SIZE, SIZE)
+
+    for _ in range(FRAMES - 1):
+        sprite.current_animation.add_empty_frame()
+
+    random = np.random.RandomState(0)
+
+    # Noisy pixels, so compression has real work to do
+    for frame in sprite.current_animation.frames:
+
+        surface = frame.current_surface
+
+        pixels = np.frombuffer(surface.pixel_data, np.uint32)
+        pixels[:] = random.randint(0, 8, pixels.size).astype(np.uint32) * 0x1F1F1F | 0xFF000000
+
+    return sprite
+
+
+def _surfaces(sprite):
+
+    return [surface for frame in sprite.current_animation.frames for surface in frame.surfaces]
+
+
+def _time(sprite, path, workers):
+
+    best = float('inf')
+
+    for _ in range(REPEAT):
+
+        # Start from scratch every time so each run is a full save
+        if os.path.exists(path):
+            os.remove(path)
+
+        for surface in _surfaces(sprite):
+            surface.mark_dirty()
+
+        job = SaveJob(sprite, path, max_workers=workers)
+
+        start = time.perf_counter()
+        job.run_now()
+        best = min(best, time.perf_counter() - start)
+
+    return best * 1000.0
+
+
+def _time_incremental(sprite, path):
+
+    best = float('inf')
+
+    Sprite.save(sprite, path)
+
+    surface = _surfaces(sprite)[FRAMES // 2]
+
+    for _ in range(REPEAT):
+
+        surface.mark_dirty()
+
+        start = time.perf_counter()
+        Sprite.save(sprite, path)
+        best = min(best, time.perf_counter() - start)
+
+    return best * 1000.0
+
+
+def run():
+
+    application = QGuiApplication([])
+
+    sprite = _make_sprite()
+
+    directory = tempfile.mkdtemp()
+
+    try:
+
+        print('{0} frames of {1}x{1}, best of {2} runs (ms)'.format(FRAMES, SIZE, REPEAT))
+        print('{0:<12}{1:>12}{2:>12}'.format('workers', 'save', 'speedup'))
+
+        workers = 1
+        baseline = None
+
+        while workers <= default_worker_count():
+
+            elapsed = _time(sprite, os.path.join(directory, 'sprite{0}.spr'.format(workers)),
+                            workers)
+
+            baseline = baseline or elapsed
+
+            print('{0:<12}{1:>12.1f}{2:>12.2f}'.format(workers, elapsed, baseline / elapsed))
+
+            workers *= 2
+
+        elapsed = _time_incremental(sprite, os.path.join(directory, 'incremental.spr'))
+
+        print('{0:<12}{1:>12.1f}'.format('1 dirty', elapsed))
+
+    finally:
+
+        shutil.rmtree(directory)
+
+    del application
+
+
+if __name__ == '__main__':
+    run()
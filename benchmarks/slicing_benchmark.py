@@ -0,0 +1,96 @@
+# --------------------------------------------------------------------------------------------------
+# Name:        Slicing Benchmark
+# Purpose:     Imports a 4096x4096 sprite sheet holding 2000 sprites, slicing it by grid and by
+#              finding its opaque regions, and checks every sprite ends up in a frame of its own.
+#              Sprites are solid ellipses, or ellipses riddled with holes for a worst case with
+#              many runs of pixels to label. Run from the repository root:
+#
+#                  python -m benchmarks.slicing_benchmark
+#--------------------------------------------------------------------------------------------------
+
+import time
+
+import numpy as np
+from PyQt5.QtGui import QGuiApplication
+
+import src.helpers.utils as utils
+from src.model.sprite import Sprite
+
+
+SHEET_SIZE = 4096
+CELL_SIZE = 91
+SPRITES = 2000
+
+
+def _make_sheet(holes):
+
+    sheet = utils.create_image(SHEET_SIZE, SHEET_SIZE)
+
+    pixels = utils.image_to_array(sheet)
+
+    random = np.random.RandomState(0)
+
+    columns = SHEET_SIZE // CELL_SIZE
+
+    for index in range(SPRITES):
+
+        x = index % columns * CELL_SIZE
+        y = index // columns * CELL_SIZE
+
+        # Clear of the cell's edges so sprites don't touch
+        width, height = random.randint(CELL_SIZE // 3, CELL_SIZE - 4, 2)
+
+        ys, xs = np.ogrid[-1.0:1.0:height * 1j, -1.0:1.0:width * 1j]
+
+        blob = xs ** 2 + ys ** 2 <= 1.0
+
+        # Holes everywhere but along the middle row and column, which span the sprite, so
+        # any loose pieces are within its bounds and go to its frame
+        if holes:
+            blob &= random.rand(height, width) < 0.8
+            blob[height // 2] = True
+            blob[:, width // 2] = True
+
+        left = x + 2 + random.randint(0, CELL_SIZE - 4 - width + 1)
+        top = y + 2 + random.randint(0, CELL_SIZE - 4 - height + 1)
+
+        pixels[top:top + height, left:left + width][blob] = 0xFF000000 | index
+
+    return sheet
+
+
+def run():
+
+    application = QGuiApplication([])
+
+    solid = _make_sheet(False)
+    holed = _make_sheet(True)
+
+    print('{0}x{0} sheet with {1} sprites'.format(SHEET_SIZE, SPRITES))
+    print('{0:<18}{1:>10}{2:>10}{3:>10}'.format('slicing', 'frames', 'ms', 'valid'))
+
+    runs = [('grid', lambda: Sprite.import_from_spritesheet(solid, CELL_SIZE, CELL_SIZE)),
+            ('regions', lambda: Sprite.import_from_spritesheet(solid)),
+            ('regions, holes', lambda: Sprite.import_from_spritesheet(holed))]
+
+    for label, function in runs:
+
+        start = time.perf_counter()
+        sprite = function()
+        elapsed = (time.perf_counter() - start) * 1000.0
+
+        frames = sprite.current_animation.frames
+
+        # Sprites were colored after their index, so each frame holds exactly the one it is for
+        valid = len(frames) == SPRITES and all(
+            np.array_equal(np.unique(frame.current_surface.const_pixel_array),
+                           [0, 0xFF000000 | index]) for index, frame in enumerate(frames))
+
+        print('{0:<18}{1:>10}{2:>10.0f}{3:>10}'.format(label, len(frames), elapsed,
+                                                      'yes' if valid else 'NO'))
+
+    del application
+
+
+if __name__ == '__main__':
+    run()
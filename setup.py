@@ -33,5 +33,5 @@ setup(
     version="0.6",
     description="A Sprite editor and animator",
     executables=[exe],
-    options=options, requires=['PyQt5', 'PIL', 'numpy']
+    options=options, requires=['PyQt5', 'numpy']
 )
\ No newline at end of file
@@ -18,9 +18,10 @@ from PyQt5.QtWidgets import QApplication, QDialog, QShortcut, QMessageBox, QStyl
 
 from src.model.application_settings import ApplicationSettings
 from src.view.main_window import MainWindow
-from src.model.sprite import Sprite
+from src.model.sprite import Sprite, SaveJob, ExportJob
 from src.model.resources_cache import ResourcesCache
 import src.model.appdata as appdata
+import src.model.brushes as brushes
 import src.helpers.utils as utils
 
 
@@ -29,7 +30,6 @@ class Application(QApplication):
 
     # TODO add indication if file is modified / saved
     # TODO Decide on resizing logistic
-    # TODO Add tolerance to Filler
     # TODO Layers: Add Change Opacity, Visibility
     # TODO Add Import from Spritesheets
     # TODO Finish Basic Ink Functionality
@@ -78,6 +78,12 @@ class Application(QApplication):
 
         self._currentSprite = None
 
+        self._saveJob = None
+        self._exportJob = None
+
+        # (sprite, path) to save again once the running save finishes
+        self._pendingSave = None
+
         self._connect_with_window_actions()
 
         # Load Stylesheet
@@ -148,12 +154,24 @@ class Application(QApplication):
 
         last_opened_folder = self._settings.settings_map["last_folder_path"].value
 
-        image_files = utils.show_open_files_dialog('Select one or more images:',
-                                                   'PNG Image (*.png)', last_opened_folder)
+        image_files = utils.show_open_files_dialog('Select one or more images, or an atlas:',
+                                                   'PNG Image or Atlas (*.png *.json)',
+                                                   last_opened_folder)
 
         if len(image_files) > 0:
 
-            sprite = Sprite.import_from_image_files(image_files)
+            try:
+
+                # An atlas is given by the JSON document of any of its pages
+                if utils.get_file_extension(image_files[0]) == '.json':
+                    sprite = Sprite.import_from_atlas(image_files[0])
+                else:
+                    sprite = Sprite.import_from_image_files(image_files)
+
+            except Exception as e:
+
+                self._raise_error('importSprite', e)
+                return
 
             if sprite:
 
@@ -183,7 +201,29 @@ class Application(QApplication):
                                                     last_opened_folder)
 
         if save_path is not None and len(save_path) > 0:
-            Sprite.save(self._currentSprite, save_path)
+
+            # Saving happens in the background; the sprite can keep being edited meanwhile.
+            # Edits made since a running save started are saved right after it
+            if self._saveJob is not None and self._saveJob.is_running:
+
+                self._pendingSave = (self._currentSprite, save_path)
+                self._mainWindow.show_progress('Saving again after the current save', 0, 0)
+
+                return
+
+            self._start_save(self._currentSprite, save_path)
+
+    def _start_save(self, sprite, save_path):
+
+        self._saveJob = SaveJob(sprite, save_path)
+
+        self._saveJob.progressChanged.connect(self._on_save_progress)
+        self._saveJob.finished.connect(self._on_save_finished)
+        self._saveJob.failed.connect(self._on_save_failed)
+
+        self._mainWindow.show_progress(self._saveJob.label, 0, 0)
+
+        self._saveJob.start()
 
     def save_sprite_as(self):
 
@@ -197,7 +237,17 @@ class Application(QApplication):
                                                     last_opened_path)
 
         if new_save_path:
-            Sprite.save(self._currentSprite, new_save_path)
+
+            self._wait_for_save()
+
+            try:
+
+                Sprite.save(self._currentSprite, new_save_path)
+
+            except Exception as e:
+
+                self._raise_error('saveSpriteAs', e)
+                return
 
             self.close_sprite()
 
@@ -218,21 +268,28 @@ class Application(QApplication):
 
         if target_folder:
 
-            try:
+            # Exporting happens in the background and can be cancelled from the status bar
+            if self._exportJob is not None and self._exportJob.is_running:
+                return
 
-                # Sprite.export(self._current_sprite, target_folder)
-                Sprite.export_to_spritesheet(self._currentSprite, target_folder)
+            self._exportJob = ExportJob(
+                self._currentSprite, target_folder,
+                frame_duration=self._mainWindow.animation_display.animation_speed)
 
-            except Exception as e:
+            self._exportJob.progressChanged.connect(self._on_export_progress)
+            self._exportJob.finished.connect(self._on_export_finished)
+            self._exportJob.failed.connect(self._on_export_failed)
+            self._exportJob.cancelled.connect(self._on_export_cancelled)
 
-                self._raise_error('exportSprite', e)
-                return
+            self._mainWindow.show_progress(self._exportJob.label, 0, 0, cancellable=True)
 
-            utils.show_info_message(self._mainWindow, 'Info', 'Sprite Exported Successfuly.')
+            self._exportJob.start()
 
     def close_sprite(self):
 
         # TODO Save Sprite Before Close Test
+        self._wait_for_save()
+
         self._mainWindow.canvas.unload_sprite()
         self._mainWindow.animation_display.unload_sprite()
         self._mainWindow.layer_manager.clear()
@@ -245,6 +302,11 @@ class Application(QApplication):
 
     def terminate(self):
 
+        self._cancel_export()
+
+        if self._exportJob is not None:
+            self._exportJob.wait()
+
         self.removeEventFilter(self._mainWindow)
         self.close_sprite()
         self._mainWindow.close()
@@ -267,6 +329,7 @@ class Application(QApplication):
         self._mainWindow.actionQuit.triggered.connect(self.terminate)
 
         self._mainWindow.closed.connect(self._on_window_close)
+        self._mainWindow.progressCancelled.connect(self._cancel_export)
 
     # -------------------------------------------------------------------------
 
@@ -301,6 +364,10 @@ class Application(QApplication):
 
         ResourcesCache.register_resource('ToolCursor1', tool_cursor_1)
 
+        # Brushes #
+
+        brushes.load_folder(appdata.brushes_folder)
+
     def _init_shortcuts(self):
 
         shortcut_data = appdata.shortcuts
@@ -349,6 +416,14 @@ class Application(QApplication):
 
                 target.clear()
 
+            elif shortcut_name == 'UNDO':
+
+                target.undo()
+
+            elif shortcut_name == 'REDO':
+
+                target.redo()
+
         # ANIMATION MANAGER
 
         elif holder == 'ANIMATION_MANAGER':
@@ -387,6 +462,96 @@ class Application(QApplication):
             elif shortcut_name == 'TOOL_SLOT_3':
                 target.switch_tool_slot(3)
 
+    def _wait_for_save(self):
+
+        if self._saveJob is not None:
+            self._saveJob.wait()
+            self._saveJob = None
+
+            self._mainWindow.hide_progress()
+
+        # Nothing waits for a queued save's signals here, so it is saved right away
+        if self._pendingSave is not None:
+
+            sprite, save_path = self._pendingSave
+            self._pendingSave = None
+
+            try:
+                Sprite.save(sprite, save_path)
+            except Exception as e:
+                self._raise_error('saveSprite', e)
+
+    def _release_save_job(self):
+
+        # Signals are queued, so a newer save may already be running by the time they arrive.
+        # The job sending them is done, although its thread may take a moment to end
+        if self._saveJob is not None and self._saveJob is self.sender():
+            self._saveJob.wait()
+            self._saveJob = None
+
+        if self._saveJob is None and self._pendingSave is not None:
+
+            sprite, save_path = self._pendingSave
+            self._pendingSave = None
+
+            self._start_save(sprite, save_path)
+
+    def _on_save_progress(self, done, total):
+
+        if self._saveJob is not None:
+            self._mainWindow.show_progress(self._saveJob.label, done, total)
+
+    def _on_save_finished(self, sprite_file):
+
+        self._release_save_job()
+
+        if self._saveJob is None:
+            self._mainWindow.hide_progress('Saved {0}'.format(sprite_file.path))
+
+    def _on_save_failed(self, message):
+
+        self._release_save_job()
+
+        if self._saveJob is None:
+            self._mainWindow.hide_progress()
+
+        self._raise_error('saveSprite', message)
+
+    def _cancel_export(self):
+
+        if self._exportJob is not None:
+            self._exportJob.cancel()
+
+    def _release_export_job(self):
+
+        if self._exportJob is not None and not self._exportJob.is_running:
+            self._exportJob = None
+
+    def _on_export_progress(self, done, total):
+
+        if self._exportJob is not None:
+            self._mainWindow.show_progress(self._exportJob.label, done, total, cancellable=True)
+
+    def _on_export_finished(self, file_paths):
+
+        directory = self._exportJob.directory if self._exportJob is not None else ''
+
+        self._release_export_job()
+        self._mainWindow.hide_progress('Exported {0} files to {1}'.format(len(file_paths),
+                                                                          directory))
+
+    def _on_export_failed(self, message):
+
+        self._release_export_job()
+        self._mainWindow.hide_progress()
+
+        self._raise_error('exportSprite', message)
+
+    def _on_export_cancelled(self):
+
+        self._release_export_job()
+        self._mainWindow.hide_progress('Export cancelled')
+
     def _on_window_close(self):
 
         self._settings.write_settings()
@@ -0,0 +1,212 @@
+# --------------------------------------------------------------------------------------------------
+# Name:        Batch
+# Purpose:     Headless command line export of sprite files, for build pipelines. Sprites matching
+#              the given globs are exported in parallel worker processes, each running an
+#              offscreen QGuiApplication, to texture atlases or per frame PNGs:
+#
+#                  python -m src.batch -o build/sprites "assets/**/*.spr"
+#                  python -m src.batch -o build/frames --format frames --jobs 4 hero.spr
+#
+#              Every sprite goes to its own folder under the output one, named after its path
+#              relative to the inputs' common folder, so output is the same from run to run.
+#              Exits with 0 once everything is exported, 1 if any sprite failed and 2 on bad
+#              arguments or when nothing matched.
+#--------------------------------------------------------------------------------------------------
+
+import argparse
+import glob
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from src.helpers.packing import PACKERS
+from src.helpers.workers import default_worker_count
+import src.model.atlas as atlas
+
+
+FORMAT_ATLAS = 'atlas'
+FORMAT_FRAMES = 'frames'
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+
+# QGuiApplication of the process, once started
+_application = None
+
+
+def _parse_arguments(argv):
+
+    parser = argparse.ArgumentParser(prog='python -m src.batch',
+                                     description='Exports sprite files without the editor.')
+
+    parser.add_argument('patterns', nargs='+', metavar='PATTERN',
+                        help='sprite files or globs; ** matches any number of folders')
+    parser.add_argument('-o', '--output', required=True, help='folder to export to')
+    parser.add_argument('--format', choices=(FORMAT_ATLAS, FORMAT_FRAMES), default=FORMAT_ATLAS,
+                        help='a texture atlas with JSON metadata per sprite, or a folder of '
+                             'PNGs per animation (default: %(default)s)')
+    parser.add_argument('-j', '--jobs', type=int, default=default_worker_count(),
+                        help='worker processes (default: %(default)s)')
+
+    parser.add_argument('--incremental', action='store_true',
+                        help='with --format frames, only write frames changed since the last '
+                             'export to the same folder')
+
+    atlas_options = parser.add_argument_group('atlas options')
+
+    atlas_options.add_argument('--max-size', type=int, help='largest page side')
+    atlas_options.add_argument('--packer', default=atlas.DEFAULT_PACKER, choices=sorted(PACKERS))
+    atlas_options.add_argument('--padding', type=int, default=0)
+    atlas_options.add_argument('--extrude', type=int, default=0)
+    atlas_options.add_argument('--rotate', action='store_true', dest='allow_rotation',
+                               help='let frames be turned to pack tighter')
+    atlas_options.add_argument('--power-of-two', action='store_true')
+    atlas_options.add_argument('--frame-duration', type=int, default=60,
+                               help='milliseconds (default: %(default)s)')
+
+    arguments = parser.parse_args(argv)
+
+    if arguments.jobs < 1:
+        parser.error('--jobs must be at least 1')
+
+    return arguments
+
+
+def find_sprites(patterns):
+    """
+    Sprite files matching patterns, sorted and without repeats.
+    """
+
+    paths = set()
+
+    for pattern in patterns:
+
+        if os.path.isfile(pattern):
+            paths.add(os.path.abspath(pattern))
+            continue
+
+        paths.update(os.path.abspath(path) for path in glob.glob(pattern, recursive=True)
+                     if os.path.isfile(path))
+
+    return sorted(paths)
+
+
+def output_directories(paths, output):
+    """
+    Folder under output for each of paths: its path relative to the folder all of them are in,
+    without the extension.
+    """
+
+    root = os.path.commonpath([os.path.dirname(path) for path in paths])
+
+    return [os.path.join(output, os.path.splitext(os.path.relpath(path, root))[0])
+            for path in paths]
+
+
+def _start_worker():
+
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+    from PyQt5.QtGui import QGuiApplication
+
+    global _application
+
+    if QGuiApplication.instance() is None:
+        _application = QGuiApplication([sys.argv[0]])
+
+
+def _export(task):
+    """
+    Exports one sprite; runs in a worker process. Returns (path, error message or None).
+    """
+
+    path, directory, export_format, incremental, options, max_workers = task
+
+    from src.model.sprite import Sprite
+
+    try:
+
+        sprite = Sprite.load_from_file(path)
+
+        os.makedirs(directory, exist_ok=True)
+
+        if export_format == FORMAT_ATLAS:
+            Sprite.export_to_spritesheet(sprite, directory, max_workers=max_workers, **options)
+        else:
+            Sprite.export(sprite, directory, incremental, max_workers)
+
+    except Exception as e:
+
+        return path, '{0}: {1}'.format(type(e).__name__, e)
+
+    return path, None
+
+
+def main(argv=None):
+
+    arguments = _parse_arguments(argv)
+
+    paths = find_sprites(arguments.patterns)
+
+    if len(paths) == 0:
+        print('No sprite files match {0}'.format(' '.join(arguments.patterns)),
+              file=sys.stderr)
+        return EXIT_USAGE
+
+    options = {
+        'max_size': arguments.max_size,
+        'packer': arguments.packer,
+        'padding': arguments.padding,
+        'extrude': arguments.extrude,
+        'allow_rotation': arguments.allow_rotation,
+        'power_of_two': arguments.power_of_two,
+        'frame_duration': arguments.frame_duration
+    }
+
+    jobs = min(arguments.jobs, len(paths))
+
+    # With a process per sprite, every export keeps to one thread
+    max_workers = 1 if jobs > 1 else None
+
+    tasks = [(path, directory, arguments.format, arguments.incremental, options, max_workers)
+             for path, directory in zip(paths, output_directories(paths,
+                                                                  arguments.output))]
+
+    if jobs == 1:
+
+        _start_worker()
+
+        results = map(_export, tasks)
+
+    else:
+
+        # Qt doesn't survive being forked, so workers start from scratch
+        executor = ProcessPoolExecutor(max_workers=jobs,
+                                       mp_context=multiprocessing.get_context('spawn'),
+                                       initializer=_start_worker)
+
+        results = executor.map(_export, tasks, chunksize=max(1, len(tasks) // (jobs * 8)))
+
+    failed = 0
+
+    # Reported in the order of paths, whatever order sprites finish in
+    for (path, error), (_, directory, _, _, _, _) in zip(results, tasks):
+
+        if error is None:
+            print('{0} -> {1}'.format(path, directory))
+        else:
+            failed += 1
+            print('{0} failed: {1}'.format(path, error), file=sys.stderr)
+
+    if jobs > 1:
+        executor.shutdown()
+
+    print('Exported {0} of {1} sprites'.format(len(paths) - failed, len(paths)))
+
+    return EXIT_FAILED if failed > 0 else EXIT_OK
+
+
+if __name__ == '__main__':
+    sys.exit(main())
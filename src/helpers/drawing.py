@@ -8,7 +8,8 @@
 # Copyright:   (c) Rafael 2013
 # Licence:     <your licence>
 #--------------------------------------------------------------------------------------------------
-from PyQt5.QtCore import Qt
+import numpy as np
+from PyQt5.QtCore import Qt, QRect
 from PyQt5.QtGui import QPainter
 
 
@@ -26,37 +27,220 @@ def erase_area_painter_ready(x, y, w, h, painter):
     if painter.compositionMode() != QPainter.CompositionMode_Clear:
         painter.setCompositionMode(QPainter.CompositionMode_Clear)
 
-    painter.setCompositionMode(QPainter.CompositionMode_Clear)
     painter.fillRect(x, y, w, h, Qt.transparent)
 
 
-def draw_line(start, end, size, ink, color, painter):
-    x1 = start.x()
-    y1 = start.y()
-    x2 = end.x()
-    y2 = end.y()
+def rasterize_stroke(points, size, skip_first=False, corners=None):
+    """
+    Rasterizes a stroke through points in one vectorised pass. Every segment gets one
+    size x size stamp per size step along its longest axis, at the same places a Bresenham
+    line of blits would put them.
+
+    points: sequence of (x, y) stamp positions, a multiple of size apart.
+    skip_first: leave out the stamp at the first point, already drawn by the previous stroke.
+    corners: CornerFilter leaving out the corner stamps of L shaped steps, for one stamp thin
+    lines. It holds back the last stamp until the next call goes on with the stroke, and a
+    call with no points ends the stroke.
+    returns: (rect, mask) with the QRect holding all stamps and a bool array with one entry
+    per size x size block of rect, set where there is a stamp. (QRect(), None) if there is
+    nothing to draw.
+    """
+
+    coordinates = np.array(points, np.int64).reshape(-1, 2)
+
+    stamps = coordinates
+
+    if len(coordinates) > 0:
+
+        origin = coordinates[0]
+
+        # Everything is walked in stamps, then scaled up by size
+        units = (coordinates - origin) // size
+
+        stamps = origin + _walk(units, np.abs(units[1:] - units[:-1]).max(axis=1)) * size
+
+    if skip_first:
+        stamps = stamps[1:]
+
+    if corners is not None:
+        stamps = corners.filter(stamps, size)
+
+    if len(stamps) == 0:
+        return QRect(), None
+
+    low = stamps.min(axis=0)
+    high = stamps.max(axis=0) + size
+
+    # Stamps of a stroke are all a multiple of size apart
+    blocks = (stamps - low) // size
+
+    mask = np.zeros(((high[1] - low[1]) // size, (high[0] - low[0]) // size), np.bool_)
+    mask[blocks[:, 1], blocks[:, 0]] = True
+
+    return QRect(int(low[0]), int(low[1]), mask.shape[1] * size, mask.shape[0] * size), mask
+
+
+def rasterize_dabs(points, dab, spacing, skip_first=False, corners=None):
+    """
+    Rasterizes a stroke through points by stamping a dab every spacing pixels along each
+    segment, in one vectorised pass.
+
+    dab: (h, w) bool array of the pixels a single dab covers.
+    Other arguments and the returned value are as for rasterize_stroke, with the mask
+    holding one entry per pixel.
+    """
+
+    coordinates = np.array(points, np.int64).reshape(-1, 2)
+
+    if not dab.any():
+        return QRect(), None
+
+    positions = coordinates
+
+    if len(coordinates) > 0:
+
+        steps = -(-np.abs(coordinates[1:] - coordinates[:-1]).max(axis=1) // spacing)
+
+        positions = _walk(coordinates, steps)
+
+    if skip_first:
+        positions = positions[1:]
+
+    if corners is not None:
+        positions = corners.filter(positions, spacing)
+
+    if len(positions) == 0:
+        return QRect(), None
+
+    dab_ys, dab_xs = np.nonzero(dab)
+
+    low = positions.min(axis=0)
+    high = positions.max(axis=0) + (dab.shape[1], dab.shape[0])
+
+    mask = np.zeros((high[1] - low[1], high[0] - low[0]), np.bool_)
+    mask[(positions[:, 1] - low[1])[:, None] + dab_ys,
+         (positions[:, 0] - low[0])[:, None] + dab_xs] = True
+
+    return QRect(int(low[0]), int(low[1]), mask.shape[1], mask.shape[0]), mask
+
+
+class CornerFilter(object):
+    """
+    Leaves out the corners of L shaped steps from a stroke rasterized over many calls, one
+    per batch of mouse moves. Whether the last position of a call is a corner is only known
+    once the stroke goes on, so it is held back until the next call, or the end of the stroke.
+    """
+
+    def __init__(self):
+
+        # The last position stamped, then the one held back if any
+        self._held = np.empty((0, 2), np.int64)
+
+    def filter(self, positions, step):
+        """
+        Positions to stamp out of the next (n, 2) positions along the stroke, step apart
+        along either axis in an L shaped step. No positions end the stroke, giving back the
+        one held back.
+        """
+
+        if len(positions) == 0:
+
+            ending = self._held[1:]
+
+            self._held = np.empty((0, 2), np.int64)
+
+            return ending
+
+        kept = _remove_corners(np.concatenate((self._held, positions)), step)
+
+        # The last stamped position leads the kept ones, and the first of a stroke can't be
+        # a corner, having nothing before it
+        first = 1 if len(self._held) > 0 else 0
+        last = max(len(kept) - 1, 1)
+
+        self._held = kept[-2:]
+
+        return kept[first:last]
+
+
+def _walk(points, steps):
+
+    # All positions along the segments between points, taking steps[i] evenly spaced steps
+    # from points[i] to points[i + 1]. Halves round away from the segment's start, as
+    # Bresenham does
+    starts = points[:-1]
+    deltas = points[1:] - starts
+
+    segments = np.repeat(np.arange(len(steps)), steps)
+
+    n = steps[segments][:, None]
+    t = np.arange(1, len(segments) + 1)[:, None] - (np.cumsum(steps) - steps)[segments][:, None]
+
+    delta = deltas[segments]
+
+    positions = np.empty((len(segments) + 1, 2), np.int64)
+    positions[0] = points[0]
+    positions[1:] = starts[segments] + np.sign(delta) * ((2 * t * np.abs(delta) + n) // (2 * n))
+
+    return positions
+
+
+def _remove_corners(positions, step=1):
+
+    # A position is an L corner when it is one orthogonal step from both of its neighbours,
+    # which are diagonal to each other. Dropping every other corner of a run leaves the line
+    # connected, the same as dropping them one at a time while walking the line
+    if len(positions) < 3:
+        return positions
+
+    before = np.abs(positions[1:-1] - positions[:-2]).sum(axis=1)
+    after = np.abs(positions[2:] - positions[1:-1]).sum(axis=1)
+    across = np.abs(positions[2:] - positions[:-2])
+
+    corner = np.zeros(len(positions), np.bool_)
+    corner[1:-1] = ((before == step) & (after == step) & (across[:, 0] == step) &
+                    (across[:, 1] == step))
+
+    # Position of every corner within its run of consecutive corners
+    run_start = np.maximum.accumulate(np.where(~corner, np.arange(len(corner)), 0))
+    index_in_run = np.arange(len(corner)) - run_start - 1
+
+    return positions[~(corner & (index_in_run % 2 == 0))]
+
+
+def clip_mask(rect, mask, size, width, height):
+    """
+    Clips a rect and block mask, as returned by rasterize_stroke, to a width x height
+    surface. Returns (rect, mask, size); blocks cut by the surface's edges are split into
+    single pixels, so size comes back as 1 then.
+    """
+
+    clipped = rect.intersected(QRect(0, 0, width, height))
+
+    if clipped.isEmpty():
+        return QRect(), None, size
 
-    dx = abs(x2 - x1)
-    dy = abs(y2 - y1)
+    if clipped == rect:
+        return rect, mask, size
 
-    sx = size if (x1 < x2) else -size
-    sy = size if (y1 < y2) else -size
+    mask = mask.repeat(size, axis=0).repeat(size, axis=1)
 
-    err = dx - dy
+    x = clipped.x() - rect.x()
+    y = clipped.y() - rect.y()
 
-    while True:
+    return clipped, mask[y:y + clipped.height(), x:x + clipped.width()], 1
 
-        ink.blit(x1, y1, size, size, color, painter)
 
-        if x1 == x2 and y1 == y2:
-            break
+def block_view(pixels, rect, size):
+    """
+    View of the pixels of rect as a (rows, columns, size, size) array of size x size
+    blocks, so a block mask selects whole blocks at once.
+    """
 
-        e2 = err * 2
+    region = pixels[rect.top():rect.top() + rect.height(),
+                    rect.left():rect.left() + rect.width()]
 
-        if e2 >= -dy:
-            err -= dy
-            x1 += sx
+    rows = rect.height() // size
+    columns = rect.width() // size
 
-        if e2 <= dx:
-            err += dx
-            y1 += sy
+    return region.reshape(rows, size, columns, size).swapaxes(1, 2)
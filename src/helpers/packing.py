@@ -0,0 +1,484 @@
+# --------------------------------------------------------------------------------------------------
+# Name:        Packing
+# Purpose:     Rectangle packers for sprite sheets. MaxRects keeps the list of maximal free
+#              rectangles left in the sheet, Skyline the outline of the packed rectangles' tops.
+#              Neither keeps a coverage bitmap. Sheets start small and grow up to a maximum size
+#--------------------------------------------------------------------------------------------------
+
+import numpy as np
+
+
+BEST_SHORT_SIDE_FIT = 'bssf'
+BEST_AREA_FIT = 'baf'
+
+
+def next_power_of_two(value):
+
+    return 1 << max(0, int(value) - 1).bit_length()
+
+
+def largest_first(sizes):
+    """
+    Indices of a list of (width, height) sizes by longest side, then area, largest first.
+    """
+
+    return sorted(range(len(sizes)), key=lambda index: (-max(sizes[index]),
+                                                        -sizes[index][0] * sizes[index][1]))
+
+
+class Placement(object):
+    """
+    Where a rectangle was packed. x, y, width and height are the rectangle's own area, inside
+    any padding and extrusion around it. Rotated rectangles were turned 90 degrees clockwise,
+    so width and height are swapped from the size that was asked for.
+    """
+
+    def __init__(self, x, y, width, height, rotated=False):
+
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.rotated = rotated
+
+    def __repr__(self):
+
+        return 'Placement({0}, {1}, {2}, {3}{4})'.format(self.x, self.y, self.width,
+                                                        self.height,
+                                                        ', rotated' if self.rotated else '')
+
+
+class Packer(object):
+    """
+    Packs rectangles one at a time into a sheet of up to max_width x max_height.
+
+    allow_rotation: rectangles may be turned 90 degrees when they fit better that way.
+    padding: empty pixels between rectangles.
+    extrude: pixels around every rectangle kept for repeating its edges.
+    power_of_two: report power of two sheet sizes.
+    """
+
+    def __init__(self, max_width, max_height, allow_rotation=False, padding=0, extrude=0,
+                 power_of_two=False):
+
+        self._maxWidth = max_width
+        self._maxHeight = max_height
+
+        self._allowRotation = allow_rotation
+        self._padding = padding
+        self._extrude = extrude
+        self._powerOfTwo = power_of_two
+
+        # Padding only goes between rectangles, so the sheet has room for it past its edges
+        self._binWidth = 0
+        self._binHeight = 0
+
+        self._usedWidth = 0
+        self._usedHeight = 0
+
+        self._placements = []
+
+    @property
+    def width(self):
+        return self._sheet_size(self._usedWidth, self._maxWidth)
+
+    @property
+    def height(self):
+        return self._sheet_size(self._usedHeight, self._maxHeight)
+
+    @property
+    def placements(self):
+        return self._placements
+
+    @property
+    def occupancy(self):
+        """
+        Fraction of the sheet covered by rectangles.
+        """
+
+        area = self.width * self.height
+
+        if area == 0:
+            return 0.0
+
+        return sum(placement.width * placement.height for placement in self._placements) / area
+
+    def pack(self, width, height):
+        """
+        Places a width x height rectangle, growing the sheet as needed. Returns its
+        Placement, or None if it doesn't fit within the maximum sheet size.
+        """
+
+        margin = 2 * self._extrude + self._padding
+
+        padded_width = width + margin
+        padded_height = height + margin
+
+        if self._binWidth == 0:
+            self._resize(min(next_power_of_two(padded_width), self._maxWidth + self._padding),
+                         min(next_power_of_two(padded_height), self._maxHeight + self._padding))
+
+        while True:
+
+            found = self._find(padded_width, padded_height)
+
+            if found is not None:
+                break
+
+            if not self._grow():
+                return None
+
+        x, y, rotated = found
+
+        if rotated:
+            width, height = height, width
+            padded_width, padded_height = padded_height, padded_width
+
+        self._place(x, y, padded_width, padded_height)
+
+        self._usedWidth = max(self._usedWidth, x + padded_width - self._padding)
+        self._usedHeight = max(self._usedHeight, y + padded_height - self._padding)
+
+        placement = Placement(x + self._extrude, y + self._extrude, width, height, rotated)
+
+        self._placements.append(placement)
+
+        return placement
+
+    def pack_all(self, sizes):
+        """
+        Packs a list of (width, height) sizes, largest first, which packs tighter than taking
+        them as they come. Returns the Placements in the order of sizes, or None if they don't
+        all fit.
+        """
+
+        placements = [None] * len(sizes)
+
+        for index in largest_first(sizes):
+
+            placement = self.pack(*sizes[index])
+
+            if placement is None:
+                return None
+
+            placements[index] = placement
+
+        return placements
+
+    def _sheet_size(self, used, maximum):
+
+        if self._powerOfTwo and used > 0:
+            return min(next_power_of_two(used), maximum)
+
+        return used
+
+    def _grow(self):
+
+        max_width = self._maxWidth + self._padding
+        max_height = self._maxHeight + self._padding
+
+        can_grow_width = self._binWidth < max_width
+        can_grow_height = self._binHeight < max_height
+
+        # The smaller side grows first, keeping sheets close to square. Power of two sheets
+        # double; others grow by a quarter, so rectangles aren't spread over much more room
+        # than they need
+        def grown(size, maximum):
+
+            if self._powerOfTwo:
+                return min(size * 2, maximum)
+
+            return min(size + max(1, size // 4), maximum)
+
+        if can_grow_height and (not can_grow_width or self._binHeight < self._binWidth):
+            self._resize(self._binWidth, grown(self._binHeight, max_height))
+
+        elif can_grow_width:
+            self._resize(grown(self._binWidth, max_width), self._binHeight)
+
+        else:
+            return False
+
+        return True
+
+    # To be implemented by subclasses
+
+    def _resize(self, width, height):
+        raise NotImplementedError
+
+    def _find(self, width, height):
+        """
+        Returns the (x, y, rotated) to place a width x height rectangle at, or None.
+        """
+
+        raise NotImplementedError
+
+    def _place(self, x, y, width, height):
+        raise NotImplementedError
+
+
+class MaxRectsPacker(Packer):
+    """
+    MaxRects packer (Jukka Jylanki, "A Thousand Ways to Pack the Bin"). The free space is kept
+    as the list of all maximal free rectangles, which may overlap; each rectangle goes in the
+    free rectangle it fits best according to the heuristic.
+    """
+
+    def __init__(self, max_width, max_height, heuristic=BEST_SHORT_SIDE_FIT, **options):
+
+        super(MaxRectsPacker, self).__init__(max_width, max_height, **options)
+
+        self._heuristic = heuristic
+
+        # (n, 4) array of free rectangles as left, top, right, bottom
+        self._free = np.empty((0, 4), np.int64)
+
+    def _resize(self, width, height):
+
+        free = self._free.copy()
+
+        # Free rectangles reaching the old edges now extend to the new ones
+        free[free[:, 2] == self._binWidth, 2] = width
+        free[free[:, 3] == self._binHeight, 3] = height
+
+        new_space = [[self._binWidth, 0, width, height], [0, self._binHeight, width, height]]
+
+        free = np.vstack([free, np.array(new_space, np.int64)])
+
+        free = free[(free[:, 2] > free[:, 0]) & (free[:, 3] > free[:, 1])]
+
+        self._free = free[~_contained(free, free)]
+
+        self._binWidth = width
+        self._binHeight = height
+
+    def _find(self, width, height):
+
+        free = self._free
+
+        free_width = free[:, 2] - free[:, 0]
+        free_height = free[:, 3] - free[:, 1]
+
+        best = None
+
+        for rotated, w, h in ((False, width, height), (True, height, width)):
+
+            if rotated and (not self._allowRotation or width == height):
+                break
+
+            fits = np.flatnonzero((free_width >= w) & (free_height >= h))
+
+            if len(fits) == 0:
+                continue
+
+            left_x = free_width[fits] - w
+            left_y = free_height[fits] - h
+
+            short_side = np.minimum(left_x, left_y)
+            long_side = np.maximum(left_x, left_y)
+
+            if self._heuristic == BEST_AREA_FIT:
+                primary = free_width[fits] * free_height[fits] - w * h
+                secondary = short_side
+            else:
+                primary = short_side
+                secondary = long_side
+
+            # Ties go to the free rectangle closest to the top left
+            choice = np.lexsort((free[fits, 0], free[fits, 1], secondary, primary))[0]
+
+            score = (primary[choice], secondary[choice])
+
+            if best is None or score < best[0]:
+                index = fits[choice]
+                best = (score, (int(free[index, 0]), int(free[index, 1]), rotated))
+
+        return best[1] if best is not None else None
+
+    def _place(self, x, y, width, height):
+
+        free = self._free
+
+        right = x + width
+        bottom = y + height
+
+        hit = (free[:, 0] < right) & (free[:, 2] > x) & (free[:, 1] < bottom) & \
+              (free[:, 3] > y)
+
+        split = free[hit]
+        kept = free[~hit]
+
+        # What is left of every free rectangle the new one overlaps, on each of its sides
+        pieces = []
+
+        for mask, column, value in ((split[:, 0] < x, 2, x), (split[:, 2] > right, 0, right),
+                                    (split[:, 1] < y, 3, y), (split[:, 3] > bottom, 1, bottom)):
+
+            piece = split[mask].copy()
+            piece[:, column] = value
+
+            pieces.append(piece)
+
+        pieces = np.vstack(pieces)
+
+        # Pieces lie inside a rectangle that no kept one was inside of, so only pieces can be
+        # redundant
+        redundant = _contained(pieces, pieces) | _contained(pieces, kept, strict=False)
+
+        self._free = np.vstack([kept, pieces[~redundant]])
+
+
+def _contained(rects, others, strict=True):
+    """
+    Which of rects lie inside one of others. With strict, rects also in others are only
+    dropped if they come after an identical copy of themselves.
+    """
+
+    if len(rects) == 0 or len(others) == 0:
+        return np.zeros(len(rects), np.bool_)
+
+    inside = (rects[:, np.newaxis, 0] >= others[np.newaxis, :, 0]) & \
+             (rects[:, np.newaxis, 1] >= others[np.newaxis, :, 1]) & \
+             (rects[:, np.newaxis, 2] <= others[np.newaxis, :, 2]) & \
+             (rects[:, np.newaxis, 3] <= others[np.newaxis, :, 3])
+
+    if strict:
+
+        # A rect is always inside itself; of identical rects the first one is kept
+        equal = (rects[:, np.newaxis, :] == others[np.newaxis, :, :]).all(axis=2)
+
+        indices = np.arange(len(rects))
+
+        inside &= ~equal | (indices[:, np.newaxis] > indices[np.newaxis, :])
+
+    return inside.any(axis=1)
+
+
+class SkylinePacker(Packer):
+    """
+    Bottom left skyline packer. Only the outline of the packed rectangles' tops is kept, so
+    gaps below it are lost, but packing stays fast and sheets fill from the top left.
+    """
+
+    def __init__(self, max_width, max_height, **options):
+
+        super(SkylinePacker, self).__init__(max_width, max_height, **options)
+
+        # [x, y, width] segments of the outline, left to right
+        self._skyline = []
+
+    def _resize(self, width, height):
+
+        if width > self._binWidth:
+            self._skyline.append([self._binWidth, 0, width - self._binWidth])
+
+        self._binWidth = width
+        self._binHeight = height
+
+    def _find(self, width, height):
+
+        best = None
+
+        for rotated, w, h in ((False, width, height), (True, height, width)):
+
+            if rotated and (not self._allowRotation or width == height):
+                break
+
+            for index in range(len(self._skyline)):
+
+                y = self._fit(index, w, h)
+
+                if y is None:
+                    continue
+
+                score = (y + h, self._skyline[index][0])
+
+                if best is None or score < best[0]:
+                    best = (score, (self._skyline[index][0], y, rotated))
+
+        return best[1] if best is not None else None
+
+    def _fit(self, index, width, height):
+
+        skyline = self._skyline
+
+        x = skyline[index][0]
+
+        if x + width > self._binWidth:
+            return None
+
+        # The rectangle rests on the highest segment it spans
+        y = 0
+        remaining = width
+
+        while remaining > 0:
+
+            y = max(y, skyline[index][1])
+
+            if y + height > self._binHeight:
+                return None
+
+            remaining -= skyline[index][2]
+            index += 1
+
+        return y
+
+    def _place(self, x, y, width, height):
+
+        skyline = self._skyline
+
+        index = 0
+
+        while skyline[index][0] != x:
+            index += 1
+
+        skyline.insert(index, [x, y + height, width])
+
+        # Segments now under the rectangle are trimmed or dropped
+        right = x + width
+
+        next_index = index + 1
+
+        while next_index < len(skyline) and skyline[next_index][0] < right:
+
+            segment = skyline[next_index]
+
+            segment_right = segment[0] + segment[2]
+
+            if segment_right <= right:
+                del skyline[next_index]
+            else:
+                segment[2] = segment_right - right
+                segment[0] = right
+                break
+
+        # Neighbours at the same height become one segment
+        index = 0
+
+        while index < len(skyline) - 1:
+
+            if skyline[index][1] == skyline[index + 1][1]:
+                skyline[index][2] += skyline[index + 1][2]
+                del skyline[index + 1]
+            else:
+                index += 1
+
+
+PACKERS = {
+
+    'maxrects-bssf': lambda max_width, max_height, **options: MaxRectsPacker(
+        max_width, max_height, BEST_SHORT_SIDE_FIT, **options),
+
+    'maxrects-baf': lambda max_width, max_height, **options: MaxRectsPacker(
+        max_width, max_height, BEST_AREA_FIT, **options),
+
+    'skyline': SkylinePacker
+}
+
+
+def create_packer(name, max_width, max_height, **options):
+    """
+    Creates one of the PACKERS by name, with the options taken by Packer.
+    """
+
+    return PACKERS[name](max_width, max_height, **options)
@@ -0,0 +1,358 @@
+# --------------------------------------------------------------------------------------------------
+# Name:        Pixler
+# Purpose:     Portable NumPy implementation of the quickpixler pixel kernels. Works in place,
+#              without copies, on any writable buffer holding Format_ARGB32_Premultiplied pixels
+#              (e.g. the sip.voidptr exposed by Surface.pixel_data)
+#--------------------------------------------------------------------------------------------------
+
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+import src.helpers.slicing as slicing
+
+
+def pixel_view(buffer, w, h):
+
+    return np.frombuffer(buffer, np.uint32, count=w * h).reshape(h, w)
+
+
+def pack_color(r, g, b, a=255):
+
+    return np.uint32((a << 24) | (r << 16) | (g << 8) | b)
+
+
+def premultiply(r, g, b, a):
+
+    # Same rounding as qPremultiply, so filled pixels match what QPainter would write
+    def mul(c):
+        t = c * a + 0x80
+        return (t + (t >> 8)) >> 8
+
+    return pack_color(mul(r), mul(g), mul(b), a)
+
+
+# -----------------------------------------------------------------------------
+
+def movePixels(buffer, w, h, dx, dy):
+
+    pixels = pixel_view(buffer, w, h)
+
+    pixels[:] = np.roll(pixels, (int(dy), int(dx)), axis=(0, 1))
+
+
+# -----------------------------------------------------------------------------
+
+def blackWhite(buffer, w, h):
+
+    channels = np.frombuffer(buffer, np.uint8, count=w * h * 4).reshape(h, w, 4)
+
+    gray = (channels[..., 2] * 0.3 + channels[..., 1] * 0.59 + channels[..., 0] * 0.11)
+
+    channels[..., :3] = gray.astype(np.uint8)[..., np.newaxis]
+
+
+# -----------------------------------------------------------------------------
+
+def floodFill(buffer, x, y, w, h, r, g, b):
+
+    pixels = pixel_view(buffer, w, h)
+
+    target = pixels[y, x]
+
+    fill_value = pack_color(r, g, b)
+
+    if (target >> 24) != 0 and (target & 0xFFFFFF) == (fill_value & 0xFFFFFF):
+        return
+
+    runs = Spans(pixels, target).connected(x, y)
+
+    if runs is not None:
+        _paint_runs(pixels, runs, fill_value)
+
+
+# -----------------------------------------------------------------------------
+
+def match_mask(pixels, target, tolerance=0):
+
+    if tolerance <= 0:
+        return pixels == target
+
+    channels = pixels.view(np.uint8).reshape(pixels.shape + (4,))
+    reference = np.frombuffer(np.uint32(target).tobytes(), np.uint8)
+
+    mask = np.ones(pixels.shape, np.bool_)
+
+    for channel, value in enumerate(reference.tolist()):
+
+        plane = channels[..., channel]
+
+        if value - tolerance > 0:
+            mask &= plane >= value - tolerance
+
+        if value + tolerance < 255:
+            mask &= plane <= value + tolerance
+
+    return mask
+
+
+def fill(buffer, x, y, w, h, color, tolerance=0, diagonals=False, contiguous=True):
+    """
+    Span based fill of the region around (x, y).
+
+    color: straight (r, g, b, a) tuple. It is premultiplied before being written, so
+    translucent fills are correct on Format_ARGB32_Premultiplied surfaces.
+    tolerance: maximum per channel distance (alpha included) to the seed pixel.
+    diagonals: use 8-connectivity instead of 4-connectivity.
+    contiguous: when False every matching pixel of the surface is replaced.
+
+    returns: the (x, y, w, h) dirty rect or None if nothing changed.
+    """
+
+    region = fill_region(buffer, x, y, w, h, color, tolerance, diagonals, contiguous)
+
+    if region is None:
+        return None
+
+    region.paint()
+
+    return region.rect
+
+
+def fill_region(buffer, x, y, w, h, color, tolerance=0, diagonals=False, contiguous=True):
+    """
+    Finds the pixels fill() would change, with the same arguments, without changing them.
+    Lets callers know the dirty rect before the pixels are written.
+
+    returns: a FillRegion, or None if nothing would change.
+    """
+
+    if x < 0 or y < 0 or x >= w or y >= h:
+        return None
+
+    pixels = pixel_view(buffer, w, h)
+
+    target = pixels[y, x]
+
+    fill_value = premultiply(*color)
+
+    if fill_value == target and tolerance <= 0:
+        return None
+
+    if not contiguous:
+
+        mask = match_mask(pixels, target, tolerance)
+
+        rows = np.flatnonzero(mask.any(axis=1))
+
+        if len(rows) == 0:
+            return None
+
+        columns = np.flatnonzero(mask.any(axis=0))
+
+        left, top = int(columns[0]), int(rows[0])
+        right, bottom = int(columns[-1]) + 1, int(rows[-1]) + 1
+
+        return FillRegion(pixels, fill_value, (left, top, right - left, bottom - top),
+                          mask=mask[top:bottom, left:right])
+
+    runs = Spans(pixels, target, tolerance).connected(x, y, diagonals)
+
+    if runs is None:
+        return None
+
+    return FillRegion(pixels, fill_value, _run_bounds(runs), runs=runs)
+
+
+class FillRegion(object):
+    """
+    Pixels to be filled: the runs of a contiguous fill, or the mask of a global one over rect.
+    """
+
+    def __init__(self, pixels, value, rect, runs=None, mask=None):
+
+        self._pixels = pixels
+        self._value = value
+        self._rect = rect
+        self._runs = runs
+        self._mask = mask
+
+    @property
+    def rect(self):
+        return self._rect
+
+    def paint(self):
+
+        if self._runs is not None:
+            _paint_runs(self._pixels, self._runs, self._value)
+            return
+
+        left, top, width, height = self._rect
+
+        np.copyto(self._pixels[top:top + height, left:left + width], self._value,
+                  where=self._mask)
+
+
+# -----------------------------------------------------------------------------
+
+class Spans(object):
+    """
+    Horizontal runs of the pixels matching a target color, found a band of rows at a time as
+    a fill reaches them. Fills only read the rows around the region they fill, and their
+    Python side only loops over runs while all per-pixel work is done by NumPy.
+
+    Regions found to hold many runs are labelled over the whole surface at once instead,
+    which costs about the same whatever their size.
+    """
+
+    BAND_HEIGHT = 16
+
+    MAX_GROWN_RUNS = 256
+
+    def __init__(self, pixels, target, tolerance=0):
+
+        self._pixels = pixels
+        self._target = target
+        self._tolerance = tolerance
+
+        # Per row: (run starts, run ends, visited flags), once its band is loaded
+        self._rows = [None] * pixels.shape[0]
+
+    def _row(self, y):
+
+        row = self._rows[y]
+
+        if row is None:
+            self._load_band(y)
+            row = self._rows[y]
+
+        return row
+
+    def _load_band(self, y):
+
+        top = y - y % self.BAND_HEIGHT
+        bottom = min(top + self.BAND_HEIGHT, len(self._rows))
+
+        mask = match_mask(self._pixels[top:bottom], self._target, self._tolerance)
+
+        width = mask.shape[1]
+
+        # A clear pixel after every row ends every run in its row, so over the flattened
+        # band starts and ends alternate
+        padded = np.zeros((bottom - top, width + 1), np.bool_)
+        padded[:, :width] = mask
+
+        flat = padded.ravel()
+
+        edges = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+
+        if flat[0]:
+            edges = np.r_[0, edges]
+
+        rows, starts = np.divmod(edges[::2], width + 1)
+        ends = edges[1::2] - rows * (width + 1)
+
+        offsets = np.searchsorted(rows, np.arange(bottom - top + 1)).tolist()
+
+        starts = starts.tolist()
+        ends = ends.tolist()
+
+        for index in range(bottom - top):
+
+            first = offsets[index]
+            last = offsets[index + 1]
+
+            self._rows[top + index] = (starts[first:last], ends[first:last],
+                                       bytearray(last - first))
+
+    def connected(self, x, y, diagonals=False):
+        """
+        (rows, starts, ends) arrays of the runs connected to the one holding (x, y), or None
+        if (x, y) doesn't match.
+        """
+
+        starts, ends, visited = self._row(y)
+
+        seed = bisect_right(starts, x) - 1
+
+        if seed < 0 or ends[seed] <= x:
+            return None
+
+        visited[seed] = 1
+
+        reach = 1 if diagonals else 0
+        height = len(self._rows)
+
+        stack = [(y, starts[seed], ends[seed])]
+        found = [stack[0]]
+
+        while stack:
+
+            row, start, end = stack.pop()
+
+            left = start - reach
+            right = end + reach
+
+            for neighbour_row in (row - 1, row + 1):
+
+                if neighbour_row < 0 or neighbour_row >= height:
+                    continue
+
+                starts, ends, visited = self._row(neighbour_row)
+
+                # Runs on a row never overlap, so both starts and ends are sorted
+                lo = bisect_right(ends, left)
+                hi = bisect_left(starts, right)
+
+                for neighbour in range(lo, hi):
+
+                    if not visited[neighbour]:
+
+                        visited[neighbour] = 1
+
+                        run = (neighbour_row, starts[neighbour], ends[neighbour])
+
+                        stack.append(run)
+                        found.append(run)
+
+            if len(found) > self.MAX_GROWN_RUNS:
+                return slicing.connected_runs(
+                    match_mask(self._pixels, self._target, self._tolerance), x, y, diagonals)
+
+        return tuple(np.array(values, np.intp) for values in zip(*found))
+
+
+def _run_bounds(runs):
+
+    rows, starts, ends = runs
+
+    top = int(rows.min())
+    left = int(starts.min())
+
+    return left, top, int(ends.max()) - left, int(rows.max()) + 1 - top
+
+
+def _paint_runs(pixels, runs, value):
+
+    rows, starts, ends = runs
+
+    left, top, width, height = _run_bounds(runs)
+
+    # Few long spans are cheaper to write one slice at a time than through a rasterized
+    # mask of the whole bounding box
+    if len(rows) * 256 < width * height:
+
+        for row, start, end in zip(rows.tolist(), starts.tolist(), ends.tolist()):
+            pixels[row, start:end] = value
+
+        return
+
+    # Runs on a row are always separated by at least one pixel, so no start mark can land
+    # on the same cell as an end mark
+    marks = np.zeros((height, width + 1), np.int8)
+    marks[rows - top, starts - left] = 1
+    marks[rows - top, ends - left] = -1
+
+    mask = np.cumsum(marks, axis=1, dtype=np.int8)[:, :width].view(np.bool_)
+
+    np.copyto(pixels[top:top + height, left:left + width], value, where=mask)
@@ -0,0 +1,270 @@
+# --------------------------------------------------------------------------------------------------
+# Name:        Slicing
+# Purpose:     Finds the frames in a sprite sheet, as the cells of a grid or as the regions of
+#              connected opaque pixels. Regions are labelled over runs of opaque pixels rather
+#              than pixel by pixel, with every step done by NumPy over all runs at once, which
+#              fills reaching most of a surface use too
+#--------------------------------------------------------------------------------------------------
+
+import numpy as np
+
+
+def opaque_mask(pixels, alpha_threshold=0):
+    """
+    Boolean (height, width) mask of the pixels of a uint32 ARGB array with an alpha above
+    alpha_threshold.
+    """
+
+    if alpha_threshold == 0:
+        return pixels > 0x00FFFFFF
+
+    return (pixels >> 24) > alpha_threshold
+
+
+def grid_cells(width, height, cell_width, cell_height, margin=0, spacing=0):
+    """
+    (x, y, w, h) of every whole cell of a grid over a width x height sheet, row by row.
+
+    margin: pixels around the grid.
+    spacing: pixels between cells.
+    """
+
+    if cell_width < 1 or cell_height < 1:
+        raise ValueError('Cells must be at least 1x1, got {0}x{1}'.format(cell_width,
+                                                                        cell_height))
+
+    columns = max((width - 2 * margin + spacing) // (cell_width + spacing), 0)
+    rows = max((height - 2 * margin + spacing) // (cell_height + spacing), 0)
+
+    return [(margin + column * (cell_width + spacing), margin + row * (cell_height + spacing),
+             cell_width, cell_height) for row in range(rows) for column in range(columns)]
+
+
+def _any_per_cell(mask, starts, size, axis):
+
+    # Reduces [start, start + size) and the gap after it in turn, keeping the cells only.
+    # The last cell reaching the edge has no gap after it, and no bound to give for it
+    bounds = np.stack([starts, starts + size], axis=1).ravel()
+
+    if bounds[-1] >= mask.shape[axis]:
+        bounds = bounds[:-1]
+
+    reduced = np.logical_or.reduceat(mask, bounds, axis=axis)
+
+    return reduced[::2] if axis == 0 else reduced[:, ::2]
+
+
+def occupied_cells(mask, cells):
+    """
+    Which of the cells from grid_cells hold any pixel set in mask, as a list of bools.
+    """
+
+    if len(cells) == 0:
+        return []
+
+    cells = np.array(cells, np.int64)
+
+    _, _, width, height = cells[0]
+
+    xs = np.unique(cells[:, 0])
+    ys = np.unique(cells[:, 1])
+
+    occupied = _any_per_cell(_any_per_cell(mask, ys, height, 0), xs, width, 1)
+
+    return occupied[np.searchsorted(ys, cells[:, 1]),
+                    np.searchsorted(xs, cells[:, 0])].tolist()
+
+
+def _runs(mask):
+
+    # Runs of set pixels in every row, in row order, as (starts, ends, stride): flat indices
+    # row * stride + column of their first pixel and of the one after their last. A clear
+    # pixel after every row ends every run in its row, so starts and ends alternate
+    height, width = mask.shape
+
+    padded = np.zeros((height, width + 1), bool)
+    padded[:, :width] = mask
+
+    flat = padded.ravel()
+
+    edges = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+
+    if flat[0]:
+        edges = np.r_[0, edges]
+
+    return edges[::2], edges[1::2], width + 1
+
+
+def _touching_runs(starts, ends, stride, diagonals=True):
+
+    # (a, b) index pairs of runs in consecutive rows touching each other, diagonally too if
+    # diagonals. Flat indices keep runs sorted, and the runs below a run are those ending
+    # at or after its start, one row down, and starting at or before its end (after and
+    # before, without diagonals): a range found with two searches
+    if diagonals:
+        first = np.searchsorted(ends, starts + stride, 'left')
+        last = np.searchsorted(starts, ends + stride, 'right')
+    else:
+        first = np.searchsorted(ends, starts + stride, 'right')
+        last = np.searchsorted(starts, ends + stride, 'left')
+
+    counts = np.maximum(last - first, 0)
+
+    a = np.repeat(np.arange(len(starts)), counts)
+    b = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts - first, counts)
+
+    return a, b
+
+
+def _components(count, a, b):
+    """
+    Component label of each of count nodes linked by the (a, b) edges: the lowest node in it.
+    """
+
+    labels = np.arange(count)
+
+    while True:
+
+        # Labels are all roots here, so merging two trees hooks the higher root to the lower
+        low = labels[a]
+        high = labels[b]
+
+        apart = low != high
+
+        if not apart.any():
+            return labels
+
+        a, b = a[apart], b[apart]
+
+        low, high = np.minimum(low[apart], high[apart]), np.maximum(low[apart], high[apart])
+
+        np.minimum.at(labels, high, low)
+
+        # Pointer jumping, until every node points at its root
+        while True:
+
+            jumped = labels[labels]
+
+            if np.array_equal(jumped, labels):
+                break
+
+            labels = jumped
+
+
+def _bounds(labels, lefts, tops, rights, bottoms):
+
+    # Bounding (left, top, right, bottom) arrays of every component. Components are
+    # labelled after their lowest node, the one node labelled after itself
+    roots = np.flatnonzero(labels == np.arange(len(labels)))
+
+    components = np.searchsorted(roots, labels)
+
+    bounds = []
+
+    for values, reduce in ((lefts, np.minimum), (tops, np.minimum), (rights, np.maximum),
+                           (bottoms, np.maximum)):
+
+        reduced = values[roots]
+        reduce.at(reduced, components, values)
+
+        bounds.append(reduced)
+
+    return tuple(bounds)
+
+
+def _merge_overlapping(lefts, tops, rights, bottoms):
+
+    # Merges boxes overlapping each other until none do, so that a box only holds pixels of
+    # the regions merged into it. Merged boxes may reach new ones, hence the loop
+    while True:
+
+        order = np.argsort(lefts, kind='stable')
+
+        lefts, tops, rights, bottoms = lefts[order], tops[order], rights[order], bottoms[order]
+
+        # Boxes starting left of a box's right edge, after it, overlap it horizontally
+        last = np.searchsorted(lefts, rights, 'left')
+
+        counts = np.maximum(last - np.arange(len(lefts)) - 1, 0)
+
+        a = np.repeat(np.arange(len(lefts)), counts)
+        b = a + 1 + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+        overlapping = (tops[b] < bottoms[a]) & (tops[a] < bottoms[b])
+
+        if not overlapping.any():
+            return lefts, tops, rights, bottoms
+
+        labels = _components(len(lefts), a[overlapping], b[overlapping])
+
+        lefts, tops, rights, bottoms = _bounds(labels, lefts, tops, rights, bottoms)
+
+
+def reading_order(rects):
+    """
+    Sorts (x, y, w, h) rects the way a sheet is read: in rows from the top, each row from the
+    left. A rect starts a new row once it is below every rect of the current one.
+    """
+
+    rows = []
+    row_bottom = None
+
+    for rect in sorted(rects, key=lambda r: (r[1], r[0])):
+
+        if row_bottom is None or rect[1] >= row_bottom:
+            rows.append([])
+            row_bottom = rect[1] + rect[3]
+        else:
+            row_bottom = max(row_bottom, rect[1] + rect[3])
+
+        rows[-1].append(rect)
+
+    return [rect for row in rows for rect in sorted(row)]
+
+
+def find_regions(mask):
+    """
+    (x, y, w, h) bounding rects of the regions of pixels set in mask, connected through their
+    sides or corners, in reading order. Regions whose rects overlap are merged, like the
+    parts of a sprite with loose pieces.
+    """
+
+    starts, ends, stride = _runs(mask)
+
+    if len(starts) == 0:
+        return []
+
+    labels = _components(len(starts), *_touching_runs(starts, ends, stride))
+
+    rows = starts // stride
+    columns = starts - rows * stride
+
+    lefts, tops, rights, bottoms = _merge_overlapping(*_bounds(labels, columns, rows,
+                                                               columns + (ends - starts),
+                                                               rows + 1))
+
+    return reading_order(zip(lefts.tolist(), tops.tolist(), (rights - lefts).tolist(),
+                             (bottoms - tops).tolist()))
+
+
+def connected_runs(mask, x, y, diagonals=True):
+    """
+    (rows, starts, ends) arrays of the runs of pixels set in mask connected to (x, y),
+    through their sides, or their corners too with diagonals. Ends are exclusive. None if
+    (x, y) isn't set.
+    """
+
+    starts, ends, stride = _runs(mask)
+
+    seed = np.searchsorted(starts, y * stride + x, 'right') - 1
+
+    if seed < 0 or ends[seed] <= y * stride + x:
+        return None
+
+    labels = _components(len(starts), *_touching_runs(starts, ends, stride, diagonals))
+
+    region = labels == labels[seed]
+
+    rows = starts[region] // stride
+
+    return rows, starts[region] - rows * stride, ends[region] - rows * stride
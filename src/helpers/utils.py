@@ -14,6 +14,8 @@ import math
 import random
 import errno
 
+import numpy as np
+from PyQt5 import sip
 from PyQt5.QtCore import Qt, QDir, QByteArray, QBuffer, QIODevice, QPoint
 from PyQt5.QtGui import QImage, QPainter, QPixmap, QColor
 from PyQt5.QtWidgets import QFileDialog, QMessageBox
@@ -55,6 +57,41 @@ def create_image(width, height):
     return new_image
 
 
+def image_to_array(image, writable=True):
+    """
+    (height, width) uint32 NumPy view of the pixels of a 32 bit QImage. Nothing is copied:
+    the array reads and writes the image's own buffer, so the image must outlive it.
+    writable: False to get a read only view, which doesn't detach images sharing their
+    pixels with copies.
+    """
+
+    if image.depth() != 32:
+        raise ValueError('Expected a 32 bit image, got a {0} bit one'.format(image.depth()))
+
+    pixel_data = image.bits() if writable else image.constBits()
+    pixel_data.setsize(image.byteCount())
+
+    pixels = np.frombuffer(pixel_data, np.uint32).reshape(image.height(),
+                                                          image.bytesPerLine() // 4)
+
+    return pixels[:, :image.width()]
+
+
+def array_to_image(pixels, image_format=QImage.Format_ARGB32_Premultiplied):
+    """
+    QImage over a (height, width) uint32 array, the reverse of image_to_array. Nothing is
+    copied, so the array must outlive the image; copy the image to keep it on its own.
+    """
+
+    if pixels.dtype != np.uint32 or pixels.ndim != 2 or pixels.strides[1] != 4:
+        raise ValueError('Expected a 2D uint32 array with contiguous rows')
+
+    height, width = pixels.shape
+
+    return QImage(sip.voidptr(pixels.ctypes.data), width, height, pixels.strides[0],
+                  image_format)
+
+
 def load_image(file):
     new_image = QImage(file)
     return new_image.convertToFormat(QImage.Format_ARGB32_Premultiplied)
@@ -0,0 +1,152 @@
+# --------------------------------------------------------------------------------------------------
+# Name:        Workers
+# Purpose:     Background jobs. A Job runs on its own thread, fans work out to a thread pool and
+#              reports progress back to the GUI thread through Qt signals
+#--------------------------------------------------------------------------------------------------
+
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+
+def default_worker_count():
+
+    return os.cpu_count() or 1
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job(QObject):
+    progressChanged = pyqtSignal(int, int)  # Done, Total
+    finished = pyqtSignal(object)  # Result
+    failed = pyqtSignal(str)  # Error Message
+    cancelled = pyqtSignal()
+
+    def __init__(self, label, max_workers=None):
+
+        super(Job, self).__init__()
+
+        self._label = label
+
+        self._maxWorkers = max_workers if max_workers is not None else default_worker_count()
+
+        self._cancelEvent = threading.Event()
+
+        self._thread = None
+
+    @property
+    def label(self):
+        return self._label
+
+    @property
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def is_cancelled(self):
+        return self._cancelEvent.is_set()
+
+    def start(self):
+
+        self._thread = threading.Thread(target=self._run, name=self._label, daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+
+        self._cancelEvent.set()
+
+    def wait(self):
+
+        if self._thread is not None:
+            self._thread.join()
+
+    def run_now(self):
+        """
+        Runs the job on the calling thread and returns its result. Exceptions are raised
+        instead of being reported through the failed signal.
+        """
+
+        return self.run()
+
+    # To be implemented by subclasses. Runs on the job's thread
+    def run(self):
+        raise NotImplementedError
+
+    def check_cancelled(self):
+
+        if self._cancelEvent.is_set():
+            raise JobCancelled()
+
+    def map(self, function, items, on_result=None):
+        """
+        Calls function on every item using the worker pool and returns the results in
+        the order of items. Progress is reported as results come in.
+
+        on_result: optional callable taking (index, result), called on the job's thread as
+        every result comes in, in completion order.
+        """
+
+        items = list(items)
+
+        results = [None] * len(items)
+
+        total = len(items)
+        done = 0
+
+        self.progressChanged.emit(done, total)
+
+        if total == 0:
+            return results
+
+        with ThreadPoolExecutor(max_workers=min(self._maxWorkers, total)) as executor:
+
+            futures = {executor.submit(function, item): index for index, item in enumerate(items)}
+
+            try:
+
+                for future in as_completed(futures):
+
+                    self.check_cancelled()
+
+                    index = futures[future]
+
+                    results[index] = future.result()
+
+                    if on_result is not None:
+                        on_result(index, results[index])
+
+                    done += 1
+                    self.progressChanged.emit(done, total)
+
+            except BaseException:
+
+                for future in futures:
+                    future.cancel()
+
+                raise
+
+        return results
+
+    def _run(self):
+
+        try:
+
+            result = self.run()
+
+        except JobCancelled:
+
+            self.cancelled.emit()
+
+        except Exception as e:
+
+            logging.exception('[{0}] Job failed'.format(self._label))
+            self.failed.emit(str(e))
+
+        else:
+
+            self.finished.emit(result)
@@ -9,6 +9,24 @@ meta = {
 
 max_texture_size = 4096
 
+# Memory budget for the undo history, in bytes, and the side of the square tiles it stores
+max_history_size = 256 * 1024 * 1024
+history_tile_size = 64
+
+# Surface pixels live in memory mapped scratch files, with QImages built over them only while
+# they are in use. Once the pixels with an image go over the cap, the least recently used
+# images are dropped and their pages left for the OS to swap out
+use_surface_store = True
+surface_memory_cap = 512 * 1024 * 1024
+surface_store_segment_size = 64 * 1024 * 1024
+
+# Memory budget for cached flattened frames, in bytes
+max_composite_cache_size = 128 * 1024 * 1024
+
+# Every PNG image in this folder becomes a Pen brush, painting its pixels that are not fully
+# transparent
+brushes_folder = 'brushes'
+
 # SHORTCUTS =========================================================
 
 
@@ -25,7 +43,9 @@ shortcuts = {
         'CLEAR': 'C',
         'TOGGLE_VIEW': 'V',
         'TOGGLE_FIT_IN_VIEW': 'F',
-        'TOGGLE_GRID': 'G'
+        'TOGGLE_GRID': 'G',
+        'UNDO': 'Ctrl+Z',
+        'REDO': 'Ctrl+Y'
     },
 
     'COLORPICKER': {
@@ -0,0 +1,297 @@
+# --------------------------------------------------------------------------------------------------
+# Name:        Atlas
+# Purpose:     Texture atlases. Sprite frames are packed into as few pages as they fit in, and
+#              every page is written as a PNG next to a TexturePacker compatible JSON (hash)
+#              document with the frames' rects, trim offsets, pivots and durations
+#
+#              <name>.png, <name>.json                 one page
+#              <name>-0.png, <name>-0.json, ...        more pages, listed in related_multi_packs
+#
+#              Atlases are read back from the same documents, or from other TexturePacker JSON
+#              (hash or array) ones
+#--------------------------------------------------------------------------------------------------
+
+import json
+import os
+import re
+
+import numpy as np
+
+import src.helpers.packing as packing
+import src.helpers.utils as utils
+import src.model.appdata as appdata
+
+
+DEFAULT_PACKER = 'maxrects-bssf'
+
+APP_URL = 'https://github.com/rafaelvasco/SpriteMator'
+
+
+class AtlasError(Exception):
+    pass
+
+
+def frame_name(animation_name, index):
+
+    return '{0}/{1}'.format(animation_name, index)
+
+
+def page_file_names(name, page_count):
+    """
+    (image file name, data file name) of every page of an atlas.
+    """
+
+    if page_count == 1:
+        return [(name + '.png', name + '.json')]
+
+    return [('{0}-{1}.png'.format(name, page), '{0}-{1}.json'.format(name, page))
+            for page in range(page_count)]
+
+
+class AtlasFrame(object):
+    """
+    A frame in an atlas page.
+
+    x, y, width, height: the frame's pixels in the page, as the trimmed frame is sized, before
+    any rotation.
+    trim: (x, y, w, h) of the trimmed frame in the untrimmed one.
+    source_size: (w, h) of the untrimmed frame.
+    """
+
+    def __init__(self, name, page, x, y, width, height, rotated, trim, source_size,
+                 pivot=(0.5, 0.5), duration=None):
+
+        self.name = name
+        self.page = page
+
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.rotated = rotated
+
+        self.trim = trim
+        self.source_size = source_size
+
+        self.pivot = pivot
+        self.duration = duration
+
+    @property
+    def trimmed(self):
+        return tuple(self.trim) != (0, 0) + tuple(self.source_size)
+
+    def to_dict(self):
+
+        data = {
+            'frame': {'x': self.x, 'y': self.y, 'w': self.width, 'h': self.height},
+            'rotated': self.rotated,
+            'trimmed': self.trimmed,
+            'spriteSourceSize': dict(zip(('x', 'y', 'w', 'h'), self.trim)),
+            'sourceSize': dict(zip(('w', 'h'), self.source_size)),
+            'pivot': dict(zip(('x', 'y'), self.pivot))
+        }
+
+        if self.duration is not None:
+            data['duration'] = self.duration
+
+        return data
+
+    @staticmethod
+    def from_dict(name, page, data):
+
+        frame = data['frame']
+
+        width, height = frame['w'], frame['h']
+
+        source = data.get('sourceSize', {'w': width, 'h': height})
+        trim = data.get('spriteSourceSize', {'x': 0, 'y': 0, 'w': width, 'h': height})
+        pivot = data.get('pivot', {'x': 0.5, 'y': 0.5})
+
+        return AtlasFrame(name, page, frame['x'], frame['y'], width, height,
+                          bool(data.get('rotated', False)),
+                          (trim['x'], trim['y'], trim['w'], trim['h']),
+                          (source['w'], source['h']), (pivot['x'], pivot['y']),
+                          data.get('duration'))
+
+
+def _natural_key(name):
+
+    # walk2 before walk10
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', name)]
+
+
+def _read_document(file_path):
+
+    try:
+        with open(file_path, encoding='utf-8') as file:
+            document = json.load(file)
+    except (OSError, ValueError) as e:
+        raise AtlasError('Unable to read atlas {0}: {1}'.format(file_path, e))
+
+    if not isinstance(document, dict) or 'frames' not in document or \
+            'image' not in document.get('meta', {}):
+        raise AtlasError('{0} is not an atlas document.'.format(file_path))
+
+    frames = document['frames']
+
+    # The array format has the names inside the frames
+    if isinstance(frames, list):
+        frames = {frame['filename']: frame for frame in frames}
+
+    return document, frames
+
+
+def read_atlas(file_path):
+    """
+    Reads an atlas from the JSON document of one of its pages, along with the other pages
+    listed in its related_multi_packs.
+
+    returns: (image path of every page, AtlasFrames, animation name -> names of its frames).
+    Atlases without animations get one holding every frame, in the order of their names.
+    """
+
+    directory = os.path.dirname(file_path)
+
+    document, _ = _read_document(file_path)
+
+    data_paths = [file_path] + [os.path.join(directory, name) for name in
+                                document['meta'].get('related_multi_packs', [])]
+
+    image_paths = []
+    frames = []
+    animations = {}
+
+    for page, data_path in enumerate(data_paths):
+
+        document, page_frames = _read_document(data_path)
+
+        image_paths.append(os.path.join(os.path.dirname(data_path), document['meta']['image']))
+
+        frames.extend(AtlasFrame.from_dict(name, page, data)
+                      for name, data in page_frames.items())
+
+        animations.update(document.get('animations', {}))
+
+    names = {frame.name for frame in frames}
+
+    for animation_name, frame_names in animations.items():
+
+        for name in frame_names:
+
+            if name not in names:
+                raise AtlasError("Animation {0} has frame {1}, which isn't in the atlas.".format(
+                    animation_name, name))
+
+    if len(animations) == 0:
+        animations = {'Animation 1': sorted(names, key=_natural_key)}
+
+    return image_paths, frames, animations
+
+
+def pack_pages(sizes, max_width, max_height, packer=DEFAULT_PACKER, **options):
+    """
+    Packs (width, height) sizes into as few pages as it can: largest first, each on the first
+    page with room for it, opening a new page only when none has.
+
+    packer: name of one of packing.PACKERS, created with options for every page.
+    returns: (page packers, (page index, Placement) of every size, in the order of sizes).
+    """
+
+    pages = []
+    placements = [None] * len(sizes)
+
+    for index in packing.largest_first(sizes):
+
+        width, height = sizes[index]
+
+        for page_index, page in enumerate(pages):
+
+            placement = page.pack(width, height)
+
+            if placement is not None:
+                break
+
+        else:
+
+            page = packing.create_packer(packer, max_width, max_height, **options)
+
+            placement = page.pack(width, height)
+
+            if placement is None:
+                raise AtlasError("A {0}x{1} frame doesn't fit in a {2}x{3} page.".format(
+                    width, height, max_width, max_height))
+
+            pages.append(page)
+            page_index = len(pages) - 1
+
+        placements[index] = (page_index, placement)
+
+    return pages, placements
+
+
+def draw_page(width, height, tiles, extrude=0):
+    """
+    Copies images into a new width x height page. Pages are transparent under the images,
+    so their pixels are copied as they are, without a QPainter.
+
+    tiles: (image, Placement) of every image in the page.
+    extrude: pixels the images' edges are repeated for around them.
+    """
+
+    page = utils.create_image(width, height)
+
+    pixels = utils.image_to_array(page)
+
+    for image, placement in tiles:
+
+        tile = utils.image_to_array(image, writable=False)
+
+        # Rotated placements were turned clockwise
+        if placement.rotated:
+            tile = np.rot90(tile, -1)
+
+        if extrude > 0:
+            tile = np.pad(tile, extrude, mode='edge')
+
+        x = placement.x - extrude
+        y = placement.y - extrude
+
+        pixels[y:y + tile.shape[0], x:x + tile.shape[1]] = tile
+
+    return page
+
+
+def write_page_document(file_path, frames, image_name, size, animations=None,
+                        related=None):
+    """
+    Writes the JSON document of an atlas page.
+
+    frames: AtlasFrames in the page.
+    size: (w, h) of the page image.
+    animations: animation name -> names of its frames, in any page.
+    related: data file names of the atlas' other pages.
+    """
+
+    document = {
+        'frames': {frame.name: frame.to_dict() for frame in frames},
+        'meta': {
+            'app': APP_URL,
+            'version': appdata.meta['VERSION'],
+            'image': image_name,
+            'format': 'RGBA8888',
+            'size': dict(zip(('w', 'h'), size)),
+            'scale': '1'
+        }
+    }
+
+    if animations:
+        document['animations'] = animations
+
+    if related:
+        document['meta']['related_multi_packs'] = related
+
+    with open(file_path, 'w', encoding='utf-8') as file:
+        json.dump(document, file, indent=2, sort_keys=True)
+
+    return file_path
+
@@ -0,0 +1,161 @@
+# -------------------------------------------------------------------------------------------------
+# Name:        Brushes
+# Purpose:     Brush shapes used by the Pen. A Brush turns a stroke into the mask of pixels it
+#              covers, stamping a dab precomputed once per size
+#--------------------------------------------------------------------------------------------------
+
+import os
+from collections import OrderedDict
+
+import numpy as np
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QImage
+
+import src.helpers.drawing as drawing
+import src.helpers.utils as utils
+
+
+class Brush(object):
+    def __init__(self, name):
+
+        self._name = name
+
+        # size -> (size, size) bool dab
+        self._dabs = {}
+
+    @property
+    def name(self):
+        return self._name
+
+    def dab(self, size):
+        """
+        (size, size) bool array of the pixels a single dab of this brush covers.
+        """
+
+        dab = self._dabs.get(size)
+
+        if dab is None:
+            dab = self._dabs[size] = self._make_dab(size)
+
+        return dab
+
+    def rasterize(self, points, size, spacing=100, skip_first=False, corners=None):
+        """
+        Rasterizes a stroke through points.
+
+        size: dab size in pixels.
+        spacing: distance between dabs, in percent of size.
+        returns: (rect, mask, block size) as taken by Ink.blit_mask, or (QRect(), None, 1).
+        """
+
+        rect, mask = drawing.rasterize_dabs(points, self.dab(size),
+                                            max(1, size * spacing // 100), skip_first,
+                                            corners)
+
+        return rect, mask, 1
+
+    def _make_dab(self, size):
+
+        return np.ones((size, size), np.bool_)
+
+
+class Square(Brush):
+    def __init__(self):
+        super(Square, self).__init__('Square')
+
+    def rasterize(self, points, size, spacing=100, skip_first=False, corners=None):
+
+        if spacing < 100:
+            return super(Square, self).rasterize(points, size, spacing, skip_first,
+                                                 corners)
+
+        # Squares a full size apart tile the pixel grid, so whole blocks are stamped at once
+        rect, mask = drawing.rasterize_stroke(points, size, skip_first, corners)
+
+        return rect, mask, size
+
+
+class Circle(Brush):
+    def __init__(self):
+        super(Circle, self).__init__('Circle')
+
+    def _make_dab(self, size):
+
+        # Pixels whose centers fall within the circle inscribed in the dab
+        center = (size - 1) / 2.0
+
+        y, x = np.mgrid[0:size, 0:size]
+
+        return (x - center) ** 2 + (y - center) ** 2 <= (size / 2.0) ** 2
+
+
+class Bitmap(Brush):
+    """
+    Brush shaped like an image: pixels that are not fully transparent are painted. The image
+    is scaled to the dab size without smoothing.
+    """
+
+    def __init__(self, name, image):
+
+        super(Bitmap, self).__init__(name)
+
+        self._image = image.convertToFormat(QImage.Format_ARGB32_Premultiplied)
+
+    def _make_dab(self, size):
+
+        image = self._image.scaled(size, size, Qt.IgnoreAspectRatio, Qt.FastTransformation)
+
+        return utils.image_to_array(image, writable=False) >> 24 != 0
+
+
+_brushes = OrderedDict()
+
+
+def register(brush):
+
+    _brushes[brush.name] = brush
+
+
+def get(name):
+
+    return _brushes[name]
+
+
+def names():
+
+    return list(_brushes.keys())
+
+
+def load_folder(folder):
+    """
+    Registers a Bitmap brush for every PNG image in folder, named after its file. Images
+    that fail to load, or named like a brush already registered, are left out.
+    Returns the names of the brushes registered.
+    """
+
+    if not os.path.isdir(folder):
+        return []
+
+    loaded = []
+
+    for file_name in sorted(os.listdir(folder)):
+
+        name, extension = os.path.splitext(file_name)
+
+        if extension.lower() != '.png' or name in _brushes:
+            continue
+
+        image = QImage(os.path.join(folder, file_name))
+
+        if image.isNull():
+            continue
+
+        register(Bitmap(name, image))
+
+        loaded.append(name)
+
+    return loaded
+
+
+register(Square())
+register(Circle())
@@ -0,0 +1,86 @@
+# --------------------------------------------------------------------------------------------------
+# Name:        CompositeCache
+# Purpose:     Keeps the flattened image of recently displayed Frames. Each entry is stored with the
+#              key it was composited for, so a frame whose layers changed since misses, and brings
+#              its stale entry up to date when only their pixels did
+#--------------------------------------------------------------------------------------------------
+
+from collections import OrderedDict
+
+import src.model.appdata as appdata
+
+
+class CompositeCache(object):
+    def __init__(self, byte_budget=None):
+
+        self._byteBudget = byte_budget if byte_budget is not None \
+            else appdata.max_composite_cache_size
+
+        # frame -> (key, image), least recently used first
+        self._entries = OrderedDict()
+
+        self._byteSize = 0
+
+    @property
+    def byte_size(self):
+        return self._byteSize
+
+    @property
+    def byte_budget(self):
+        return self._byteBudget
+
+    @byte_budget.setter
+    def byte_budget(self, value):
+        self._byteBudget = value
+        self._evict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, frame, key):
+
+        entry = self._entries.get(frame)
+
+        if entry is None or entry[0] != key:
+            return None
+
+        self._entries.move_to_end(frame)
+
+        return entry[1]
+
+    def entry(self, frame):
+        """
+        (key, image) stored for frame, whatever its key, or None.
+        """
+
+        return self._entries.get(frame)
+
+    def put(self, frame, key, image):
+
+        self.discard(frame)
+
+        self._entries[frame] = (key, image)
+        self._byteSize += image.byteCount()
+
+        self._evict()
+
+    def discard(self, frame):
+
+        entry = self._entries.pop(frame, None)
+
+        if entry is not None:
+            self._byteSize -= entry[1].byteCount()
+
+    def clear(self):
+
+        self._entries.clear()
+        self._byteSize = 0
+
+    def _evict(self):
+
+        # The most recent composite is always kept, it is the one being displayed
+        while self._byteSize > self._byteBudget and len(self._entries) > 1:
+
+            _, (_, image) = self._entries.popitem(last=False)
+
+            self._byteSize -= image.byteCount()
@@ -0,0 +1,394 @@
+# --------------------------------------------------------------------------------------------------
+# Name:        Compositor
+# Purpose:     Flattens layers over Format_ARGB32_Premultiplied buffers, drawing only the part of
+#              each layer holding pixels. Blend modes are also done with NumPy for inks, bit
+#              exact with QPainter drawing with the matching composition mode and opacity
+#--------------------------------------------------------------------------------------------------
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PyQt5.QtCore import QPoint, QRect
+from PyQt5.QtGui import QPainter
+
+import src.helpers.utils as utils
+from src.helpers.workers import default_worker_count
+
+
+BLEND_NORMAL = 'normal'
+BLEND_MULTIPLY = 'multiply'
+BLEND_SCREEN = 'screen'
+BLEND_ADD = 'add'
+BLEND_OVERLAY = 'overlay'
+BLEND_LIGHTEN = 'lighten'
+BLEND_DARKEN = 'darken'
+
+BLEND_MODES = (BLEND_NORMAL, BLEND_MULTIPLY, BLEND_SCREEN, BLEND_ADD, BLEND_OVERLAY,
+               BLEND_LIGHTEN, BLEND_DARKEN)
+
+# QPainter equivalent of every blend mode
+COMPOSITION_MODES = {
+
+    BLEND_NORMAL: QPainter.CompositionMode_SourceOver,
+    BLEND_MULTIPLY: QPainter.CompositionMode_Multiply,
+    BLEND_SCREEN: QPainter.CompositionMode_Screen,
+    BLEND_ADD: QPainter.CompositionMode_Plus,
+    BLEND_OVERLAY: QPainter.CompositionMode_Overlay,
+    BLEND_LIGHTEN: QPainter.CompositionMode_Lighten,
+    BLEND_DARKEN: QPainter.CompositionMode_Darken
+}
+
+_LANES = np.uint32(0x00FF00FF)
+_HIGH_LANES = np.uint32(0xFF00FF00)
+_HALF = np.uint32(0x00800080)
+
+
+def const_alpha(opacity):
+    """
+    Opacity as the 0-255 factor QPainter's raster engine blends with.
+    """
+
+    return (255 * int(opacity * 256)) >> 8
+
+
+def premultiply(argb):
+    """
+    Premultiplied form of a non premultiplied 0xAARRGGBB color, rounding like Qt's
+    qPremultiply.
+    """
+
+    alpha = argb >> 24
+
+    return (int(byte_mul(np.uint32(argb), np.uint32(alpha))) & 0x00FFFFFF) | (alpha << 24)
+
+
+def div_255(x):
+
+    return (x + (x >> 8) + 0x80) >> 8
+
+
+def byte_mul(x, a, out=None):
+    """
+    Multiplies the four channels of packed pixels by a / 255, rounding like Qt's
+    BYTE_MUL. a can be a scalar or an array of per pixel factors.
+
+    out: uint32 array to write the result to, which may be x itself. Large arrays are then
+    worked on in place, with two temporaries.
+    """
+
+    if out is None:
+
+        t = (x & _LANES) * a
+        t = ((t + ((t >> 8) & _LANES) + _HALF) >> 8) & _LANES
+
+        x = ((x >> 8) & _LANES) * a
+        x = (x + ((x >> 8) & _LANES) + _HALF) & _HIGH_LANES
+
+        return x | t
+
+    t = np.bitwise_and(x, _LANES, out=np.empty(out.shape, np.uint32))
+    t *= a
+
+    u = t >> 8
+    u &= _LANES
+
+    t += u
+    t += _HALF
+    t >>= 8
+    t &= _LANES
+
+    np.right_shift(x, 8, out=out)
+
+    out &= _LANES
+    out *= a
+
+    np.right_shift(out, 8, out=u)
+
+    u &= _LANES
+
+    out += u
+    out += _HALF
+    out &= _HIGH_LANES
+    out |= t
+
+    return out
+
+
+def interpolate_255(x, a, y, b):
+    """
+    Per channel (x * a + y * b) / 255, rounding like Qt's INTERPOLATE_PIXEL_255.
+    """
+
+    t = (x & _LANES) * a + (y & _LANES) * b
+    t = ((t + ((t >> 8) & _LANES) + _HALF) >> 8) & _LANES
+
+    x = ((x >> 8) & _LANES) * a + ((y >> 8) & _LANES) * b
+    x = (x + ((x >> 8) & _LANES) + _HALF) & _HIGH_LANES
+
+    return x | t
+
+
+def _unpack(pixels):
+
+    return [((pixels >> shift) & 0xFF).astype(np.int32) for shift in (24, 16, 8, 0)]
+
+
+def _pack(a, r, g, b):
+
+    return (a.astype(np.uint32) << 24) | (r.astype(np.uint32) << 16) | \
+           (g.astype(np.uint32) << 8) | b.astype(np.uint32)
+
+
+def _mix_alpha(da, sa):
+
+    return 255 - div_255((255 - sa) * (255 - da))
+
+
+# ----- BLEND FUNCTIONS ----------------------------------------------------------------------------
+# Each takes destination and source pixels and returns the blended pixels at full opacity
+
+def _multiply(d, s):
+
+    da, dr, dg, db = _unpack(d)
+    sa, sr, sg, sb = _unpack(s)
+
+    def op(dc, sc):
+        return div_255(sc * dc + sc * (255 - da) + dc * (255 - sa))
+
+    return _pack(_mix_alpha(da, sa), op(dr, sr), op(dg, sg), op(db, sb))
+
+
+def _screen(d, s):
+
+    def op(dc, sc):
+        return 255 - div_255((255 - dc) * (255 - sc))
+
+    return _pack(*[op(dc, sc) for dc, sc in zip(_unpack(d), _unpack(s))])
+
+
+def _add(d, s):
+
+    return _pack(*[np.minimum(dc + sc, 255) for dc, sc in zip(_unpack(d), _unpack(s))])
+
+
+def _overlay(d, s):
+
+    da, dr, dg, db = _unpack(d)
+    sa, sr, sg, sb = _unpack(s)
+
+    def op(dc, sc):
+
+        rest = sc * (255 - da) + dc * (255 - sa)
+
+        return np.where(2 * dc < da,
+                        div_255(2 * sc * dc + rest),
+                        div_255(sa * da - 2 * (da - dc) * (sa - sc) + rest))
+
+    return _pack(_mix_alpha(da, sa), op(dr, sr), op(dg, sg), op(db, sb))
+
+
+def _lighten(d, s):
+
+    da, dr, dg, db = _unpack(d)
+    sa, sr, sg, sb = _unpack(s)
+
+    def op(dc, sc):
+        return div_255(np.maximum(sc * da, dc * sa) + sc * (255 - da) + dc * (255 - sa))
+
+    return _pack(_mix_alpha(da, sa), op(dr, sr), op(dg, sg), op(db, sb))
+
+
+def _darken(d, s):
+
+    da, dr, dg, db = _unpack(d)
+    sa, sr, sg, sb = _unpack(s)
+
+    def op(dc, sc):
+        return div_255(np.minimum(sc * da, dc * sa) + sc * (255 - da) + dc * (255 - sa))
+
+    return _pack(_mix_alpha(da, sa), op(dr, sr), op(dg, sg), op(db, sb))
+
+
+_BLEND_FUNCTIONS = {
+
+    BLEND_MULTIPLY: _multiply,
+    BLEND_SCREEN: _screen,
+    BLEND_ADD: _add,
+    BLEND_OVERLAY: _overlay,
+    BLEND_LIGHTEN: _lighten,
+    BLEND_DARKEN: _darken
+}
+
+
+def blend(d, s, alpha, mode=BLEND_NORMAL):
+    """
+    Blends packed source pixels s over destination pixels d with a 0-255 constant alpha
+    and returns the result.
+    """
+
+    if mode == BLEND_NORMAL:
+
+        if alpha != 255:
+            s = byte_mul(s, np.uint32(alpha))
+
+        result = byte_mul(d, np.uint32(255) - (s >> 24),
+                          out=np.empty(np.broadcast(d, s).shape, np.uint32))
+        result += s
+
+        return result
+
+    result = _BLEND_FUNCTIONS[mode](d, s)
+
+    if alpha != 255:
+        result = interpolate_255(result, np.uint32(alpha), d, np.uint32(255 - alpha))
+
+    return result
+
+
+# -------------------------------------------------------------------------------------------------
+
+def content_bounds(pixels):
+    """
+    Bounding (x, y, w, h) rect of the non transparent pixels of a (h, w) uint32 array, or
+    None if there are none.
+    """
+
+    rows = np.flatnonzero(pixels.max(axis=1))
+
+    if len(rows) == 0:
+        return None
+
+    top = int(rows[0])
+    bottom = int(rows[-1]) + 1
+
+    columns = np.flatnonzero(pixels[top:bottom].max(axis=0))
+
+    left = int(columns[0])
+    right = int(columns[-1]) + 1
+
+    return left, top, right - left, bottom - top
+
+
+def composite(target, layers, empty=False, offset=(0, 0), layer_size=None):
+    """
+    Composites layers onto target in place.
+
+    target: (h, w) uint32 array of premultiplied pixels, with contiguous rows.
+    layers: iterable of (pixels, opacity, blend mode, bounds), bottom layer first. pixels is
+    any buffer or array holding h * w premultiplied pixels. bounds is the (x, y, w, h) rect
+    holding all of the layer's non transparent pixels; None to have it worked out here.
+    empty: target is known to be fully transparent.
+    offset, layer_size: to composite only part of larger layers, the (width, height) of the
+    layers and the (x, y) of the layer pixel that goes to the top left of target.
+    """
+
+    target_height, target_width = target.shape
+
+    width, height = layer_size if layer_size is not None else (target_width, target_height)
+
+    offset_x, offset_y = offset
+
+    # Image over target, drawn on by a painter opened once a layer needs blending
+    target_image = None
+    painter = None
+
+    for pixels, opacity, mode, bounds in layers:
+
+        alpha = const_alpha(opacity)
+
+        if alpha == 0:
+            continue
+
+        source = np.frombuffer(pixels, np.uint32, count=width * height).reshape(height, width)
+
+        # QPainter goes over transparent pixels about as fast as finding the bounds would, in
+        # normal mode. Other modes and copying the first layer in pay for the bounds
+        if bounds is None:
+            normal = mode == BLEND_NORMAL and not empty
+            bounds = (0, 0, width, height) if normal else content_bounds(source)
+
+        # Fully transparent source pixels leave the destination untouched in every mode,
+        # so layers only cost as much as the area they cover
+        if bounds is None:
+            continue
+
+        x, y, w, h = bounds
+
+        left, top = max(x, offset_x), max(y, offset_y)
+        right = min(x + w, offset_x + target_width)
+        bottom = min(y + h, offset_y + target_height)
+
+        if right <= left or bottom <= top:
+            continue
+
+        region = target[top - offset_y:bottom - offset_y, left - offset_x:right - offset_x]
+
+        # Over transparent pixels every mode comes down to the source scaled by alpha
+        if empty:
+
+            if alpha == 255:
+                region[:] = source[top:bottom, left:right]
+            else:
+                byte_mul(source[top:bottom, left:right], np.uint32(alpha), out=region)
+
+            empty = False
+
+            continue
+
+        # QPainter draws a single pixel as a fill of its color, which rounds differently
+        if region.size == 1:
+            region[:] = blend(region, source[top:bottom, left:right], alpha, mode)
+            continue
+
+        # QPainter's raster engine blends many times faster than NumPy, in every mode
+        if painter is None:
+            target_image = utils.array_to_image(target)
+            painter = QPainter(target_image)
+
+        painter.setCompositionMode(COMPOSITION_MODES[mode])
+        painter.setOpacity(opacity)
+        painter.drawImage(QPoint(left - offset_x, top - offset_y), utils.array_to_image(source),
+                          QRect(left, top, right - left, bottom - top))
+
+    if painter is not None:
+        painter.end()
+
+    return target
+
+
+def flatten(layers, width, height, rect=None):
+    """
+    Composites width x height layers, as taken by composite, into a new image. Only reads
+    the layers' pixel buffers, so it can run on any thread.
+
+    rect: (x, y, w, h) part of the layers to composite, inside them; the image is then that
+    size.
+    """
+
+    x, y, w, h = rect if rect is not None else (0, 0, width, height)
+
+    image = utils.create_image(w, h)
+
+    composite(utils.image_to_array(image), layers, empty=True, offset=(x, y),
+              layer_size=(width, height))
+
+    return image
+
+
+def flatten_many(jobs, max_workers=None):
+    """
+    Flattens many sets of layers at once on a thread pool. NumPy releases the GIL for the
+    heavy lifting, so frames are composited in parallel.
+
+    jobs: list of (layers, width, height) tuples as taken by flatten.
+    returns: list of images, in the order of jobs.
+    """
+
+    if max_workers is None:
+        max_workers = default_worker_count()
+
+    if max_workers <= 1 or len(jobs) <= 1:
+        return [flatten(*job) for job in jobs]
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(jobs))) as executor:
+        return list(executor.map(lambda job: flatten(*job), jobs))
@@ -0,0 +1,387 @@
+# --------------------------------------------------------------------------------------------------
+# Name:        History
+# Purpose:     Tile based undo / redo history for Surfaces. Only the tiles touched by an edit are
+#              stored, so memory grows with the pixels that actually changed
+#--------------------------------------------------------------------------------------------------
+
+import numpy as np
+
+import src.model.appdata as appdata
+
+
+class Revision(object):
+    def __init__(self, name):
+
+        self._name = name
+
+        # (surface, tile_x, tile_y) -> [before bytes, after bytes]
+        self._tiles = {}
+
+        # surface -> (width, height) at the time the revision was recorded
+        self._sizes = {}
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def tiles(self):
+        return self._tiles
+
+    @property
+    def sizes(self):
+        return self._sizes
+
+    @property
+    def is_empty(self):
+        return len(self._tiles) == 0
+
+    def surfaces(self):
+
+        return list(self._sizes.keys())
+
+
+class History(object):
+    def __init__(self, byte_budget=None, tile_size=None):
+
+        self._byteBudget = byte_budget if byte_budget is not None else appdata.max_history_size
+        self._tileSize = tile_size if tile_size is not None else appdata.history_tile_size
+
+        self._undoStack = []
+        self._redoStack = []
+
+        self._current = None
+
+        # Whole surface copies taken by track() without a rect, released on commit
+        self._surfaceCopies = {}
+
+        # (surface, tile_x, tile_y) -> bytes of the tile as of the last committed revision.
+        # Used to share tile buffers between consecutive revisions.
+        self._latestTiles = {}
+
+        # id(tile bytes) -> [tile bytes, reference count]. Shared tiles are only counted once
+        # towards the budget.
+        self._tileRefs = {}
+
+        self._byteSize = 0
+
+    @property
+    def byte_budget(self):
+        return self._byteBudget
+
+    @byte_budget.setter
+    def byte_budget(self, value):
+        self._byteBudget = value
+        self._evict()
+
+    @property
+    def byte_size(self):
+        return self._byteSize
+
+    @property
+    def tile_size(self):
+        return self._tileSize
+
+    @property
+    def can_undo(self):
+        return len(self._undoStack) > 0
+
+    @property
+    def can_redo(self):
+        return len(self._redoStack) > 0
+
+    @property
+    def is_recording(self):
+        return self._current is not None
+
+    def clear(self):
+
+        self._undoStack.clear()
+        self._redoStack.clear()
+        self._current = None
+        self._surfaceCopies.clear()
+        self._latestTiles.clear()
+        self._tileRefs.clear()
+        self._byteSize = 0
+
+    def begin(self, name):
+
+        # Nested operations (i.e. pasting a selection in the middle of a drag) are
+        # merged into the revision already being recorded
+        if self._current is None:
+            self._current = Revision(name)
+
+    def track(self, surface, rect=None):
+        """
+        Marks a region of a surface as about to be modified, snapshotting the tiles it
+        covers. Must be called before the pixels are written.
+
+        rect: (x, y, w, h) tuple or QRect in surface coordinates. When None the whole
+        surface is tracked and the changed tiles are worked out on commit.
+        """
+
+        if self._current is None:
+            return
+
+        revision = self._current
+
+        if surface not in revision.sizes:
+            revision.sizes[surface] = (surface.width, surface.height)
+
+        if rect is None:
+
+            if surface not in self._surfaceCopies:
+                self._surfaceCopies[surface] = _pixels(surface).copy()
+
+            return
+
+        pixels = _pixels(surface)
+
+        for tile_x, tile_y in self._tiles_in_rect(surface, rect):
+
+            key = (surface, tile_x, tile_y)
+
+            if key in revision.tiles:
+                continue
+
+            revision.tiles[key] = [self._tile_bytes(pixels, key), None]
+
+    def commit(self):
+
+        revision = self._current
+
+        if revision is None:
+            return None
+
+        self._current = None
+
+        for surface, copy in self._surfaceCopies.items():
+
+            pixels = _pixels(surface)
+
+            if copy.shape != pixels.shape:
+                continue
+
+            for tile_x, tile_y in self._changed_tiles(copy, pixels):
+
+                key = (surface, tile_x, tile_y)
+
+                if key not in revision.tiles:
+                    revision.tiles[key] = [self._tile_bytes(copy, key), None]
+
+        self._surfaceCopies.clear()
+
+        for key, tile in list(revision.tiles.items()):
+
+            surface = key[0]
+
+            if (surface.width, surface.height) != revision.sizes[surface]:
+                del revision.tiles[key]
+                continue
+
+            after = self._tile_bytes(_pixels(surface), key)
+
+            if after == tile[0]:
+                del revision.tiles[key]
+                continue
+
+            tile[1] = after
+
+            self._latestTiles[key] = after
+
+        if revision.is_empty:
+            return None
+
+        # Retained first, so tiles it shares with the revisions being redone are kept
+        self._retain(revision)
+
+        self._drop_redo()
+
+        self._undoStack.append(revision)
+
+        self._evict()
+
+        return revision
+
+    def cancel(self):
+
+        self._current = None
+        self._surfaceCopies.clear()
+
+    def undo(self):
+
+        if not self.can_undo:
+            return None
+
+        revision = self._undoStack.pop()
+        self._redoStack.append(revision)
+
+        self._apply(revision, 0)
+
+        return revision
+
+    def redo(self):
+
+        if not self.can_redo:
+            return None
+
+        revision = self._redoStack.pop()
+        self._undoStack.append(revision)
+
+        self._apply(revision, 1)
+
+        return revision
+
+    # ---------------------------------------------------------------------------------------------
+
+    def _apply(self, revision, state):
+
+        tile_size = self._tileSize
+
+        # surface -> [left, top, right, bottom] tiles restored
+        restored = {}
+
+        for key, tile in revision.tiles.items():
+
+            surface, tile_x, tile_y = key
+
+            if (surface.width, surface.height) != revision.sizes[surface]:
+                continue
+
+            extent = restored.setdefault(surface, [tile_x, tile_y, tile_x, tile_y])
+
+            extent[0], extent[1] = min(extent[0], tile_x), min(extent[1], tile_y)
+            extent[2], extent[3] = max(extent[2], tile_x), max(extent[3], tile_y)
+
+            pixels = _pixels(surface)
+
+            block = pixels[tile_y * tile_size:(tile_y + 1) * tile_size,
+                           tile_x * tile_size:(tile_x + 1) * tile_size]
+
+            block[:] = np.frombuffer(tile[state], np.uint32).reshape(block.shape)
+
+            self._latestTiles[key] = tile[state]
+
+        for surface in revision.surfaces():
+
+            extent = restored.get(surface)
+
+            if extent is None:
+                surface.mark_dirty()
+                continue
+
+            left, top, right, bottom = extent
+
+            surface.mark_dirty((left * tile_size, top * tile_size,
+                                (right - left + 1) * tile_size, (bottom - top + 1) * tile_size))
+
+    def _tiles_in_rect(self, surface, rect):
+
+        if hasattr(rect, 'getRect'):
+            rect = rect.getRect()
+
+        x, y, w, h = (int(v) for v in rect)
+
+        left = max(0, x)
+        top = max(0, y)
+        right = min(surface.width, x + w)
+        bottom = min(surface.height, y + h)
+
+        if right <= left or bottom <= top:
+            return []
+
+        tile_size = self._tileSize
+
+        return [(tile_x, tile_y)
+                for tile_y in range(top // tile_size, (bottom - 1) // tile_size + 1)
+                for tile_x in range(left // tile_size, (right - 1) // tile_size + 1)]
+
+    def _changed_tiles(self, before, after):
+
+        tile_size = self._tileSize
+
+        h, w = after.shape
+
+        rows = -(-h // tile_size)
+        columns = -(-w // tile_size)
+
+        changed = before != after
+
+        padded = np.zeros((rows * tile_size, columns * tile_size), np.bool_)
+        padded[:h, :w] = changed
+
+        tiles = padded.reshape(rows, tile_size, columns, tile_size).any(axis=(1, 3))
+
+        return [(int(tile_x), int(tile_y)) for tile_y, tile_x in np.argwhere(tiles)]
+
+    def _tile_bytes(self, pixels, key):
+
+        surface, tile_x, tile_y = key
+
+        tile_size = self._tileSize
+
+        data = pixels[tile_y * tile_size:(tile_y + 1) * tile_size,
+                      tile_x * tile_size:(tile_x + 1) * tile_size].tobytes()
+
+        # Reuse the buffer stored by the previous revision if the tile did not change since
+        latest = self._latestTiles.get(key)
+
+        if latest is not None and latest == data:
+            return latest
+
+        return data
+
+    def _retain(self, revision):
+
+        for tile in revision.tiles.values():
+
+            for data in tile:
+
+                ref = self._tileRefs.get(id(data))
+
+                if ref is None:
+                    self._tileRefs[id(data)] = [data, 1]
+                    self._byteSize += len(data)
+                else:
+                    ref[1] += 1
+
+    def _release(self, revision):
+
+        for key, tile in revision.tiles.items():
+
+            for data in tile:
+
+                ref = self._tileRefs[id(data)]
+                ref[1] -= 1
+
+                if ref[1] == 0:
+
+                    del self._tileRefs[id(data)]
+                    self._byteSize -= len(data)
+
+                    # Latest tiles are only kept while a revision holds them, or they would
+                    # take memory not counted towards the budget
+                    if self._latestTiles.get(key) is data:
+                        del self._latestTiles[key]
+
+    def _drop_redo(self):
+
+        for revision in self._redoStack:
+            self._release(revision)
+
+        self._redoStack.clear()
+
+    def _evict(self):
+
+        # Oldest revisions go first. The most recent one is always kept so the last
+        # edit can be undone no matter how big it is.
+        while self._byteSize > self._byteBudget and len(self._undoStack) > 1:
+
+            self._release(self._undoStack.pop(0))
+
+
+def _pixels(surface):
+
+    return np.frombuffer(surface.pixel_data, np.uint32,
+                         count=surface.width * surface.height).reshape(surface.height,
+                                                                       surface.width)
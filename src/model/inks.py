@@ -9,12 +9,77 @@
 # Licence:     <your licence>
 #--------------------------------------------------------------------------------------------------
 
+import numpy as np
+from PyQt5.QtCore import QRect
+from PyQt5.QtGui import QBrush, QImage, QPainter
+
 from src.model.properties import PropertyHolder
 
 import src.helpers.drawing as drawing
+import src.helpers.utils as utils
+import src.model.compositor as compositor
+
+
+# 4x4 ordered dither thresholds. Pixels whose threshold is below the density get painted
+BAYER_4X4 = np.array([[0, 8, 2, 10],
+                      [12, 4, 14, 6],
+                      [3, 11, 1, 9],
+                      [15, 7, 13, 5]])
+
+
+def _fill(pixels, mask, color, mode=compositor.BLEND_NORMAL):
+
+    source = np.uint32(compositor.premultiply(color.rgba()))
+
+    if mode == compositor.BLEND_NORMAL and source >> 24 == 255:
+        pixels[mask] = source
+    else:
+        pixels[mask] = compositor.blend(pixels[mask], source, 255, mode)
+
+
+def _pixel_mask(mask, size):
+
+    if size == 1:
+        return mask
+
+    return mask.repeat(size, axis=0).repeat(size, axis=1)
+
+
+def rects_mask(rects):
+    """
+    Coverage of an array of rects.
+
+    rects: (n, 4) array of x, y, w, h rects.
+    returns: (QRect bounding the rects, bool mask of the pixels of that rect covered by any of
+    them), or (QRect(), None) if they cover nothing.
+    """
+
+    rects = np.asarray(rects, np.int64).reshape(-1, 4)
+    rects = rects[(rects[:, 2] > 0) & (rects[:, 3] > 0)]
+
+    if len(rects) == 0:
+        return QRect(), None
+
+    left, top = rects[:, 0], rects[:, 1]
+    right, bottom = left + rects[:, 2], top + rects[:, 3]
+
+    x, y = int(left.min()), int(top.min())
+    w, h = int(right.max()) - x, int(bottom.max()) - y
+
+    mask = np.zeros((h, w), np.bool_)
+
+    for x1, y1, x2, y2 in np.column_stack([left - x, top - y, right - x, bottom - y]).tolist():
+        mask[y1:y2, x1:x2] = True
+
+    return QRect(x, y, w, h), mask
 
 
 class Ink(PropertyHolder):
+    """
+    Inks draw in two ways: blit paints one rect through a QPainter, while blit_mask and
+    blit_rects write a whole batch of them straight to a surface's premultiplied pixels.
+    """
+
     def __init__(self):
         super(Ink, self).__init__()
 
@@ -24,9 +89,64 @@ class Ink(PropertyHolder):
     def name(self):
         return self._name
 
+    def begin_stroke(self, pixels, x, y):
+        """
+        Called before the first blit of every stroke, with the surface pixels and the
+        position the stroke starts at.
+        """
+
+        return
+
     def blit(self, x, y, w, h, color, painter):
         return
 
+    def blit_mask(self, pixels, rect, mask, size, color):
+        """
+        Draws color on a whole stroke at once.
+
+        pixels: (h, w) uint32 array of the surface's premultiplied pixels.
+        rect: QRect of the surface covered by the stroke, inside the surface.
+        mask: bool array with one entry per size x size block of rect, set where the
+        stroke goes.
+
+        Inks that only implement blit get one blit per block.
+        """
+
+        image = utils.array_to_image(pixels)
+
+        painter = QPainter(image)
+
+        for row, column in zip(*np.nonzero(mask)):
+            self.blit(rect.x() + int(column) * size, rect.y() + int(row) * size, size, size,
+                      color, painter)
+
+        painter.end()
+
+    def blit_rects(self, pixels, rects, color):
+        """
+        Draws color on an array of x, y, w, h rects at once. Overlapping rects are drawn
+        once. Returns the QRect of the surface that was drawn on.
+        """
+
+        height, width = pixels.shape
+
+        rects = np.array(rects, np.int64).reshape(-1, 4)
+
+        # Clipped to the surface
+        right = np.minimum(rects[:, 0] + rects[:, 2], width)
+        bottom = np.minimum(rects[:, 1] + rects[:, 3], height)
+
+        rects[:, :2] = np.maximum(rects[:, :2], 0)
+        rects[:, 2] = right - rects[:, 0]
+        rects[:, 3] = bottom - rects[:, 1]
+
+        rect, mask = rects_mask(rects)
+
+        if mask is not None:
+            self.blit_mask(pixels, rect, mask, 1, color)
+
+        return rect
+
 
 class Solid(Ink):
     def __init__(self):
@@ -37,6 +157,10 @@ class Solid(Ink):
     def blit(self, x, y, w, h, color, painter):
         painter.fillRect(x, y, w, h, color)
 
+    def blit_mask(self, pixels, rect, mask, size, color):
+
+        _fill(drawing.block_view(pixels, rect, size), mask, color)
+
 
 class Eraser(Ink):
     def __init__(self):
@@ -46,3 +170,154 @@ class Eraser(Ink):
     def blit(self, x, y, w, h, color, painter):
 
         drawing.erase_area_painter_ready(x, y, w, h, painter)
+
+    def blit_mask(self, pixels, rect, mask, size, color):
+
+        drawing.block_view(pixels, rect, size)[mask] = 0
+
+
+class Dither(Ink):
+    """
+    Paints an ordered dither pattern, fixed to the surface so that strokes crossing each other
+    keep to the same pattern.
+    """
+
+    def __init__(self):
+        super(Dither, self).__init__()
+        self._name = 'Dither'
+        self.add_ranged_property(prop_name='density', prop_min=1, prop_max=15, prop_value=8,
+                                 prop_description='Painted pixels out of every 16')
+
+        # (density, rgba) -> pattern brush
+        self._brushes = {}
+
+    def _pattern(self):
+
+        return BAYER_4X4 < self.property_value('density')
+
+    def _brush(self, color):
+
+        key = (self.property_value('density'), color.rgba())
+
+        brush = self._brushes.get(key)
+
+        if brush is None:
+
+            texture = QImage(4, 4, QImage.Format_ARGB32_Premultiplied)
+
+            utils.image_to_array(texture)[:] = np.where(self._pattern(),
+                                                        compositor.premultiply(color.rgba()), 0)
+
+            brush = self._brushes[key] = QBrush(texture)
+
+        return brush
+
+    def blit(self, x, y, w, h, color, painter):
+
+        # The brush origin is the surface origin, which lines the pattern up with blit_mask
+        painter.fillRect(x, y, w, h, self._brush(color))
+
+    def blit_mask(self, pixels, rect, mask, size, color):
+
+        x, y = rect.x(), rect.y()
+
+        region = pixels[y:y + rect.height(), x:x + rect.width()]
+
+        rows = (np.arange(rect.height()) + y) % 4
+        columns = (np.arange(rect.width()) + x) % 4
+
+        pattern = self._pattern()[rows[:, np.newaxis], columns]
+
+        _fill(region, _pixel_mask(mask, size) & pattern, color)
+
+
+class _BlendInk(Ink):
+    def __init__(self, name, mode):
+        super(_BlendInk, self).__init__()
+        self._name = name
+        self._mode = mode
+
+    def blit(self, x, y, w, h, color, painter):
+
+        mode = painter.compositionMode()
+
+        painter.setCompositionMode(compositor.COMPOSITION_MODES[self._mode])
+        painter.fillRect(x, y, w, h, color)
+
+        painter.setCompositionMode(mode)
+
+    def blit_mask(self, pixels, rect, mask, size, color):
+
+        _fill(drawing.block_view(pixels, rect, size), mask, color, self._mode)
+
+
+class Lighten(_BlendInk):
+    """
+    Only changes the channels the color is lighter in.
+    """
+
+    def __init__(self):
+        super(Lighten, self).__init__('Lighten', compositor.BLEND_LIGHTEN)
+
+
+class Darken(_BlendInk):
+    """
+    Only changes the channels the color is darker in.
+    """
+
+    def __init__(self):
+        super(Darken, self).__init__('Darken', compositor.BLEND_DARKEN)
+
+
+class ReplaceColor(Ink):
+    """
+    Replaces the color under the start of a stroke, and colors close to it, wherever the
+    stroke goes. Other colors are left untouched. Strokes starting off the surface replace
+    the color under the middle of their first blit.
+    """
+
+    def __init__(self):
+        super(ReplaceColor, self).__init__()
+        self._name = 'Replace Color'
+        self.add_ranged_property(prop_name='tolerance', prop_min=0, prop_max=255, prop_value=0,
+                                 prop_description='Largest channel difference still replaced')
+
+        self._target = None
+
+    def begin_stroke(self, pixels, x, y):
+
+        height, width = pixels.shape
+
+        if 0 <= x < width and 0 <= y < height:
+            self._target = np.uint32(pixels[y, x])
+        else:
+            self._target = None
+
+    def blit(self, x, y, w, h, color, painter):
+
+        self.blit_mask(utils.image_to_array(painter.device()), QRect(x, y, w, h),
+                       np.ones((h, w), np.bool_), 1, color)
+
+    def blit_mask(self, pixels, rect, mask, size, color):
+
+        x, y = rect.x(), rect.y()
+
+        region = pixels[y:y + rect.height(), x:x + rect.width()]
+
+        if self._target is None:
+            self._target = np.uint32(region[rect.height() // 2, rect.width() // 2])
+
+        tolerance = self.property_value('tolerance')
+
+        if tolerance == 0:
+            matching = region == self._target
+        else:
+            matching = np.ones(region.shape, np.bool_)
+
+            for shift in (24, 16, 8, 0):
+
+                channel = ((region >> shift) & 0xFF).astype(np.int32)
+
+                matching &= np.abs(channel - int((self._target >> shift) & 0xFF)) <= tolerance
+
+        region[_pixel_mask(mask, size) & matching] = compositor.premultiply(color.rgba())
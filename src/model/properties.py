@@ -1,4 +1,4 @@
-from PyQt5.QtWidgets import QSpinBox
+from PyQt5.QtWidgets import QSpinBox, QComboBox
 
 from src.view.widgets import OnOffButton, Slider
 
@@ -122,13 +122,55 @@ class RangedProperty(Property):
 
     def build_property_widget(self):
 
-        ranged_input = Slider(self.min(), self.max())
-        ranged_input.set_value(self.value())
+        ranged_input = Slider(self.min, self.max)
+        ranged_input.set_value(self.value)
         ranged_input.valueChanged.connect(lambda v: self._set_value(v))
 
         return ranged_input
 
 
+class ChoiceProperty(Property):
+    def __init__(self, name, choices, description, initial_value=None):
+
+        super(ChoiceProperty, self).__init__(name, description, initial_value)
+
+        self._choices = list(choices)
+
+        if initial_value is None and len(self._choices) > 0:
+            self._value = self._choices[0]
+
+    @property
+    def choices(self):
+        return self._choices
+
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, value):
+
+        if value in self._choices:
+            self._value = value
+
+    def add_choice(self, choice):
+
+        if choice not in self._choices:
+            self._choices.append(choice)
+
+    def build_property_widget(self):
+
+        choice_input = QComboBox()
+        choice_input.addItems(self._choices)
+
+        if self._value in self._choices:
+            choice_input.setCurrentIndex(self._choices.index(self._value))
+
+        choice_input.currentTextChanged.connect(lambda v: self._set_value(v))
+
+        return choice_input
+
+
 class PropertyHolder(object):
     def __init__(self):
         self._properties = {}
@@ -157,3 +199,8 @@ class PropertyHolder(object):
                             prop_description=None):
         self._properties[prop_name] = RangedProperty(prop_name, prop_min, prop_max,
                                                      prop_description, prop_value, )
+
+    def add_choice_property(self, prop_name, prop_choices, prop_value=None,
+                            prop_description=None):
+        self._properties[prop_name] = ChoiceProperty(prop_name, prop_choices, prop_description,
+                                                     prop_value)
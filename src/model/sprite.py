@@ -7,16 +7,27 @@
 # Date:             24/03/13
 # License:          
 #--------------------------------------------------------------------------------------------------
+import hashlib
+import json
 import pickle
 import os
+import re
+import weakref
+from collections import deque
 
-from PyQt5.QtCore import QPoint, QSize
-from PyQt5.QtGui import QPainter
+import numpy as np
+from PyQt5.QtCore import QSize
+from PyQt5.QtGui import QPainter, QImage
 
 import src.helpers.utils as utils
-import src.helpers.cropper as cropper
+import src.helpers.slicing as slicing
 import src.model.appdata as appdata
-from src.helpers.packer import RectanglePacker
+from src.model.sprite_file import SpriteFile, Chunk, is_sprite_file, file_lock
+from src.model.surface_store import SurfaceStore, content_digest
+from src.model.composite_cache import CompositeCache
+import src.model.compositor as compositor
+import src.model.atlas as atlas
+from src.helpers.workers import Job
 
 
 class Sprite(object):
@@ -28,6 +39,15 @@ class Sprite(object):
         self._filePath = ""
         self._currentAnimationIndex = -1
 
+        # SpriteFile the sprite was last loaded from or saved to
+        self._spriteFile = None
+
+        # Scratch storage for the pixels of the sprite's surfaces
+        self._store = SurfaceStore() if appdata.use_surface_store else None
+
+        # Flattened images of the sprite's frames
+        self._composites = CompositeCache()
+
     @property
     def file_path(self):
         return self._filePath
@@ -36,10 +56,22 @@ class Sprite(object):
     def file_path(self, value):
         self._filePath = value
 
+    @property
+    def store(self):
+        return self._store
+
+    @property
+    def composites(self):
+        return self._composites
+
     @property
     def active_surface(self):
         return self.current_animation.current_frame.current_surface.image
 
+    @property
+    def current_surface(self):
+        return self.current_animation.current_frame.current_surface
+
     @property
     def active_surface_pixel_data(self):
 
@@ -125,25 +157,100 @@ class Sprite(object):
     @staticmethod
     def load_from_file(file):
 
-        with open(file, 'rb') as spriteFile:
-            new_sprite = pickle.load(spriteFile)
+        if not is_sprite_file(file):
+            return Sprite._load_legacy_file(file)
+
+        sprite_file = SpriteFile.open(file)
+
+        index = sprite_file.index
+        chunks = sprite_file.chunks
+
+        new_sprite = Sprite(index['width'], index['height'])
+
+        for animation_entry in index['animations']:
+
+            animation = Animation(animation_entry['name'], new_sprite)
+            animation._frameWidth = index['width']
+            animation._frameHeight = index['height']
 
-        if new_sprite is not None:
+            for frame_entry in animation_entry['frames']:
 
-            if new_sprite.file_path != file:
-                new_sprite.file_path = file
+                frame = Frame(animation)
 
-            return new_sprite
+                for surface_entry in frame_entry['surfaces']:
 
-        raise Exception('[SpriteManager] : Error loading sprite file')
+                    # Pixels are only decoded when the surface is first displayed or edited
+                    surface = Surface(surface_entry['name'], surface_entry['width'],
+                                      surface_entry['height'],
+                                      source=(sprite_file, chunks[surface_entry['chunk']]),
+                                      store=new_sprite.store)
+                    surface._id = surface_entry['id']
+                    surface._opacity = surface_entry['opacity']
+                    surface._visible = surface_entry.get('visible', True)
+                    surface._blendMode = surface_entry.get('blend_mode', compositor.BLEND_NORMAL)
+
+                    frame._surfaces.append(surface)
+
+                frame._current_surface_index = frame_entry['current_surface']
+
+                animation._frames.append(frame)
+
+            animation._current_frameIndex = animation_entry['current_frame']
+
+            new_sprite._animations.append(animation)
+
+        new_sprite._currentAnimationIndex = index['current_animation']
+        new_sprite._spriteFile = sprite_file
+        new_sprite.file_path = file
+
+        return new_sprite
 
     @staticmethod
     def save(sprite, save_path):
 
-        sprite.file_path = save_path
+        SaveJob(sprite, save_path).run_now()
+
+    @staticmethod
+    def _load_legacy_file(file):
+
+        # Sprites saved before the chunked format were pickled object graphs. They are
+        # rebuilt through the regular API so they get every attribute current code expects.
+        with open(file, 'rb') as spriteFile:
+            legacy_sprite = pickle.load(spriteFile)
+
+        if legacy_sprite is None:
+            raise Exception('[SpriteManager] : Error loading sprite file')
+
+        new_sprite = Sprite(legacy_sprite.width, legacy_sprite.height)
+
+        for legacy_animation in legacy_sprite.animations:
+
+            new_sprite.add_animation()
 
-        with open(save_path, 'wb+') as outFile:
-            pickle.dump(sprite, outFile)
+            animation = new_sprite.current_animation
+            animation.name = legacy_animation.name
+            animation._frameWidth = legacy_sprite.width
+            animation._frameHeight = legacy_sprite.height
+
+            for legacy_frame in legacy_animation.frames:
+
+                frame = Frame(animation)
+
+                for legacy_surface in legacy_frame.surfaces:
+                    frame.add_surface(legacy_surface.image)
+                    frame.current_surface._name = legacy_surface.name
+                    frame.current_surface._opacity = legacy_surface._opacity
+
+                frame.set_surface(0)
+
+                animation._frames.append(frame)
+
+            animation.set_frame(0)
+
+        new_sprite.set_animation(0)
+        new_sprite.file_path = file
+
+        return new_sprite
 
     @staticmethod
     def import_from_image_files(image_files):
@@ -173,111 +280,143 @@ class Sprite(object):
         return new_sprite
 
     @staticmethod
-    def import_from_spritesheet(image):
-        pass
-
-    @staticmethod
-    def export(sprite, directory):
-
-        created_folder_successfuly = True
-
-        directories = {}
-
-        for animation in sprite.animations:
-
-            directory = utils.make_directory(directory, animation.name)
-
-            if directory is not None:
+    def import_from_spritesheet(image, cell_width=None, cell_height=None, margin=0, spacing=0,
+                                skip_empty=True, alpha_threshold=0):
+        """
+        Slices a sprite sheet into the frames of a new sprite, in reading order. Returns None
+        if the sheet has nothing to slice.
+
+        image: QImage or image file.
+        cell_width, cell_height: size of the cells of a grid the sheet is cut into, with
+        margin pixels around it and spacing pixels between cells. Without them, every region
+        of connected pixels more opaque than alpha_threshold becomes a frame, centered in
+        frames as big as the largest region.
+        skip_empty: leaves out cells without pixels more opaque than alpha_threshold.
+        """
+
+        if isinstance(image, str):
+            image = utils.load_image(image)
+        else:
+            image = image.convertToFormat(QImage.Format_ARGB32_Premultiplied)
 
-                directories[animation] = directory
+        pixels = utils.image_to_array(image, writable=False)
 
-            else:
+        if cell_width is not None or cell_height is not None:
 
-                created_folder_successfuly = False
-                directories.clear()
-                break
+            cell_width = cell_width or cell_height
+            cell_height = cell_height or cell_width
 
-        if created_folder_successfuly:
+            rects = slicing.grid_cells(image.width(), image.height(), cell_width, cell_height,
+                                       margin, spacing)
 
-            for animation, animationDirectory in directories.items():
+            if skip_empty:
+                occupied = slicing.occupied_cells(slicing.opaque_mask(pixels, alpha_threshold),
+                                                  rects)
+                rects = [rect for rect, is_occupied in zip(rects, occupied) if is_occupied]
 
-                for index, frame in enumerate(animation.frames):
+        else:
 
-                    flattened_frame_image = frame.flatten()
+            rects = slicing.find_regions(slicing.opaque_mask(pixels, alpha_threshold))
 
-                    flattened_frame_image = cropper.crop(flattened_frame_image)
+        if len(rects) == 0:
+            return None
 
-                    file_path = os.path.join(animationDirectory, ('frame{0}.png'.format(index)))
+        new_sprite = Sprite(max(rect[2] for rect in rects), max(rect[3] for rect in rects))
+        new_sprite.add_animation()
 
-                    try:
+        animation = new_sprite.current_animation
+        animation._frameWidth = new_sprite.width
+        animation._frameHeight = new_sprite.height
 
-                        flattened_frame_image.save(file_path, "PNG")
+        for x, y, width, height in rects:
+            animation._frames.append(_frame_from_pixels(animation,
+                                                        pixels[y:y + height, x:x + width]))
 
-                    except Exception as e:
+        animation.set_frame(0)
 
-                        raise e
+        return new_sprite
 
     @staticmethod
-    def export_to_spritesheet(sprite, directory):
+    def import_from_atlas(file_path):
+        """
+        Rebuilds a sprite from a texture atlas, given the JSON document of any of its pages:
+        an animation for each of the atlas' ones, with trimmed frames put back where they
+        were in their untrimmed ones.
+        """
 
-        packer = RectanglePacker(appdata.max_texture_size, appdata.max_texture_size)
+        image_paths, frames, animations = atlas.read_atlas(file_path)
 
-        animation = sprite.animations[0]
+        width = max(frame.source_size[0] for frame in frames)
+        height = max(frame.source_size[1] for frame in frames)
 
-        frames = animation.frames
+        pages = []
 
-        cropped_images = []
+        for image_path in image_paths:
 
-        spritesheet_regions = []
+            page = utils.load_image(image_path)
 
-        for frame in frames:
-            flattened_frame_image = frame.flatten()
+            if page.isNull():
+                raise atlas.AtlasError('Unable to read atlas page {0}'.format(image_path))
 
-            cropped_frame_image = cropper.crop(flattened_frame_image)
+            pages.append(page)
 
-            cropped_images.append(cropped_frame_image)
+        # Kept alive with their images
+        page_pixels = [utils.image_to_array(page, writable=False) for page in pages]
 
-        images_remaining = len(cropped_images)
+        frames = {frame.name: frame for frame in frames}
 
-        while images_remaining > 0:
-
-            for image in cropped_images:
+        new_sprite = Sprite(width, height)
 
-                image_width = image.width()
-                image_height = image.height()
+        for animation_name, frame_names in animations.items():
 
-                point = packer.pack(image_width, image_height)
+            new_sprite.add_animation()
 
-                if point is None:
-                    raise Exception("Can't fit all sprite frames. Max image size is 4096x4096.")
+            animation = new_sprite.current_animation
+            animation.name = animation_name
+            animation._frameWidth = width
+            animation._frameHeight = height
 
-                images_remaining -= 1
+            for name in frame_names:
 
-                spritesheet_regions.append((image, point))
+                frame = frames[name]
 
-        spritesheet = utils.create_image(packer.actual_packing_area_width(),
-                                         packer.actual_packing_area_height())
-        painter = QPainter()
+                # Rotated frames were turned clockwise into the page
+                if frame.rotated:
+                    tile = np.rot90(page_pixels[frame.page][frame.y:frame.y + frame.width,
+                                                            frame.x:frame.x + frame.height])
+                else:
+                    tile = page_pixels[frame.page][frame.y:frame.y + frame.height,
+                                                   frame.x:frame.x + frame.width]
 
-        painter.begin(spritesheet)
+                source_width, source_height = frame.source_size
 
-        for sprRegion in spritesheet_regions:
-            spr_image = sprRegion[0]
-            target_point = QPoint(sprRegion[1].x, sprRegion[1].y)
+                animation._frames.append(_frame_from_pixels(
+                    animation, tile, (width - source_width) // 2 + frame.trim[0],
+                    (height - source_height) // 2 + frame.trim[1]))
 
-            painter.drawImage(target_point, spr_image)
+            animation.set_frame(0)
 
-        painter.end()
+        new_sprite.set_animation(0)
 
-        file_path = os.path.join(directory, ('{0}Sheet.png'.format(animation.name)))
+        return new_sprite
 
-        try:
+    @staticmethod
+    def export(sprite, directory, incremental=False, max_workers=None):
+        """
+        Exports every frame to '<animation>/frame<index>.png' under directory, taking the options
+        of FrameExportJob. Returns the paths of the files written.
+        """
 
-            spritesheet.save(file_path, "PNG")
+        return FrameExportJob(sprite, directory, incremental, max_workers).run_now()
 
-        except Exception as e:
+    @staticmethod
+    def export_to_spritesheet(sprite, directory, **options):
+        """
+        Exports a texture atlas of every animation, taking the options of ExportJob. Returns
+        the paths of the files written.
+        """
 
-            raise e
+        return ExportJob(sprite, directory, **options).run_now()
 
     # ---------------------------------------------------------------------------------------------
     # ---------------------------------------------------------------------------------------------
@@ -418,6 +557,8 @@ class Animation(object):
             if self.is_on_last_frame:
                 new_index -= 1
 
+        self._sprite.composites.discard(self._frames[index])
+
         del self._frames[index]
 
         if len(self._frames) > 0:
@@ -428,6 +569,25 @@ class Animation(object):
 
             self.set_frame(None)
 
+    def flatten(self, max_workers=None):
+        """
+        Flattens every frame at once, compositing frames in parallel. Composites already
+        cached are reused; new ones are not cached so exporting doesn't flush the frames
+        being displayed.
+        """
+
+        images = [frame._cached_composite() for frame in self._frames]
+
+        missing = [index for index, image in enumerate(images) if image is None]
+
+        jobs = [(self._frames[index].layers(), self._sprite.width, self._sprite.height)
+                for index in missing]
+
+        for index, image in zip(missing, compositor.flatten_many(jobs, max_workers)):
+            images[index] = image
+
+        return images
+
     def copy_frame(self, index=None):
 
         if index is None:
@@ -535,10 +695,14 @@ class Frame(object):
 
             self._animation.sprite.resize(frame_width, frame_height)
 
-        new_surface = Surface('Layer ' + str(sid), frame_width, frame_height)
+        new_surface = Surface('Layer ' + str(sid), frame_width, frame_height,
+                              store=self._animation.sprite.store)
 
         new_surface.paste(image)
 
+        # Repeated images, like empty frames, share their pixels
+        new_surface.share()
+
         new_surface._id = sid
 
         if at is None:
@@ -565,6 +729,8 @@ class Frame(object):
 
         self._surfaces.insert(to_index, self._surfaces.pop(from_index))
 
+        self._surfaces[to_index].mark_dirty()
+
         index = 0
         for surface in self._surfaces:
             if surface.id == self.current_surface.id:
@@ -577,29 +743,148 @@ class Frame(object):
 
         clone = Frame(self._animation)
 
-        for surface in self._surfaces:
-            clone.add_surface(surface.image.copy())
+        # Cloned surfaces share the pixels of the originals until either is edited
+        clone._surfaces = [surface.clone() for surface in self._surfaces]
+        clone._current_surface_index = self._current_surface_index
 
         return clone
 
-    def flatten(self):
+    def composite_key(self):
+        """
+        Changes whenever the flattened image would: on any edit to a layer's pixels, or
+        when layers are added, removed, reordered, hidden or change opacity or blend mode.
+        """
 
-        if len(self._surfaces) == 1:
-            return self._surfaces[0].image
+        return tuple((surface, surface.generation, surface.opacity, surface.visible,
+                      surface.blend_mode) for surface in self._surfaces)
+
+    def layers(self):
+        """
+        Visible surfaces as (pixels, opacity, blend mode, bounds) tuples, as taken by the
+        compositor.
+        """
 
-        flattened_image = utils.create_image(self._animation.frame_width(),
-                                             self._animation.frame_height())
+        return [(surface.const_pixel_data, surface.opacity, surface.blend_mode,
+                 surface.content_bounds()) for surface in self._surfaces if surface.visible]
 
-        painter = QPainter()
-        painter.begin(flattened_image)
+    def content_bounds(self):
+        """
+        Bounding (x, y, w, h) rect of the non transparent pixels of the visible layers, or
+        None if there are none. The flattened frame has no content outside of it, though
+        layers faded out by their opacity can leave it transparent at the edges.
+        """
+
+        left = top = right = bottom = None
 
         for surface in self._surfaces:
-            painter.drawImage(0, 0, surface.image)
 
-        painter.end()
+            if not surface.visible or compositor.const_alpha(surface.opacity) == 0:
+                continue
+
+            bounds = surface.content_bounds()
+
+            if bounds is None:
+                continue
+
+            x, y, w, h = bounds
+
+            if left is None:
+                left, top, right, bottom = x, y, x + w, y + h
+            else:
+                left, top = min(left, x), min(top, y)
+                right, bottom = max(right, x + w), max(bottom, y + h)
+
+        if left is None:
+            return None
+
+        return left, top, right - left, bottom - top
+
+    def flatten(self):
+        """
+        Returns the frame's layers composited into one image. The result is cached and
+        shared, so it must not be modified. Once layers are edited the cached image is
+        composited again over the area they changed, in place, so it is only good to draw
+        right away.
+        """
+
+        flattened_image = self._cached_composite()
+
+        if flattened_image is None:
+
+            flattened_image = self._patched_composite()
+
+            if flattened_image is None:
+                flattened_image = compositor.flatten(self.layers(),
+                                                     self._animation.sprite.width,
+                                                     self._animation.sprite.height)
+
+            self._animation.sprite.composites.put(self, self.composite_key(), flattened_image)
 
         return flattened_image
 
+    def _patched_composite(self):
+
+        # The cached composite brought up to date in place, when only the pixels of the
+        # layers changed since: the area they changed in is composited again. None if
+        # anything else changed
+        entry = self._animation.sprite.composites.entry(self)
+
+        if entry is None:
+            return None
+
+        key, image = entry
+
+        width = self._animation.sprite.width
+        height = self._animation.sprite.height
+
+        if image.width() != width or image.height() != height or \
+                len(key) != len(self._surfaces):
+            return None
+
+        left = top = right = bottom = None
+
+        for (surface, generation, opacity, visible, blend_mode), current in zip(key,
+                                                                                self._surfaces):
+
+            if surface is not current or opacity != current.opacity or \
+                    visible != current.visible or blend_mode != current.blend_mode:
+                return None
+
+            rect = surface.changed_rect(generation)
+
+            if rect is None:
+                continue
+
+            x, y, w, h = rect
+
+            if left is None:
+                left, top, right, bottom = x, y, x + w, y + h
+            else:
+                left, top = min(left, x), min(top, y)
+                right, bottom = max(right, x + w), max(bottom, y + h)
+
+        if left is not None:
+
+            pixels = utils.image_to_array(image)[top:bottom, left:right]
+            pixels[:] = 0
+
+            compositor.composite(pixels, self.layers(), empty=True, offset=(left, top),
+                                 layer_size=(width, height))
+
+        return image
+
+    def _cached_composite(self):
+
+        # A lone layer composites to itself whatever its blend mode
+        if len(self._surfaces) == 1:
+
+            surface = self._surfaces[0]
+
+            if surface.visible and surface.opacity == 1.0:
+                return surface.const_image
+
+        return self._animation.sprite.composites.get(self, self.composite_key())
+
     def resize(self, width, height):
 
         for surface in self._surfaces:
@@ -612,27 +897,77 @@ class Frame(object):
 
 
 class Surface(object):
-    def __init__(self, name, width, height):
-        self._image = utils.create_image(width, height)
-        self._pixelData = self._image.bits()
-        self._pixelData.setsize(self._image.byteCount())
 
-        self._byteArray = None
+    # Number of changes whose rects are remembered, for changed_rect
+    CHANGE_LOG_SIZE = 64
+
+    def __init__(self, name, width, height, source=None, store=None):
+
+        self._image = None
+        self._pixelData = None
+
+        # When a SurfaceStore is given the pixels live in one of its Slots and _image is
+        # only a view over them, built when needed. The slot may be shared with surfaces
+        # holding the same pixels, and is then copied before the pixels are written to
+        self._store = store
+        self._slot = None
+        self._slotFinalizer = None
+
+        self._width = width
+        self._height = height
+
+        # (SpriteFile, Chunk) the pixels are stored in
+        self._source = source
+
+        # Bumped on every change to the pixels. Dirty surfaces changed since they were last
+        # written to _source and have to be encoded again on save
+        self._generation = 0
+        self._dirty = source is None
+
+        # Rects of the last changes, the last one for the current generation
+        self._changes = deque(maxlen=self.CHANGE_LOG_SIZE)
+
+        # (generation, bounds) of the last content_bounds() call
+        self._bounds = None
+
+        # Non transparent pixels in every row and column. Built by the first content_bounds()
+        # call and then kept up to date from the rects passed to mark_dirty
+        self._rowCounts = None
+        self._columnCounts = None
+
+        if source is None and store is None:
+            self._set_image(utils.create_image(width, height))
 
         self._name = name
         self._id = 0
         self._opacity = 1.0
+        self._visible = True
+        self._blendMode = compositor.BLEND_NORMAL
 
     @property
     def width(self):
-        return self._image.width() if self._image is not None else 0
+        return self._width
 
     @property
     def height(self):
-        return self._image.height() if self._image is not None else 0
+        return self._height
 
     @property
     def image(self):
+
+        self._use(writable=True)
+
+        return self._image
+
+    @property
+    def const_image(self):
+        """
+        The surface's image, only to be read from. Unlike image, it doesn't copy pixels
+        shared with other surfaces.
+        """
+
+        self._use(writable=False)
+
         return self._image
 
     @property
@@ -643,63 +978,1080 @@ class Surface(object):
     def id(self):
         return self._id
 
+    @property
+    def opacity(self):
+        return self._opacity
+
+    @opacity.setter
+    def opacity(self, value):
+        self._opacity = value
+
+    @property
+    def visible(self):
+        return self._visible
+
+    @visible.setter
+    def visible(self, value):
+        self._visible = value
+
+    @property
+    def blend_mode(self):
+        return self._blendMode
+
+    @blend_mode.setter
+    def blend_mode(self, value):
+
+        if value not in compositor.BLEND_MODES:
+            raise ValueError('Unknown blend mode: {0}'.format(value))
+
+        self._blendMode = value
+
     @property
     def pixel_data(self):
+
+        self._use(writable=True)
+
+        return self._pixelData
+
+    @property
+    def const_pixel_data(self):
+
+        self._use(writable=False)
+
         return self._pixelData
 
+    @property
+    def pixel_array(self):
+        """
+        (height, width) uint32 NumPy view of the premultiplied pixels. Writing to it
+        changes the surface.
+        """
+
+        return np.frombuffer(self.pixel_data, np.uint32,
+                             count=self._width * self._height).reshape(self._height, self._width)
+
+    @property
+    def const_pixel_array(self):
+        """
+        Read only pixel_array, which doesn't copy pixels shared with other surfaces.
+        """
+
+        pixels = np.frombuffer(self.const_pixel_data, np.uint32,
+                               count=self._width * self._height)
+
+        pixels.flags.writeable = False
+
+        return pixels.reshape(self._height, self._width)
+
+    @property
+    def is_loaded(self):
+        return self._image is not None
+
+    @property
+    def source(self):
+        return self._source
+
+    @property
+    def generation(self):
+        return self._generation
+
+    @property
+    def is_dirty(self):
+        return self._dirty
+
+    @property
+    def digest(self):
+        """
+        Content digest of the pixels if known without reading them, else None. Surfaces with
+        the same digest have the same size and pixels.
+        """
+
+        if self._slot is not None and self._slot.digest is not None:
+            return self._slot.digest
+
+        # Pixels stay the same as in their chunk until marked dirty
+        if self._source is not None and not self._dirty:
+            return self._source[1].digest
+
+        return None
+
+    def occupancy(self):
+        """
+        (row counts, column counts) arrays with the number of non transparent pixels in every
+        row and column. They are kept up to date by the surface and must not be modified.
+        """
+
+        if self._rowCounts is None:
+
+            occupied = (self.const_pixel_array != 0).view(np.uint8)
+
+            self._rowCounts = occupied.sum(axis=1, dtype=np.int32)
+            self._columnCounts = occupied.sum(axis=0, dtype=np.int32)
+
+        return self._rowCounts, self._columnCounts
+
+    def content_bounds(self):
+        """
+        Bounding (x, y, w, h) rect of the non transparent pixels, or None for an empty
+        surface. Cached until the surface changes.
+        """
+
+        if self._bounds is None or self._bounds[0] != self._generation:
+
+            row_counts, column_counts = self.occupancy()
+
+            rows = np.flatnonzero(row_counts)
+
+            if len(rows) == 0:
+                bounds = None
+            else:
+                columns = np.flatnonzero(column_counts)
+
+                bounds = (int(columns[0]), int(rows[0]), int(columns[-1] - columns[0]) + 1,
+                          int(rows[-1] - rows[0]) + 1)
+
+            self._bounds = (self._generation, bounds)
+
+        return self._bounds[1]
+
+    def mark_dirty(self, rect=None):
+        """
+        Records a change to the pixels.
+
+        rect: QRect or (x, y, w, h) holding every changed pixel, None if not known. Only the
+        occupancy of the rows and columns crossing it is counted again, and only that area
+        of cached composites is composited again.
+        """
+
+        self._generation += 1
+        self._dirty = True
+
+        if rect is not None:
+
+            if hasattr(rect, 'getRect'):
+                rect = rect.getRect()
+
+            x, y, w, h = rect
+
+            left, top = max(x, 0), max(y, 0)
+            right, bottom = min(x + w, self._width), min(y + h, self._height)
+
+            rect = (left, top, max(right - left, 0), max(bottom - top, 0))
+
+        self._changes.append(rect)
+
+        if self._rowCounts is None:
+            return
+
+        if rect is None:
+            self._rowCounts = self._columnCounts = None
+            return
+
+        if right <= left or bottom <= top:
+            return
+
+        # Recounting reads whole rows and columns, which past a point costs more than
+        # counting everything again when next needed
+        if (bottom - top) * self._width + (right - left) * self._height >= \
+                self._width * self._height:
+            self._rowCounts = self._columnCounts = None
+            return
+
+        pixels = self.const_pixel_array
+
+        self._rowCounts[top:bottom] = (pixels[top:bottom] != 0).view(np.uint8).sum(
+            axis=1, dtype=np.int32)
+        self._columnCounts[left:right] = (pixels[:, left:right] != 0).view(np.uint8).sum(
+            axis=0, dtype=np.int32)
+
+    def changed_rect(self, generation):
+        """
+        Bounding (x, y, w, h) rect of the pixels changed since generation, from the rects
+        passed to mark_dirty. None if none changed; the whole surface if that isn't known.
+        """
+
+        changes = self._generation - generation
+
+        if changes == 0:
+            return None
+
+        if changes < 0 or changes > len(self._changes):
+            return 0, 0, self._width, self._height
+
+        left = top = right = bottom = None
+
+        for rect in list(self._changes)[-changes:]:
+
+            if rect is None:
+                return 0, 0, self._width, self._height
+
+            x, y, w, h = rect
+
+            if w == 0 or h == 0:
+                continue
+
+            if left is None:
+                left, top, right, bottom = x, y, x + w, y + h
+            else:
+                left, top = min(left, x), min(top, y)
+                right, bottom = max(right, x + w), max(bottom, y + h)
+
+        if left is None:
+            return None
+
+        return left, top, right - left, bottom - top
+
+    def mark_saved(self, sprite_file, chunk, generation):
+        """
+        Records that the pixels as of generation are stored in chunk of sprite_file. The
+        surface stays dirty if it was changed again in the meantime.
+        """
+
+        self._source = (sprite_file, chunk)
+
+        if self._generation == generation:
+            self._dirty = False
+
     def resize(self, width, height):
 
         new_image = utils.create_image(width, height)
 
         painter = QPainter(new_image)
 
-        painter.drawImage(0, 0, self._image)
+        painter.drawImage(0, 0, self.const_image)
 
-        self._image = new_image
+        painter.end()
 
-        self._resize_pixel_buffer()
+        self._set_image(new_image)
 
-    def scale(self, scale_width, scale_height):
+        self.mark_dirty()
 
-        cur_width = self.width()
-        cur_height = self.height()
+    def scale(self, scale_width, scale_height):
 
-        new_width = cur_width * scale_width
-        new_height = cur_height * scale_height
+        new_width = int(round(self._width * scale_width))
+        new_height = int(round(self._height * scale_height))
 
-        self._image = self._image.scaled(new_width, new_height)
+        self._set_image(self.const_image.scaled(new_width, new_height))
 
-        self._resize_pixel_buffer()
+        self.mark_dirty()
 
     def paste(self, image, x=None, y=None):
 
-        painter = QPainter(self._image)
+        painter = QPainter(self.image)
 
         if x is None:
-            x = self._image.width() // 2 - image.width() // 2
+            x = self._width // 2 - image.width() // 2
 
         if y is None:
-            y = self._image.height() // 2 - image.height() // 2
+            y = self._height // 2 - image.height() // 2
 
         painter.drawImage(x, y, image)
 
-    def _resize_pixel_buffer(self):
+        painter.end()
+
+        self.mark_dirty((x, y, image.width(), image.height()))
 
-        self._pixelData = self._image.bits()
-        self._pixelData.setsize(self._image.byteCount())
+    def paste_pixels(self, pixels, x=None, y=None):
+        """
+        Copies a (height, width) uint32 array of premultiplied pixels into the surface,
+        replacing the pixels under it. Centered like paste() when no position is given.
+        """
+
+        height, width = pixels.shape
 
-    def __getstate__(self):
-        if self._byteArray is None or self._byteArray.is_empty():
-            self._byteArray = utils.image_to_byte_array(self._image)
+        if x is None:
+            x = self._width // 2 - width // 2
 
-        state = self.__dict__.copy()
+        if y is None:
+            y = self._height // 2 - height // 2
 
-        del state['_image']
-        del state['_pixelData']
+        self.pixel_array[y:y + height, x:x + width] = pixels
 
-        return state
+        self.mark_dirty((x, y, width, height))
 
-    def __setstate__(self, state):
-        self.__dict__.update(state)
-        self._image = utils.byte_array_to_image(self._byteArray)
-        self._byteArray.clear()
\ No newline at end of file
+    def encode(self, sprite_file=None):
+
+        return self.encoder(sprite_file)()
+
+    def encoder(self, sprite_file=None):
+        """
+        Returns a function building the Chunk to store this surface's pixels in. Pixels are
+        copied right away, so the function can run on any thread while the surface keeps
+        being edited. Only dirty surfaces are encoded; the chunk of a clean one is reused as is
+        if it already lives in sprite_file.
+        """
+
+        if self._source is not None:
+
+            source_file, chunk = self._source
+
+            if not self._dirty:
+
+                if source_file is sprite_file:
+                    return lambda: chunk
+
+                # Still encoded in another file: copy the bytes over without decoding them
+                return lambda: Chunk(chunk.codec, chunk.size, length=chunk.length,
+                                     data=source_file.read_raw(chunk), digest=chunk.digest)
+
+        # Evicted surfaces are read straight from their slot, without building an image
+        if self._image is None and self._slot is not None:
+            pixels = self._slot.read(self._width * self._height * 4)
+        else:
+            pixels = self.const_pixel_data.asstring()
+
+        width, height, digest = self._width, self._height, self.digest
+
+        def encode():
+
+            chunk = Chunk.from_pixels(pixels)
+            chunk.digest = digest or content_digest(width, height, pixels)
+
+            return chunk
+
+        return encode
+
+    def share(self):
+        """
+        Makes the surface use the same pixel buffer as the surfaces of its store holding the
+        same pixels, if any, and lets later ones share its own. The buffer is copied once
+        either of them is written to. Does nothing for surfaces outside a store.
+        """
+
+        if self._store is None:
+            return
+
+        self._use(writable=False)
+
+        if self._slot.digest is not None:
+            return
+
+        digest = content_digest(self._width, self._height, self._slot.view())
+
+        slot = self._store.share(self._slot, digest)
+
+        if slot is not self._slot:
+            self._switch_slot(slot)
+
+    def clone(self):
+        """
+        Copy of the surface with the same pixels and properties. Within a store both share
+        their pixels until one of them is edited.
+        """
+
+        clone = Surface(self._name, self._width, self._height, store=self._store)
+
+        if self._store is not None:
+            self.share()
+            clone._set_slot(self._store.acquire(self._slot.digest))
+        else:
+            clone._set_image(self.const_image.copy())
+
+        clone._id = self._id
+        clone._opacity = self._opacity
+        clone._visible = self._visible
+        clone._blendMode = self._blendMode
+
+        if self._rowCounts is not None:
+            clone._rowCounts = self._rowCounts.copy()
+            clone._columnCounts = self._columnCounts.copy()
+
+        return clone
+
+    def evict(self):
+        """
+        Drops the image of a surface kept in a SurfaceStore. The pixels stay in the store
+        and a new image is built over them on next use. Called by the store.
+        """
+
+        self._image = None
+        self._pixelData = None
+
+        self._slot.release()
+
+    def _use(self, writable):
+
+        if self._image is None:
+            self._load()
+        elif self._store is not None:
+            self._store.touch(self, self._slot.size)
+
+        # Copy on write: pixels shared with other surfaces are copied before being changed
+        if writable and self._store is not None and self._slot.digest is not None and \
+                not self._store.unshare(self._slot):
+
+            slot = self._store.allocate(self._slot.size)
+            slot.copy_from(self._slot)
+
+            self._switch_slot(slot)
+            self._load()
+
+    def _load(self):
+
+        if self._store is not None:
+
+            if self._slot is None:
+
+                if self._source is not None:
+                    self._set_slot(self._source_slot())
+                else:
+                    self._set_slot(self._store.allocate(self._width * self._height * 4))
+
+            self._image = self._slot.image(self._width, self._height)
+
+            self._pixelData = self._image.bits()
+            self._pixelData.setsize(self._image.byteCount())
+
+            self._store.touch(self, self._slot.size)
+
+            return
+
+        image = utils.create_image(self._width, self._height)
+
+        utils.image_to_array(image)[:] = np.frombuffer(
+            self._read_source(), np.uint32).reshape(self._height, self._width)
+
+        self._set_image(image)
+
+    def _source_slot(self):
+
+        # Surfaces loaded from chunks with the same pixels share them, decoded only once.
+        # Chunks written before digests were stored get one here
+        chunk = self._source[1]
+
+        slot = self._store.acquire(chunk.digest) if chunk.digest is not None else None
+
+        if slot is not None:
+            return slot
+
+        slot = self._store.allocate(self._width * self._height * 4)
+        slot.write(self._read_source())
+
+        if chunk.digest is None:
+            chunk.digest = content_digest(self._width, self._height, slot.view())
+
+        shared = self._store.share(slot, chunk.digest)
+
+        if shared is not slot:
+            self._store.free(slot)
+
+        return shared
+
+    def _read_source(self):
+
+        # A background save may be switching the surface over to a new file
+        with file_lock:
+            source_file, chunk = self._source
+            return source_file.read_chunk(chunk)
+
+    def _set_image(self, image):
+
+        self._width = image.width()
+        self._height = image.height()
+
+        self._rowCounts = self._columnCounts = None
+
+        if self._store is not None:
+
+            # Pixels are copied into a slot of the new size and the image replaced by a view
+            self._store.forget(self)
+
+            self._set_slot(self._store.allocate(self._width * self._height * 4))
+
+            image = image.convertToFormat(QImage.Format_ARGB32_Premultiplied)
+
+            self._slot.write(image.constBits().asstring(image.byteCount()))
+
+            self._image = None
+            self._load()
+
+            return
+
+        self._image = image
+
+        self._pixelData = self._image.bits()
+        self._pixelData.setsize(self._image.byteCount())
+
+    def _switch_slot(self, slot):
+
+        # Views over the previous slot are dropped; the next use builds one over the new one
+        self._store.forget(self)
+
+        self._image = None
+        self._pixelData = None
+
+        self._set_slot(slot)
+
+    def _set_slot(self, slot):
+
+        # Slots go back to the store once the surface is replaced or collected
+        if self._slotFinalizer is not None:
+            self._slotFinalizer()
+
+        self._slot = slot
+        self._slotFinalizer = weakref.finalize(self, self._store.free, slot)
+
+    def __setstate__(self, state):
+
+        # Only used to read sprites saved with the old pickle based format
+        self.__dict__.update(state)
+
+        self._source = None
+        self._store = None
+        self._slot = None
+        self._slotFinalizer = None
+        self._generation = 0
+        self._dirty = True
+        self._changes = deque(maxlen=self.CHANGE_LOG_SIZE)
+        self._bounds = None
+        self._rowCounts = None
+        self._columnCounts = None
+        self._visible = True
+        self._blendMode = compositor.BLEND_NORMAL
+        self._set_image(utils.byte_array_to_image(state['_byteArray']))
+
+        del self._byteArray
+
+
+# -------------------------------------------------------------------------------------------------
+
+
+class SaveJob(Job):
+    """
+    Saves a Sprite. Everything that reads the sprite, including copying the pixels of
+    modified surfaces, is done when the job is created; encoding runs on the worker pool and
+    the sprite is only pointed at the new file once it is safely in place. Surfaces with the
+    same pixels are stored in a single chunk.
+    """
+
+    def __init__(self, sprite, save_path, max_workers=None):
+
+        super(SaveJob, self).__init__('Saving {0}'.format(os.path.basename(save_path)),
+                                      max_workers)
+
+        self._sprite = sprite
+        self._savePath = save_path
+
+        self._base = sprite._spriteFile \
+            if sprite._spriteFile is not None and sprite._spriteFile.path == save_path else None
+
+        # (surface, generation, index entry) of every surface
+        self._surfaces = []
+        self._encoders = []
+
+        # digest -> (encoder index, surface) of surfaces whose digest is known up front, so
+        # shared pixels are only copied and encoded once
+        encoded_digests = {}
+
+        animation_entries = []
+
+        for animation in sprite.animations:
+
+            frame_entries = []
+
+            for frame in animation.frames:
+
+                surface_entries = []
+
+                for surface in frame.surfaces:
+
+                    entry = {
+                        'name': surface.name,
+                        'id': surface.id,
+                        'opacity': surface.opacity,
+                        'visible': surface.visible,
+                        'blend_mode': surface.blend_mode,
+                        'width': surface.width,
+                        'height': surface.height,
+                        'chunk': len(self._encoders)
+                    }
+
+                    digest = surface.digest
+                    encoded = encoded_digests.get(digest) if digest is not None else None
+
+                    if encoded is None:
+
+                        if digest is not None:
+                            encoded_digests[digest] = (len(self._encoders), surface)
+
+                        self._encoders.append(surface.encoder(self._base))
+
+                    else:
+
+                        entry['chunk'], encoded_surface = encoded
+
+                        # Chunks already stored are reused rather than encoded again
+                        if encoded_surface.is_dirty and not surface.is_dirty:
+                            self._encoders[entry['chunk']] = surface.encoder(self._base)
+                            encoded_digests[digest] = (entry['chunk'], surface)
+
+                    surface_entries.append(entry)
+
+                    self._surfaces.append((surface, surface.generation, entry))
+
+                frame_entries.append({
+                    'current_surface': frame.current_surface_index,
+                    'surfaces': surface_entries
+                })
+
+            animation_entries.append({
+                'name': animation.name,
+                'current_frame': animation.current_frame_index,
+                'frames': frame_entries
+            })
+
+        self._index = {
+            'width': sprite.width,
+            'height': sprite.height,
+            'current_animation': sprite.current_animation_index,
+            'animations': animation_entries
+        }
+
+    @property
+    def save_path(self):
+        return self._savePath
+
+    def run(self):
+
+        encoded_chunks = self.map(lambda encoder: encoder(), self._encoders)
+
+        # Pixel copies are not needed anymore
+        self._encoders = None
+
+        self.check_cancelled()
+
+        # Chunks that turned out to hold the same pixels are written once
+        chunks = []
+        chunk_indices = []
+
+        unique_chunks = {}
+
+        for chunk in encoded_chunks:
+
+            key = chunk.digest if chunk.digest is not None else id(chunk)
+
+            if key not in unique_chunks:
+                unique_chunks[key] = len(chunks)
+                chunks.append(chunk)
+
+            chunk_indices.append(unique_chunks[key])
+
+        for _, _, entry in self._surfaces:
+            entry['chunk'] = chunk_indices[entry['chunk']]
+
+        return SpriteFile.write(self._savePath, self._index, chunks, self._base, self._commit)
+
+    def _commit(self, sprite_file):
+
+        self._sprite.file_path = self._savePath
+        self._sprite._spriteFile = sprite_file
+
+        for surface, generation, entry in self._surfaces:
+            surface.mark_saved(sprite_file, sprite_file.chunks[entry['chunk']], generation)
+
+
+# -------------------------------------------------------------------------------------------------
+
+
+class ExportJob(Job):
+    """
+    Exports every animation of a Sprite to a texture atlas (see atlas). The layers of every frame
+    are copied when the job is created; frames are flattened and trimmed on the worker pool,
+    identical ones are kept once, and all of them are packed into as few pages as they fit in.
+    Pages are then drawn and encoded on the pool too.
+
+    name: base name of the atlas files; the sprite's file name, or 'sprite' if it has none.
+    max_size: largest page side; appdata.max_texture_size by default.
+    packer, padding, extrude, allow_rotation, power_of_two: how frames are packed in pages.
+    frame_duration: duration of every frame in the metadata, in milliseconds.
+    pivot: (x, y) pivot of every frame, relative to its untrimmed size.
+    """
+
+    def __init__(self, sprite, directory, name=None, max_size=None, packer=atlas.DEFAULT_PACKER,
+                 padding=0, extrude=0, allow_rotation=False, power_of_two=False,
+                 frame_duration=None, pivot=(0.5, 0.5), max_workers=None):
+
+        super(ExportJob, self).__init__('Exporting {0}'.format(os.path.basename(directory)),
+                                        max_workers)
+
+        if name is None:
+            name = os.path.splitext(os.path.basename(sprite.file_path or ''))[0] or 'sprite'
+
+        self._directory = directory
+        self._name = name
+
+        self._maxSize = max_size if max_size is not None else appdata.max_texture_size
+        self._packer = packer
+        self._extrude = extrude
+        self._packOptions = dict(padding=padding, extrude=extrude, allow_rotation=allow_rotation,
+                                 power_of_two=power_of_two)
+
+        self._frameDuration = frame_duration
+        self._pivot = pivot
+
+        self._width = sprite.width
+        self._height = sprite.height
+
+        # animation name -> names of its frames
+        self._animations = {}
+
+        # (layers, content bounds) of every distinct frame, with copies of the non empty
+        # layers' pixels. Frames are trimmed to their bounds as they are flattened
+        self._renders = []
+
+        # (frame name, render index) of every frame
+        self._frames = []
+
+        # Frames that look the same are only copied and flattened once
+        render_indices = {}
+
+        for animation, animation_name in zip(sprite.animations, _export_names(sprite)):
+
+            names = self._animations[animation_name] = []
+
+            for index, frame in enumerate(animation.frames):
+
+                key = _render_key(frame)
+
+                render = render_indices.get(key)
+
+                if render is None:
+                    render = render_indices[key] = len(self._renders)
+                    self._renders.append((_copy_layers(frame), frame.content_bounds()))
+
+                names.append(atlas.frame_name(animation_name, index))
+
+                self._frames.append((names[-1], render))
+
+        self._pages = None
+
+    @property
+    def directory(self):
+        return self._directory
+
+    def run(self):
+
+        trimmed_renders = self.map(self._trim_render, range(len(self._renders)))
+
+        self.check_cancelled()
+
+        # Frames with the same pixels are packed once and share their place in the atlas
+        images = []
+        image_indices = []
+
+        unique_images = {}
+
+        for image, digest in trimmed_renders:
+
+            key = (image.width(), image.height(), digest)
+
+            if key not in unique_images:
+                unique_images[key] = len(images)
+                images.append(image)
+
+            image_indices.append(unique_images[key])
+
+        packers, placements = atlas.pack_pages([(image.width(), image.height())
+                                                for image in images],
+                                               self._maxSize, self._maxSize, self._packer,
+                                               **self._packOptions)
+
+        self._pages = [(packer, []) for packer in packers]
+
+        for image, (page, placement) in zip(images, placements):
+            self._pages[page][1].append((image, placement))
+
+        image_paths = self.map(self._write_page, range(len(self._pages)))
+
+        self.check_cancelled()
+
+        file_names = atlas.page_file_names(self._name, len(self._pages))
+
+        page_frames = [[] for _ in self._pages]
+
+        for name, render in self._frames:
+
+            page, placement = placements[image_indices[render]]
+
+            bounds = self._renders[render][1]
+
+            width, height = placement.width, placement.height
+
+            if placement.rotated:
+                width, height = height, width
+
+            page_frames[page].append(atlas.AtlasFrame(
+                name, page, placement.x, placement.y, width, height, placement.rotated,
+                bounds, (self._width, self._height), self._pivot, self._frameDuration))
+
+        data_paths = []
+
+        for page, (packer, _) in enumerate(self._pages):
+
+            image_name, data_name = file_names[page]
+
+            data_paths.append(atlas.write_page_document(
+                os.path.join(self._directory, data_name), page_frames[page], image_name,
+                (packer.width, packer.height), self._animations,
+                [names[1] for names in file_names if names[1] != data_name]))
+
+        return image_paths + data_paths
+
+    def _trim_render(self, index):
+
+        layers, bounds = self._renders[index]
+
+        # Empty frames become a single transparent pixel
+        if bounds is None:
+            bounds = (0, 0, 1, 1)
+
+        # The pixel copies are not needed past this point
+        self._renders[index] = (None, bounds)
+
+        image = compositor.flatten(layers, self._width, self._height, bounds)
+
+        pixels = np.ascontiguousarray(utils.image_to_array(image, writable=False))
+
+        return image, hashlib.sha1(pixels).digest()
+
+    def _write_page(self, page):
+
+        self.check_cancelled()
+
+        packer, tiles = self._pages[page]
+
+        image = atlas.draw_page(packer.width, packer.height, tiles, self._extrude)
+
+        file_path = os.path.join(self._directory,
+                                 atlas.page_file_names(self._name, len(self._pages))[page][0])
+
+        if not image.save(file_path, 'PNG'):
+            raise Exception("Couldn't write {0}".format(file_path))
+
+        return file_path
+
+
+# -------------------------------------------------------------------------------------------------
+
+
+class FrameExportJob(Job):
+    """
+    Exports every frame of a Sprite to its own PNG, cropped to its content, as
+    '<animation>/frame<index>.png' under a directory, with animation folders named after the
+    animations, made unique and safe as file names. Frames are flattened, cropped and encoded
+    on the worker pool; frames that look the same are flattened and encoded once.
+
+    A manifest.json next to the animation folders records the content digest of every file
+    written. With incremental, frames whose digest is the same as in the last export are not
+    written again, and frames whose layers are all unchanged since then are not even
+    flattened. Files of frames that no longer exist are removed either way.
+    """
+
+    MANIFEST = 'manifest.json'
+
+    def __init__(self, sprite, directory, incremental=False, max_workers=None):
+
+        super(FrameExportJob, self).__init__('Exporting {0}'.format(os.path.basename(directory)),
+                                             max_workers)
+
+        self._directory = directory
+        self._incremental = incremental
+
+        self._width = sprite.width
+        self._height = sprite.height
+
+        # file name -> {'source': digest of the layers or None, 'digest': digest of the image}
+        self._previous = self._read_manifest()
+        self._manifest = {}
+
+        # (layers, content bounds, [(file name, source digest)]) of every distinct frame that
+        # has to be exported
+        self._renders = []
+
+        render_indices = {}
+
+        # Folders named after the animations, told apart when their names clash
+        folders = _export_names(sprite, reserved=(self.MANIFEST,))
+
+        for animation, folder in zip(sprite.animations, folders):
+
+            for index, frame in enumerate(animation.frames):
+
+                file_name = '{0}/frame{1}.png'.format(folder, index)
+
+                key = _render_key(frame)
+
+                source = _source_digest(key, self._width, self._height)
+
+                previous = self._previous.get(file_name)
+
+                # Frames made of the same layers as last time are kept without being flattened
+                if incremental and source is not None and previous is not None and \
+                        previous['source'] == source and os.path.exists(self._path(file_name)):
+                    self._manifest[file_name] = previous
+                    continue
+
+                render = render_indices.get(key)
+
+                if render is None:
+                    render = render_indices[key] = len(self._renders)
+                    self._renders.append((_copy_layers(frame), frame.content_bounds(), []))
+
+                self._renders[render][2].append((file_name, source))
+
+    @property
+    def directory(self):
+        return self._directory
+
+    def run(self):
+
+        written = self.map(self._export_render, range(len(self._renders)))
+
+        self.check_cancelled()
+
+        for file_name in self._previous:
+
+            if file_name not in self._manifest and os.path.exists(self._path(file_name)):
+                os.remove(self._path(file_name))
+
+        if self._manifest != self._previous:
+
+            with open(os.path.join(self._directory, self.MANIFEST), 'w',
+                      encoding='utf-8') as file:
+                json.dump({'version': 1, 'files': self._manifest}, file, indent=2,
+                          sort_keys=True)
+
+        return [path for paths in written for path in paths]
+
+    def _export_render(self, index):
+
+        self.check_cancelled()
+
+        layers, bounds, files = self._renders[index]
+
+        # The pixel copies are not needed past this point
+        self._renders[index] = (None, bounds, files)
+
+        image = compositor.flatten(layers, self._width, self._height, bounds)
+
+        pixels = utils.image_to_array(image, writable=False)
+
+        digest = content_digest(image.width(), image.height(), np.ascontiguousarray(pixels))
+
+        data = None
+        written = []
+
+        for file_name, source in files:
+
+            self._manifest[file_name] = {'source': source, 'digest': digest}
+
+            previous = self._previous.get(file_name)
+
+            if self._incremental and previous is not None and previous['digest'] == digest \
+                    and os.path.exists(self._path(file_name)):
+                continue
+
+            if data is None:
+                data = bytes(utils.image_to_byte_array(image))
+
+            path = self._path(file_name)
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            with open(path, 'wb') as file:
+                file.write(data)
+
+            written.append(path)
+
+        return written
+
+    def _path(self, file_name):
+
+        return os.path.join(self._directory, *file_name.split('/'))
+
+    def _read_manifest(self):
+
+        try:
+            with open(os.path.join(self._directory, self.MANIFEST), encoding='utf-8') as file:
+                return json.load(file)['files']
+        except (OSError, ValueError, KeyError):
+            return {}
+
+
+# Characters that can't be in file names on some systems, and '/', which separates an
+# animation's name from the frame index in atlas frame names
+_UNSAFE_NAME_CHARACTERS = re.compile(r'[<>:"/\\|?*\x00-\x1f]')
+
+
+def _export_names(sprite, reserved=()):
+    """
+    Name of every animation of sprite to export it under: its own name, made safe as a file
+    name, and numbered when animations share one. Names only differing in case are taken to
+    be the same, as they are by some file systems.
+
+    reserved: names none of the animations may get.
+    """
+
+    taken = {name.lower() for name in reserved}
+
+    names = []
+
+    for animation in sprite.animations:
+
+        base = _UNSAFE_NAME_CHARACTERS.sub('_', animation.name).strip().rstrip('.')
+        base = base or 'Animation'
+
+        name = base
+        number = 2
+
+        while name.lower() in taken:
+            name = '{0} ({1})'.format(base, number)
+            number += 1
+
+        taken.add(name.lower())
+        names.append(name)
+
+    return names
+
+
+def _frame_from_pixels(animation, pixels, x=None, y=None):
+
+    # A frame with a single surface holding pixels, copied straight into it
+    surface = Surface('Layer 0', animation.sprite.width, animation.sprite.height,
+                      store=animation.sprite.store)
+
+    surface.paste_pixels(pixels, x, y)
+
+    # Repeated cells, like empty ones, share their pixels
+    surface.share()
+
+    frame = Frame(animation)
+    frame._surfaces.append(surface)
+    frame._current_surface_index = 0
+
+    return frame
+
+
+def _render_key(frame):
+
+    # Equal for frames whose visible layers hold the same pixels with the same opacity and
+    # blend modes, which look the same
+    return tuple((surface.digest or id(surface), surface.opacity, surface.blend_mode)
+                 for surface in frame.surfaces if surface.visible)
+
+
+def _source_digest(render_key, width, height):
+
+    # Digest of the layers a frame is made of, if all of their digests are known
+    if any(not isinstance(layer[0], str) for layer in render_key):
+        return None
+
+    return hashlib.blake2b(repr((width, height, render_key)).encode('utf-8'),
+                           digest_size=16).hexdigest()
+
+
+def _copy_layers(frame):
+
+    # Copies of the non empty layers' pixels, which can be read on any thread
+    return [(pixels.asstring(), opacity, mode, bounds)
+            for pixels, opacity, mode, bounds in frame.layers() if bounds is not None]
@@ -0,0 +1,386 @@
+# --------------------------------------------------------------------------------------------------
+# Name:        SpriteFile
+# Purpose:     Chunked binary container used to store Sprites (.spr)
+#
+#              [header][pixel chunk][pixel chunk]...[index]
+#
+#              The header holds the format version and the position of the index. The index is
+#              a JSON document describing animations, frames and surfaces, and the byte range and
+#              codec of every pixel chunk, so any surface can be read on its own.
+#--------------------------------------------------------------------------------------------------
+
+import json
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import zlib
+
+try:
+    import lz4.frame as lz4
+except ImportError:
+    lz4 = None
+
+
+MAGIC = b'SPRM'
+VERSION = 1
+
+# magic, version, flags, index offset, index length
+_HEADER = struct.Struct('<4sHHQQ')
+
+HEADER_SIZE = 32
+
+CODEC_RAW = 'raw'
+CODEC_ZLIB = 'zlib'
+CODEC_LZ4 = 'lz4'
+
+DEFAULT_CODEC = CODEC_LZ4 if lz4 is not None else CODEC_ZLIB
+
+# Incremental saves append to the file; once more than this fraction of it is
+# unreferenced chunks the file is rewritten from scratch
+_MAX_GARBAGE_RATIO = 0.5
+
+# Held while chunks are read and while a saved file replaces the previous one, so a read never
+# sees chunk offsets of one version of a file applied to the bytes of another
+file_lock = threading.RLock()
+
+
+class SpriteFileError(Exception):
+    pass
+
+
+def is_sprite_file(path):
+
+    with open(path, 'rb') as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+
+def encode(data, codec=DEFAULT_CODEC):
+
+    if codec == CODEC_RAW:
+        return bytes(data)
+
+    if codec == CODEC_ZLIB:
+        return zlib.compress(data, 1)
+
+    if codec == CODEC_LZ4:
+
+        if lz4 is None:
+            raise SpriteFileError('lz4 codec requested but the lz4 module is not installed')
+
+        return lz4.compress(data)
+
+    raise SpriteFileError('Unknown codec: {0}'.format(codec))
+
+
+def decode(data, codec):
+
+    if codec == CODEC_RAW:
+        return data
+
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(data)
+
+    if codec == CODEC_LZ4:
+
+        if lz4 is None:
+            raise SpriteFileError('File uses the lz4 codec but the lz4 module is not installed')
+
+        return lz4.decompress(data)
+
+    raise SpriteFileError('Unknown codec: {0}'.format(codec))
+
+
+class Chunk(object):
+    def __init__(self, codec, size, offset=None, length=None, data=None, digest=None):
+
+        self.codec = codec
+
+        # Decoded size in bytes
+        self.size = size
+
+        # Content digest of the decoded pixels (see surface_store.content_digest). None in
+        # files written before digests were stored
+        self.digest = digest
+
+        # Position of the encoded bytes inside the container. None until written
+        self.offset = offset
+        self.length = length
+
+        # Encoded bytes waiting to be written
+        self.data = data
+
+    @staticmethod
+    def from_pixels(pixels, codec=DEFAULT_CODEC):
+
+        data = encode(pixels, codec)
+
+        return Chunk(codec, len(pixels), length=len(data), data=data)
+
+    def to_dict(self):
+
+        entry = {'codec': self.codec, 'size': self.size, 'offset': self.offset,
+                 'length': self.length}
+
+        if self.digest is not None:
+            entry['digest'] = self.digest
+
+        return entry
+
+    @staticmethod
+    def from_dict(entry):
+
+        return Chunk(entry['codec'], entry['size'], entry['offset'], entry['length'],
+                     digest=entry.get('digest'))
+
+
+class SpriteFile(object):
+    def __init__(self, path, index, chunks, file_size):
+
+        self._path = path
+        self._index = index
+        self._chunks = chunks
+        self._fileSize = file_size
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def index(self):
+        return self._index
+
+    @property
+    def chunks(self):
+        return self._chunks
+
+    def read_raw(self, chunk):
+
+        if chunk.data is not None:
+            return chunk.data
+
+        with file_lock, open(self._path, 'rb') as file:
+            file.seek(chunk.offset)
+            data = file.read(chunk.length)
+
+        if len(data) != chunk.length:
+            raise SpriteFileError('Truncated chunk in {0}'.format(self._path))
+
+        return data
+
+    def read_chunk(self, chunk):
+
+        data = decode(self.read_raw(chunk), chunk.codec)
+
+        if len(data) != chunk.size:
+            raise SpriteFileError('Corrupted chunk in {0}'.format(self._path))
+
+        return data
+
+    def _chunk_ids(self):
+
+        return set(id(chunk) for chunk in self._chunks)
+
+    # ---------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def open(path):
+
+        with open(path, 'rb') as file:
+
+            header = file.read(HEADER_SIZE)
+
+            if len(header) < HEADER_SIZE:
+                raise SpriteFileError('{0} is not a sprite file'.format(path))
+
+            magic, version, _, index_offset, index_length = _HEADER.unpack_from(header)
+
+            if magic != MAGIC:
+                raise SpriteFileError('{0} is not a sprite file'.format(path))
+
+            if version > VERSION:
+                raise SpriteFileError('{0} was saved by a newer version (format {1})'
+                                      .format(path, version))
+
+            file.seek(index_offset)
+            index = json.loads(file.read(index_length).decode('utf-8'))
+
+            file_size = file.seek(0, os.SEEK_END)
+
+        chunks = [Chunk.from_dict(entry) for entry in index.pop('chunks')]
+
+        return SpriteFile(path, index, chunks, file_size)
+
+    @staticmethod
+    def write(path, index, chunks, base=None, on_commit=None):
+        """
+        Writes a container and returns the SpriteFile describing it.
+
+        index: JSON serializable description of the sprite. Chunks are referenced by their
+        position in the chunks list.
+        chunks: list of Chunks. Chunks that hold encoded data are written; the others must
+        belong to base.
+        base: SpriteFile previously read from or written to path. When given, unchanged
+        chunks are kept where they are and only new ones are appended to the file.
+        on_commit: called with the new SpriteFile, while holding file_lock, right after the
+        file on disk switched over to the new version.
+        """
+
+        if base is not None and SpriteFile._can_append(path, chunks, base):
+            return SpriteFile._append(path, index, chunks, base, on_commit)
+
+        # Everything is rewritten, so chunks that are only on disk have to be read first.
+        # They are copied instead of modified as they may still be used to read from base.
+        written = []
+
+        for chunk in chunks:
+
+            if chunk.data is None:
+
+                if base is None:
+                    raise SpriteFileError('Chunk has no data and no source file')
+
+                chunk = Chunk(chunk.codec, chunk.size, length=chunk.length,
+                              data=base.read_raw(chunk), digest=chunk.digest)
+
+            written.append(chunk)
+
+        # The new file is built next to the old one and renamed over it once complete, so a
+        # failed save never leaves a half written sprite behind
+        directory, name = os.path.split(os.path.abspath(path))
+
+        handle, temp_path = tempfile.mkstemp(prefix=name + '.', suffix='.tmp', dir=directory)
+
+        try:
+
+            with os.fdopen(handle, 'wb') as file:
+
+                file.write(bytes(HEADER_SIZE))
+
+                SpriteFile._write_chunks(file, written)
+
+                index_offset, index_length = SpriteFile._write_index(file, index, written)
+
+                file_size = file.tell()
+
+                file.seek(0)
+                file.write(_HEADER.pack(MAGIC, VERSION, 0, index_offset, index_length))
+
+                file.flush()
+                os.fsync(file.fileno())
+
+            # mkstemp creates owner only files
+            if os.path.exists(path):
+                shutil.copymode(path, temp_path)
+            else:
+                os.chmod(temp_path, 0o644)
+
+            sprite_file = SpriteFile(path, index, written, file_size)
+
+            with file_lock:
+
+                os.replace(temp_path, path)
+
+                if on_commit is not None:
+                    on_commit(sprite_file)
+
+        except BaseException:
+
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+            raise
+
+        return sprite_file
+
+    @staticmethod
+    def _can_append(path, chunks, base):
+
+        if os.path.abspath(base.path) != os.path.abspath(path) or not os.path.exists(path):
+            return False
+
+        if os.path.getsize(path) != base._fileSize:
+            return False
+
+        owned = base._chunk_ids()
+
+        live_bytes = 0
+        new_bytes = 0
+
+        for chunk in chunks:
+
+            if chunk.data is None:
+
+                if id(chunk) not in owned:
+                    return False
+
+                live_bytes += chunk.length
+
+            else:
+
+                new_bytes += chunk.length
+
+        total_bytes = base._fileSize + new_bytes
+        garbage_bytes = total_bytes - live_bytes - new_bytes
+
+        return garbage_bytes <= total_bytes * _MAX_GARBAGE_RATIO
+
+    @staticmethod
+    def _append(path, index, chunks, base, on_commit):
+
+        with open(path, 'r+b') as file:
+
+            file.seek(0, os.SEEK_END)
+
+            SpriteFile._write_chunks(file, chunks)
+
+            index_offset, index_length = SpriteFile._write_index(file, index, chunks)
+
+            file_size = file.tell()
+
+            # The old index stays valid until the header is switched over, so an interrupted
+            # save leaves the previous version of the sprite readable
+            file.flush()
+            os.fsync(file.fileno())
+
+            file.seek(0)
+            file.write(_HEADER.pack(MAGIC, VERSION, 0, index_offset, index_length))
+
+        sprite_file = SpriteFile(path, index, chunks, file_size)
+
+        # Chunks of base never move on append, so readers are never out of sync here
+        if on_commit is not None:
+            with file_lock:
+                on_commit(sprite_file)
+
+        return sprite_file
+
+    @staticmethod
+    def _write_chunks(file, chunks):
+
+        for chunk in chunks:
+
+            if chunk.data is None:
+                continue
+
+            chunk.offset = file.tell()
+            chunk.length = len(chunk.data)
+
+            file.write(chunk.data)
+
+            chunk.data = None
+
+    @staticmethod
+    def _write_index(file, index, chunks):
+
+        document = dict(index)
+        document['chunks'] = [chunk.to_dict() for chunk in chunks]
+
+        data = json.dumps(document, separators=(',', ':')).encode('utf-8')
+
+        offset = file.tell()
+
+        file.write(data)
+
+        return offset, len(data)
@@ -0,0 +1,304 @@
+# --------------------------------------------------------------------------------------------------
+# Name:        SurfaceStore
+# Purpose:     Memory mapped scratch storage for Surface pixels. Surfaces of a store keep their
+#              pixels in an anonymous scratch file and only build a QImage over them while they are
+#              displayed or edited. The least recently used views are dropped once the resident
+#              pixels go over the memory cap, letting the OS page them out
+#
+#              Slots can also be shared by content: surfaces holding the same pixels use one slot,
+#              found by the pixels' digest, until one of them is written to and copies it
+#--------------------------------------------------------------------------------------------------
+
+import ctypes
+import hashlib
+import mmap
+import struct
+import tempfile
+import threading
+from collections import OrderedDict
+
+from PyQt5 import sip
+from PyQt5.QtGui import QImage
+
+import src.model.appdata as appdata
+
+
+def _align(size):
+
+    return -(-size // mmap.PAGESIZE) * mmap.PAGESIZE
+
+
+def content_digest(width, height, pixels):
+    """
+    Hex digest identifying width x height pixels, read from any buffer holding at least
+    width * height * 4 bytes.
+    """
+
+    digest = hashlib.blake2b(struct.pack('<II', width, height), digest_size=16)
+
+    digest.update(memoryview(pixels).cast('B')[:width * height * 4])
+
+    return digest.hexdigest()
+
+
+class _Segment(object):
+    def __init__(self, size):
+
+        # Unlinked on creation on POSIX, so scratch space is reclaimed even after a crash
+        self._file = tempfile.TemporaryFile(prefix='spritemator-')
+        self._file.truncate(size)
+
+        self.map = mmap.mmap(self._file.fileno(), size)
+
+        self.size = size
+        self.used = 0
+
+
+class Slot(object):
+    def __init__(self, segment, offset, size):
+
+        self._segment = segment
+
+        self.offset = offset
+        self.size = size
+
+        # Users of the slot, and the digest of its pixels while it is shared by content.
+        # Both are managed by the store
+        self.refs = 1
+        self.digest = None
+
+        # Pins the mapping for as long as the slot exists
+        self._buffer = (ctypes.c_char * size).from_buffer(segment.map, offset)
+
+    @property
+    def address(self):
+        return ctypes.addressof(self._buffer)
+
+    def image(self, width, height):
+        """
+        QImage using the slot's memory as its pixel buffer. Nothing is copied, so
+        painting on the image writes straight to the scratch file.
+        """
+
+        return QImage(sip.voidptr(self.address), width, height, width * 4,
+                      QImage.Format_ARGB32_Premultiplied)
+
+    def read(self, size=None):
+
+        return ctypes.string_at(self.address, size if size is not None else self.size)
+
+    def view(self):
+
+        return memoryview(self._buffer)
+
+    def write(self, data):
+
+        ctypes.memmove(self._buffer, data, min(len(data), self.size))
+
+    def copy_from(self, slot):
+
+        ctypes.memmove(self._buffer, slot.address, min(slot.size, self.size))
+
+    def clear(self):
+
+        ctypes.memset(self._buffer, 0, self.size)
+
+    def release(self):
+
+        # The mapping is shared, so dropped pages are read back from the scratch file
+        # the next time they are touched
+        if hasattr(self._segment.map, 'madvise'):
+            self._segment.map.madvise(mmap.MADV_DONTNEED, self.offset, _align(self.size))
+
+
+class SurfaceStore(object):
+    def __init__(self, memory_cap=None, segment_size=None):
+
+        self._memoryCap = memory_cap if memory_cap is not None else appdata.surface_memory_cap
+
+        self._segmentSize = segment_size if segment_size is not None \
+            else appdata.surface_store_segment_size
+
+        self._segments = []
+
+        # aligned size -> freed Slots of that size
+        self._freeSlots = {}
+
+        # digest -> Slot shared by the surfaces holding those pixels
+        self._sharedSlots = {}
+
+        # Surfaces that currently have an image, least recently used first
+        self._resident = OrderedDict()
+        self._residentBytes = 0
+
+        self._lock = threading.RLock()
+
+    @property
+    def memory_cap(self):
+        return self._memoryCap
+
+    @memory_cap.setter
+    def memory_cap(self, value):
+        self._memoryCap = value
+
+        with self._lock:
+            self._evict()
+
+    @property
+    def resident_bytes(self):
+        return self._residentBytes
+
+    @property
+    def resident_count(self):
+        return len(self._resident)
+
+    def allocate(self, size):
+        """
+        Returns a zero filled Slot of at least size bytes.
+        """
+
+        aligned = _align(size)
+
+        with self._lock:
+
+            free_slots = self._freeSlots.get(aligned)
+
+            if free_slots:
+
+                slot = free_slots.pop()
+                slot.clear()
+                slot.refs = 1
+
+                return slot
+
+            segment = self._segments[-1] if len(self._segments) > 0 else None
+
+            if segment is None or segment.size - segment.used < aligned:
+                segment = _Segment(max(self._segmentSize, aligned))
+                self._segments.append(segment)
+
+            slot = Slot(segment, segment.used, aligned)
+
+            segment.used += aligned
+
+            return slot
+
+    def free(self, slot):
+        """
+        Drops a reference to slot. It is reused once no surface uses it anymore.
+        """
+
+        with self._lock:
+
+            slot.refs -= 1
+
+            if slot.refs > 0:
+                return
+
+            self._unpublish(slot)
+
+            slot.release()
+
+            self._freeSlots.setdefault(slot.size, []).append(slot)
+
+    def share(self, slot, digest):
+        """
+        Offers slot, holding pixels with the given content digest, to be shared. Returns the
+        slot already shared with those pixels, with a reference taken for the caller, or slot
+        itself if there was none. Shared slots must not be written to; see unshare.
+        """
+
+        with self._lock:
+
+            shared = self._sharedSlots.get(digest)
+
+            if shared is not None and shared is not slot:
+                shared.refs += 1
+                return shared
+
+            self._unpublish(slot)
+
+            slot.digest = digest
+
+            self._sharedSlots[digest] = slot
+
+            return slot
+
+    def acquire(self, digest):
+        """
+        Takes a reference to the slot shared with pixels of the given digest, or returns None
+        if there is none.
+        """
+
+        with self._lock:
+
+            slot = self._sharedSlots.get(digest)
+
+            if slot is not None:
+                slot.refs += 1
+
+            return slot
+
+    def unshare(self, slot):
+        """
+        Stops sharing slot so its only user can write to it. Returns False, leaving the slot
+        shared, if other surfaces use it too: the caller has to copy it instead.
+        """
+
+        with self._lock:
+
+            if slot.refs > 1:
+                return False
+
+            self._unpublish(slot)
+
+            return True
+
+    def _unpublish(self, slot):
+
+        if slot.digest is not None:
+
+            if self._sharedSlots.get(slot.digest) is slot:
+                del self._sharedSlots[slot.digest]
+
+            slot.digest = None
+
+    def touch(self, surface, size):
+        """
+        Marks surface as just used, evicting the least recently used views if the
+        resident pixels went over the memory cap.
+        """
+
+        with self._lock:
+
+            if surface in self._resident:
+                self._resident.move_to_end(surface)
+                return
+
+            self._resident[surface] = size
+            self._residentBytes += size
+
+            self._evict(keep=surface)
+
+    def forget(self, surface):
+
+        with self._lock:
+
+            size = self._resident.pop(surface, None)
+
+            if size is not None:
+                self._residentBytes -= size
+
+    def _evict(self, keep=None):
+
+        while self._residentBytes > self._memoryCap and len(self._resident) > 0:
+
+            surface, size = next(iter(self._resident.items()))
+
+            if surface is keep:
+                break
+
+            del self._resident[surface]
+            self._residentBytes -= size
+
+            surface.evict()
@@ -6,12 +6,15 @@
 # License:          
 # --------------------------------------------------------------------------------------------------
 
+import math
+
 from PyQt5.QtCore import Qt, QPoint, QRect
 from PyQt5.QtGui import QPen, QColor, QIcon, QPixmap, QPainter
 
-import src.helpers.quickpixler as quickpixler
+import src.helpers.pixler as pixler
 import src.helpers.drawing as drawing
 import src.helpers.utils as utils
+import src.model.brushes as brushes
 from src.model.properties import PropertyHolder
 
 
@@ -106,6 +109,24 @@ class Tool(PropertyHolder):
     def draw_untransformed(self, painter):
         pass
 
+    def pointer_rect(self):
+        """
+        Canvas viewport rect covering what draw_untransformed paints around the mouse, or
+        None if the tool needs the whole Canvas repainted as the mouse moves. Tools
+        returning a rect must report every change they make to the surface while the mouse
+        moves through the Canvas surfaceChanging signal.
+        """
+
+        canvas = self._canvas
+
+        # The pointer is a square of the pen size, or a cross reaching 8 pixels out
+        extent = int(math.ceil(max(canvas.pixel_size * canvas.zoom / 2, 8))) + 2
+
+        x = canvas.mouse_state.global_pos.x() + 1
+        y = canvas.mouse_state.global_pos.y() + 1
+
+        return QRect(x - extent, y - extent, extent * 2 + 1, extent * 2 + 1)
+
     # To be called when the tool needs to update itself continually
     def update(self):
         pass
@@ -192,7 +213,7 @@ class Picker(Tool):
         super(Picker, self).on_mouse_press()
 
         picked_color = \
-            QColor(self._canvas.sprite_object.active_surface.pixel(
+            QColor(self._canvas.sprite_object.current_surface.const_image.pixel(
                 self._canvas.mouse_state.sprite_pos))
 
         self._canvas.colorPicked.emit(picked_color, self._canvas.mouse_state.pressed_button)
@@ -218,10 +239,20 @@ class Pen(Tool):
 
         self._wasLockingMouse = False
 
+        # Pixel perfect corner removal of the current stroke, with the ink and color it was
+        # started with to draw its last position once it ends
+        self._corners = None
+        self._strokeInk = None
+        self._strokeColor = None
+
         self._load_icon(":/icons/ico_pen", ":/icons/ico_pen_hover")
 
         self._default = True
 
+        self.add_choice_property('brush', brushes.names(), 'Square', 'Brush')
+        self.add_ranged_property('spacing', 1, 100, 100, 'Spacing (% of Size)')
+        self.add_property('pixelperfect', False, 'Pixel Perfect')
+
     def draw_untransformed(self, painter):
 
         if not self._enablePointerDraw:
@@ -299,11 +330,24 @@ class Pen(Tool):
             mouse_state.last_sprite_pos.setY(mouse_state.sprite_pos.y())
             self._wasLockingMouse = False
 
-        delta_x = abs(mouse_state.sprite_pos.x() - mouse_state.last_sprite_pos.x())
-        delta_y = abs(mouse_state.sprite_pos.y() - mouse_state.last_sprite_pos.y())
+        last_pos = (mouse_state.last_sprite_pos.x(), mouse_state.last_sprite_pos.y())
 
-        if delta_x == 0 and delta_y == 0 and not just_pressed:
-            return
+        if just_pressed:
+            points = [(mouse_state.sprite_pos.x(), mouse_state.sprite_pos.y())]
+
+        else:
+
+            # Every position the mouse went through since the last move, not only the last one
+            points = [last_pos] + mouse_state.sprite_samples
+
+            if self._lockHorizontal and not self._lockVertical:
+                points = [(x, last_pos[1]) for x, _ in points]
+
+            elif self._lockVertical and not self._lockHorizontal:
+                points = [(last_pos[0], y) for _, y in points]
+
+            if all(point == last_pos for point in points):
+                return
 
         ink = None
         color = None
@@ -320,21 +364,45 @@ class Pen(Tool):
 
         if ink is not None and color is not None:
 
-            painter = QPainter()
+            if just_pressed:
+
+                ink.begin_stroke(canvas.sprite_object.current_surface.pixel_array, *points[0])
+
+                pixel_perfect = self.property_value('pixelperfect')
+
+                self._corners = drawing.CornerFilter() if pixel_perfect else None
+
+                self._strokeInk = ink
+                self._strokeColor = color
+
+            self._draw_stroke(points, size, ink, color, skip_first=not just_pressed)
+
+    def _draw_stroke(self, points, size, ink, color, skip_first=False):
+
+        canvas = self._canvas
+
+        surface = canvas.sprite_object.current_surface
+
+        brush = brushes.get(self.property_value('brush'))
 
-            painter.begin(canvas.sprite_object.active_surface)
+        dirty_rect, mask, size = brush.rasterize(points, size, self.property_value('spacing'),
+                                                 skip_first, self._corners)
 
-            if delta_x > 1 or delta_y > 1:
-                drawing.draw_line(mouse_state.last_sprite_pos, mouse_state.sprite_pos, size, ink,
-                                  color, painter)
-            elif delta_x == 1 or delta_y == 1 or just_pressed:
+        if mask is not None:
+            dirty_rect, mask, size = drawing.clip_mask(dirty_rect, mask, size, surface.width,
+                                                       surface.height)
 
-                ink.blit(mouse_state.sprite_pos.x(), mouse_state.sprite_pos.y(), size, size, color,
-                         painter)
+        if mask is None:
+            return
+
+        canvas.history.track(surface, dirty_rect)
 
-            self._canvas.surfaceChanging.emit()
+        # The whole stroke goes to the surface in a single composite
+        ink.blit_mask(surface.pixel_array, dirty_rect, mask, size, color)
 
-            painter.end()
+        surface.mark_dirty(dirty_rect)
+
+        self._canvas.surfaceChanging.emit(dirty_rect)
 
     def on_mouse_press(self):
 
@@ -342,6 +410,8 @@ class Pen(Tool):
 
         self._isDrawing = True
 
+        self._canvas.history.begin(self._name)
+
         self._blit(just_pressed=True)
 
     def on_mouse_move(self):
@@ -377,6 +447,15 @@ class Pen(Tool):
 
         self._lockHorizontal = self._lockVertical = False
 
+        # Ends a pixel perfect stroke, drawing the position held back
+        if self._corners is not None:
+            self._draw_stroke([], self._canvas.pixel_size, self._strokeInk, self._strokeColor)
+
+        self._corners = None
+        self._strokeInk = self._strokeColor = None
+
+        self._canvas.history.commit()
+
         self._canvas.surfaceChanged.emit()
 
 # =================================================================================================
@@ -393,6 +472,10 @@ class Filler(Tool):
 
         self._refreshWaitTime = 500
 
+        self.add_ranged_property('tolerance', 0, 255, 0, 'Color Tolerance')
+        self.add_property('contiguous', True, 'Fill Contiguous Area Only')
+        self.add_property('diagonals', False, 'Spread Diagonally')
+
     def draw_untransformed(self, painter):
 
         if not self._enablePointerDraw:
@@ -486,10 +569,31 @@ class Filler(Tool):
                 color = canvas.secondary_color
 
             if color is not None:
-                quickpixler.floodFill(image_data, mouse_pos.x(), mouse_pos.y(), image.width(),
-                                      image.height(),
-                                      color.red(), color.green(), color.blue())
 
+                # The region is found first, so history only copies the pixels under it
+                region = pixler.fill_region(image_data, mouse_pos.x(), mouse_pos.y(),
+                                            image.width(), image.height(), color.getRgb(),
+                                            tolerance=self.property_value('tolerance'),
+                                            diagonals=self.property_value('diagonals'),
+                                            contiguous=self.property_value('contiguous'))
+
+                if region is None:
+                    return
+
+                dirty_rect = QRect(*region.rect)
+
+                history = canvas.history
+
+                history.begin(self._name)
+                history.track(canvas.sprite_object.current_surface, dirty_rect)
+
+                region.paint()
+
+                history.commit()
+
+                canvas.sprite_object.current_surface.mark_dirty(dirty_rect)
+
+                self._canvas.surfaceChanging.emit(dirty_rect)
                 self._canvas.surfaceChanged.emit()
 
 
@@ -568,6 +672,11 @@ class Manipulator(Tool):
             painter.drawPixmap(x - self._cursor.width() / 2, y -
                                self._cursor.height() / 2, self._cursor)
 
+    def pointer_rect(self):
+
+        # Selections are drawn over the whole Canvas
+        return None
+
     def update(self):
         self._animate_selection_border()
 
@@ -593,6 +702,9 @@ class Manipulator(Tool):
 
                 self._state = ManipulatorState.MovingPixels
 
+                canvas.history.begin(self._name)
+                canvas.history.track(canvas.sprite_object.current_surface)
+
             else:
 
                 if self._selectionRectangle.contains(
@@ -642,9 +754,11 @@ class Manipulator(Tool):
                 if image_data is None:
                     return
 
-                quickpixler.movePixels(image_data, image.width(), image.height(), dx, dy)
+                pixler.movePixels(image_data, image.width(), image.height(), dx, dy)
+
+                canvas.sprite_object.current_surface.mark_dirty()
 
-                self._canvas.surfaceChanging.emit()
+                self._canvas.surfaceChanging.emit(image.rect())
 
         elif self._state == ManipulatorState.Selecting:
 
@@ -685,6 +799,7 @@ class Manipulator(Tool):
                     self._doEraseOnSelectionMove = True
 
         elif self._state == ManipulatorState.MovingPixels:
+            self._canvas.history.commit()
             self._canvas.surfaceChanged.emit()
 
         self._state = ManipulatorState.Idle
@@ -743,19 +858,29 @@ class Manipulator(Tool):
 
         sprite_rect = self._canvas.map_global_rect_to_sprite_local_rect(self._selectionRectangle)
 
-        self._selectionImage = self._canvas.sprite_object.active_surface.copy(sprite_rect)
+        self._selectionImage = self._canvas.sprite_object.current_surface.const_image.copy(
+            sprite_rect)
 
     def _erase_selection_below(self):
 
         sprite_rect_to_erase = self._canvas.map_global_rect_to_sprite_local_rect(
             self._selectionRectangle)
 
+        history = self._canvas.history
+
+        history.begin(self._name)
+        history.track(self._canvas.sprite_object.current_surface, sprite_rect_to_erase)
+
         drawing.erase_area(self._canvas.sprite_object.active_surface,
                            sprite_rect_to_erase.left(),
                            sprite_rect_to_erase.top(),
                            sprite_rect_to_erase.width(),
                            sprite_rect_to_erase.height())
 
+        history.commit()
+
+        self._canvas.sprite_object.current_surface.mark_dirty(sprite_rect_to_erase)
+
         self._canvas.surfaceChanged.emit()
 
     def _paste_selection(self):
@@ -765,6 +890,11 @@ class Manipulator(Tool):
 
         sprite_rect = self._canvas.map_global_rect_to_sprite_local_rect(self._selectionRectangle)
 
+        history = self._canvas.history
+
+        history.begin(self._name)
+        history.track(self._canvas.sprite_object.current_surface, sprite_rect)
+
         painter = QPainter()
         painter.begin(self._canvas.sprite_object.active_surface)
 
@@ -774,4 +904,8 @@ class Manipulator(Tool):
 
         painter.end()
 
+        history.commit()
+
+        self._canvas.sprite_object.current_surface.mark_dirty(sprite_rect)
+
         self._canvas.surfaceChanged.emit()
\ No newline at end of file
@@ -174,9 +174,17 @@ class FrameStrip(QWidget):
         if self._horizontalShift != 0:
             p.translate(-self._horizontalShift, 0)
 
+        # Only frames inside the exposed area are drawn, so their pixels don't get loaded
+        # until they are scrolled into view
+        total_frame_size = frame_size + two_padding
+
+        first_visible = max(0, (e.rect().left() + self._horizontalShift) // total_frame_size)
+        last_visible = (e.rect().right() + self._horizontalShift) // total_frame_size
+
         for frameIndex, frame in enumerate(frame_list):
 
-            surfaces = frame.surfaces
+            if frameIndex < first_visible or frameIndex > last_visible:
+                continue
 
             frame_rect = QRect(
                 frame_padding + frameIndex * frame_size + two_padding * frameIndex,
@@ -196,8 +204,9 @@ class FrameStrip(QWidget):
 
             p.drawTiledPixmap(frame_rect, self._checkerTile)
 
-            for surface in surfaces:
-                p.drawImage(frame_rect, surface.image, surface.image.rect())
+            frame_image = frame.flatten()
+
+            p.drawImage(frame_rect, frame_image, frame_image.rect())
 
             p.setPen(Qt.black)
             p.drawText(frame_rect.left() + two_padding,
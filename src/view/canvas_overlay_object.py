@@ -1,8 +1,14 @@
-from PyQt5.QtCore import Qt, QRectF
+import math
+
+from PyQt5.QtCore import Qt, QRectF, QLineF
 from PyQt5.QtGui import QPen, QPainter
 from PyQt5.QtWidgets import QGraphicsItem
 
 
+# Smallest on screen size of a grid cell, in pixels, for the grid to be drawn
+MIN_GRID_SPACING = 8
+
+
 class CanvasOverlayObject(QGraphicsItem):
     def __init__(self, canvas):
 
@@ -12,6 +18,9 @@ class CanvasOverlayObject(QGraphicsItem):
 
         self._canvas = canvas
 
+        # Makes option.exposedRect hold the area actually being repainted
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+
         self.update_bounding_rect()
 
     def boundingRect(self):
@@ -31,14 +40,46 @@ class CanvasOverlayObject(QGraphicsItem):
 
     def paint(self, painter, option, widget=None):
 
-        if self._canvas.grid_enabled and self._canvas.zoom >= 8.0:
+        if self._canvas.grid_enabled:
 
-            self._draw_grid(painter)
+            self._draw_grid(painter, option.exposedRect)
 
         if self._canvas.current_tool is not None:
             self._canvas.current_tool.draw_transformed(painter)
 
-    def _draw_grid(self, painter):
+    def _draw_grid(self, painter, exposed_rect):
+
+        grid_delta = self._canvas.pixel_size
+
+        # Grids whose cells would be too small to make out on screen are not drawn at all
+        if grid_delta <= 0 or grid_delta * self._canvas.zoom < MIN_GRID_SPACING:
+            return
+
+        sprite_rect = self.boundingRect()
+
+        rect = exposed_rect.intersected(sprite_rect)
+
+        if rect.isEmpty():
+            return
+
+        # Only the lines crossing the exposed rect, lined up with the sprite's pixels
+        left = sprite_rect.left()
+        top = sprite_rect.top()
+
+        first_column = int(math.ceil((rect.left() - left) / grid_delta))
+        last_column = int(math.floor((rect.right() - left) / grid_delta))
+
+        first_row = int(math.ceil((rect.top() - top) / grid_delta))
+        last_row = int(math.floor((rect.bottom() - top) / grid_delta))
+
+        lines = [QLineF(left + column * grid_delta, rect.top(),
+                        left + column * grid_delta, rect.bottom())
+                 for column in range(first_column, last_column + 1)]
+
+        lines.extend(QLineF(rect.left(), top + row * grid_delta,
+                            rect.right(), top + row * grid_delta)
+                     for row in range(first_row, last_row + 1))
+
         pen = QPen()
         pen.setWidth(0)
         pen.setColor(Qt.white)
@@ -47,16 +88,6 @@ class CanvasOverlayObject(QGraphicsItem):
 
         painter.setCompositionMode(QPainter.CompositionMode_Difference)
 
-        scene_rect = self._canvas.sceneRect()
-
-        grid_delta = self._canvas.pixel_size
-
-        for x in range(int(scene_rect.left()), int(scene_rect.right()), grid_delta):
-
-            painter.drawLine(x, scene_rect.top(), x, scene_rect.bottom())
-
-        for y in range(int(scene_rect.top()), int(scene_rect.bottom()), grid_delta):
-
-            painter.drawLine(scene_rect.left(), y, scene_rect.right(), y)
+        painter.drawLines(lines)
 
         painter.setOpacity(1.0)
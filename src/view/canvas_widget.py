@@ -9,8 +9,11 @@
 # Licence:     <your licence>
 # ------------------------------------------------------------------------------
 
-from PyQt5.QtCore import Qt, pyqtSignal, QPoint, QRect
-from PyQt5.QtGui import QColor, QPainter
+import math
+import time
+
+from PyQt5.QtCore import Qt, pyqtSignal, QPoint, QRect, QTimer
+from PyQt5.QtGui import QColor, QPainter, QGuiApplication
 from PyQt5.QtWidgets import QVBoxLayout
 
 from src.view.canvas_overlay_object import CanvasOverlayObject
@@ -19,6 +22,7 @@ from src.view.display_base_widget import Display
 from src.view.display_sprite_object import DisplaySpriteObject
 import src.helpers.utils as utils
 from src.model import tools
+from src.model.history import History
 
 
 # ------------------------------------------------------------------------------
@@ -31,6 +35,7 @@ class CanvasMouseState(object):
         self._canvasPos = QPoint()
         self._globalPos = QPoint()
         self._lastCanvasPos = QPoint()
+        self._spriteSamples = []
         self._pressedButton = None
         self._isCtrlPressed = False
         self._isAltPressed = False
@@ -52,6 +57,18 @@ class CanvasMouseState(object):
     def last_sprite_pos(self, value):
         self._lastSpritePos = value
 
+    @property
+    def sprite_samples(self):
+        """
+        (x, y) sprite positions the mouse went through since the tool last got a move,
+        oldest first. The last one is sprite_pos.
+        """
+        return self._spriteSamples
+
+    @sprite_samples.setter
+    def sprite_samples(self, value):
+        self._spriteSamples = value
+
     @property
     def canvas_pos(self):
         return self._canvasPos
@@ -85,9 +102,69 @@ class CanvasMouseState(object):
         self._pressedButton = value
 
 
+class CanvasStats(object):
+    """
+    Counters of the Canvas input pipeline, to see how much work mouse moves cause.
+    """
+
+    def __init__(self):
+
+        self._eventsReceived = 0
+        self._eventsCoalesced = 0
+        self._batchCount = 0
+        self._paintCount = 0
+        self._paintTime = 0.0
+
+    @property
+    def events_received(self):
+        return self._eventsReceived
+
+    @property
+    def events_coalesced(self):
+        return self._eventsCoalesced
+
+    @property
+    def batch_count(self):
+        return self._batchCount
+
+    @property
+    def paint_count(self):
+        return self._paintCount
+
+    @property
+    def paint_time(self):
+        return self._paintTime
+
+    def count_event(self, coalesced):
+
+        self._eventsReceived += 1
+
+        if coalesced:
+            self._eventsCoalesced += 1
+
+    def count_batch(self):
+
+        self._batchCount += 1
+
+    def count_paint(self, seconds):
+
+        self._paintCount += 1
+        self._paintTime += seconds
+
+    def reset(self):
+
+        self.__init__()
+
+    def __str__(self):
+
+        return '{0} events, {1} coalesced, {2} batches, {3} paints, {4:.2f} ms per paint'.format(
+            self._eventsReceived, self._eventsCoalesced, self._batchCount, self._paintCount,
+            self._paintTime * 1000.0 / max(self._paintCount, 1))
+
+
 class Canvas(Display):
     surfaceChanged = pyqtSignal()
-    surfaceChanging = pyqtSignal()
+    surfaceChanging = pyqtSignal(QRect)  # Changed area, in sprite pixels
     viewportChanged = pyqtSignal()
     colorPicked = pyqtSignal(QColor, int)  # Color, Button Pressed
 
@@ -127,6 +204,20 @@ class Canvas(Display):
 
         self._mouseState = CanvasMouseState()
 
+        self._lastPointerRect = QRect()
+
+        # Viewport positions of the mouse moves received since the last batch
+        self._pendingMoves = []
+
+        self._moveTimer = QTimer()
+        self._moveTimer.setSingleShot(True)
+        self._moveTimer.setTimerType(Qt.PreciseTimer)
+        self._moveTimer.timeout.connect(self._process_moves)
+
+        self._stats = CanvasStats()
+
+        self._history = History()
+
         self._load_tools()
 
         self._load_inks()
@@ -135,6 +226,8 @@ class Canvas(Display):
 
         self.setAcceptDrops(True)
 
+        self.surfaceChanging.connect(self.update_sprite_rect)
+
     @property
     def sprite_object(self):
         return self._spriteObject
@@ -218,6 +311,14 @@ class Canvas(Display):
     def mouse_state(self):
         return self._mouseState
 
+    @property
+    def history(self):
+        return self._history
+
+    @property
+    def stats(self):
+        return self._stats
+
     def find_tool_by_name(self, name):
 
         return self._tools[name]
@@ -239,8 +340,16 @@ class Canvas(Display):
 
         self._spriteObject.set_sprite(sprite)
 
+        self._history.clear()
+
         self.update_viewport()
 
+    def unload_sprite(self):
+
+        super(Canvas, self).unload_sprite()
+
+        self._history.clear()
+
     def clear(self):
 
         if self._spriteObject is None:
@@ -248,6 +357,9 @@ class Canvas(Display):
 
         surface = self._spriteObject.active_surface
 
+        self._history.begin('Clear')
+        self._history.track(self._spriteObject.current_surface)
+
         painter = QPainter()
 
         painter.begin(surface)
@@ -257,12 +369,34 @@ class Canvas(Display):
 
         painter.end()
 
+        self._history.commit()
+
+        self._spriteObject.current_surface.mark_dirty()
+
         self.update()
 
         self.surfaceChanged.emit()
 
         self.update()
 
+    def undo(self):
+
+        if not self.sprite_is_set() or self._currentTool.is_active:
+            return
+
+        if self._history.undo() is not None:
+            self.surfaceChanged.emit()
+            self.update()
+
+    def redo(self):
+
+        if not self.sprite_is_set() or self._currentTool.is_active:
+            return
+
+        if self._history.redo() is not None:
+            self.surfaceChanged.emit()
+            self.update()
+
     def draw_over_display(self, painter):
 
         painter.setCompositionMode(QPainter.CompositionMode_SourceOver)
@@ -325,6 +459,8 @@ class Canvas(Display):
 
     def mousePressEvent(self, e):
 
+        self._flush_moves()
+
         super(Canvas, self).mousePressEvent(e)
 
         if self.is_panning:
@@ -332,19 +468,10 @@ class Canvas(Display):
             self.update()
             return
 
-        self._mouseState.canvas_pos = self.mapToScene(e.pos())
-
-        self._mouseState.sprite_pos.setX(
-            self._mouseState.canvas_pos.x() - self._spriteObject.boundingRect().left())
-        self._mouseState.sprite_pos.setY(
-            self._mouseState.canvas_pos.y() - self._spriteObject.boundingRect().top())
+        self._set_mouse_position([(e.pos().x(), e.pos().y())])
 
         self._mouseState.pressed_button = e.button()
 
-        if self._pixelSize > 1 and self._snapEnabled:
-            self._mouseState.sprite_pos = utils.snap_point(self._mouseState.sprite_pos,
-                                                           self._pixelSize)
-
         self._mouseState.last_canvas_pos.setX(self._mouseState.canvas_pos.x())
         self._mouseState.last_canvas_pos.setY(self._mouseState.canvas_pos.y())
 
@@ -365,33 +492,19 @@ class Canvas(Display):
         if not self.sprite_is_set() or self.is_panning:
             return
 
-        if not self._currentTool.is_active:
-            self.update()
-            return
-
-        canvas_pos = self._mouseState.canvas_pos = self.mapToScene(e.pos())
-
-        self._mouseState.sprite_pos.setX(canvas_pos.x() - self._spriteObject.boundingRect().left())
-        self._mouseState.sprite_pos.setY(canvas_pos.y() - self._spriteObject.boundingRect().top())
+        # Moves are only queued here. They reach the tool in one batch per display refresh,
+        # so a flood of tablet or mouse events doesn't mean a flood of strokes and repaints
+        self._stats.count_event(coalesced=len(self._pendingMoves) > 0)
 
-        if self._pixelSize > 1 and self._snapEnabled:
-            self._mouseState.sprite_pos = utils.snap_point(self._mouseState.sprite_pos,
-                                                           self._pixelSize)
-            self._mouseState.canvas_pos = utils.snap_point(self._mouseState.canvas_pos,
-                                                           self._pixelSize)
+        self._pendingMoves.append((e.pos().x(), e.pos().y()))
 
-        self._currentTool.on_mouse_move()
-
-        self._mouseState.last_canvas_pos.setX(canvas_pos.x())
-        self._mouseState.last_canvas_pos.setY(canvas_pos.y())
-
-        self._mouseState.last_sprite_pos.setX(self._mouseState.sprite_pos.x())
-        self._mouseState.last_sprite_pos.setY(self._mouseState.sprite_pos.y())
-
-        self.update()
+        if not self._moveTimer.isActive():
+            self._moveTimer.start(self._refresh_interval())
 
     def mouseReleaseEvent(self, e):
 
+        self._flush_moves()
+
         was_panning = self.is_panning
 
         super(Canvas, self).mouseReleaseEvent(e)
@@ -471,6 +584,105 @@ class Canvas(Display):
 
     # -------------------------------------------------------------------------
 
+    def paintEvent(self, e):
+
+        start = time.perf_counter()
+
+        super(Canvas, self).paintEvent(e)
+
+        self._stats.count_paint(time.perf_counter() - start)
+
+    def _refresh_interval(self):
+
+        screen = QGuiApplication.primaryScreen()
+
+        refresh_rate = screen.refreshRate() if screen is not None else 0.0
+
+        return max(1, int(1000.0 / refresh_rate)) if refresh_rate > 0.0 else 16
+
+    def _flush_moves(self):
+
+        self._moveTimer.stop()
+        self._process_moves()
+
+    def _process_moves(self):
+
+        samples = self._pendingMoves
+
+        if len(samples) == 0:
+            return
+
+        self._pendingMoves = []
+
+        if not self.sprite_is_set() or self.is_panning:
+            return
+
+        if not self._currentTool.is_active:
+            self._update_pointer()
+            return
+
+        self._stats.count_batch()
+
+        self._set_mouse_position(samples)
+
+        mouse_state = self._mouseState
+
+        self._currentTool.on_mouse_move()
+
+        mouse_state.last_canvas_pos.setX(mouse_state.canvas_pos.x())
+        mouse_state.last_canvas_pos.setY(mouse_state.canvas_pos.y())
+
+        mouse_state.last_sprite_pos.setX(mouse_state.sprite_pos.x())
+        mouse_state.last_sprite_pos.setY(mouse_state.sprite_pos.y())
+
+        self._update_pointer()
+
+    def _set_mouse_position(self, samples):
+
+        # Sets the mouse state from viewport positions, the last one being where the mouse is.
+        # Plain ints are used while going through them, QPoints are only made for the last one
+        transform = self.viewportTransform().inverted()[0]
+
+        left = self._spriteObject.boundingRect().left()
+        top = self._spriteObject.boundingRect().top()
+
+        snap = self._pixelSize if self._pixelSize > 1 and self._snapEnabled else 1
+
+        sprite_samples = []
+
+        canvas_x = canvas_y = 0.0
+
+        for x, y in samples:
+
+            canvas_x, canvas_y = transform.map(x, y)
+
+            sprite_sample = (int(math.floor((canvas_x - left) / snap)) * snap,
+                             int(math.floor((canvas_y - top) / snap)) * snap)
+
+            if len(sprite_samples) == 0 or sprite_samples[-1] != sprite_sample:
+                sprite_samples.append(sprite_sample)
+
+        self._mouseState.canvas_pos = QPoint(int(math.floor(canvas_x / snap)) * snap,
+                                             int(math.floor(canvas_y / snap)) * snap)
+
+        self._mouseState.sprite_pos = QPoint(*sprite_samples[-1])
+        self._mouseState.sprite_samples = sprite_samples
+
+    def _update_pointer(self):
+
+        # Tools report the pixels they change through surfaceChanging, so while the mouse
+        # moves only the pointer's old and new places need repainting
+        pointer_rect = self._currentTool.pointer_rect()
+
+        if pointer_rect is None:
+            self.update()
+            return
+
+        self.viewport().update(self._lastPointerRect)
+        self.viewport().update(pointer_rect)
+
+        self._lastPointerRect = pointer_rect
+
     def _load_tools(self):
 
         # Default Tools
@@ -486,6 +698,10 @@ class Canvas(Display):
 
         self._inks['Solid'] = inks.Solid()
         self._inks['Eraser'] = inks.Eraser()
+        self._inks['Dither'] = inks.Dither()
+        self._inks['Lighten'] = inks.Lighten()
+        self._inks['Darken'] = inks.Darken()
+        self._inks['Replace Color'] = inks.ReplaceColor()
 
     def _init_canvas_state(self):
 
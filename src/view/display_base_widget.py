@@ -38,6 +38,12 @@ class Display(QGraphicsView):
 
         self._darkBackgroundPixmap = ResourcesCache.get("CheckerTileDark")
 
+        self._backgroundPixmap = None
+
+        # Checkerboard tile scaled to the current zoom, with the (zoom, pixmap) it was made for
+        self._backgroundTile = None
+        self._backgroundTileKey = None
+
         self._lastFocusPoint = QPoint()
 
         self._fitInView = False
@@ -86,9 +92,9 @@ class Display(QGraphicsView):
         self._backLightOn = value
 
         if self._backLightOn:
-            self._spriteObject.background_pixmap = self._lightBackgroundPixmap
+            self._backgroundPixmap = self._lightBackgroundPixmap
         else:
-            self._spriteObject.background_pixmap = self._darkBackgroundPixmap
+            self._backgroundPixmap = self._darkBackgroundPixmap
 
         self.update()
 
@@ -180,6 +186,14 @@ class Display(QGraphicsView):
 
         self.scene().update()
 
+    def update_sprite_rect(self, rect):
+        """
+        Repaints only the part of the view showing rect, given in sprite pixels.
+        """
+
+        if not self._spriteObject.is_empty:
+            self._spriteObject.update_sprite_rect(rect)
+
     def resizeEvent(self, e):
 
         w = self._spriteObject.sprite.width
@@ -316,6 +330,32 @@ class Display(QGraphicsView):
 
         self.zoom_by(scale)
 
+    def drawBackground(self, painter, rect):
+
+        super(Display, self).drawBackground(painter, rect)
+
+        if self._backgroundPixmap is None or self._spriteObject.is_empty:
+            return
+
+        # The checkerboard is drawn untransformed, from a tile scaled once per zoom level,
+        # instead of being scaled along with the sprite on every paint
+        transform = self.viewportTransform()
+
+        sprite_rect = transform.mapRect(self._spriteObject.sceneBoundingRect()).toRect()
+
+        target_rect = sprite_rect.intersected(transform.mapRect(rect).toAlignedRect())
+
+        if target_rect.isEmpty():
+            return
+
+        painter.save()
+        painter.resetTransform()
+
+        painter.drawTiledPixmap(target_rect, self._background_tile(),
+                                target_rect.topLeft() - sprite_rect.topLeft())
+
+        painter.restore()
+
     def paintEvent(self, e):
 
         super(Display, self).paintEvent(e)
@@ -329,6 +369,19 @@ class Display(QGraphicsView):
 
         self.draw_over_display(painter)
 
+    def _background_tile(self):
+
+        key = (self.zoom, self._backgroundPixmap.cacheKey())
+
+        if self._backgroundTileKey != key:
+
+            size = max(2, round(self._backgroundPixmap.width() * self.zoom))
+
+            self._backgroundTile = self._backgroundPixmap.scaled(size, size)
+            self._backgroundTileKey = key
+
+        return self._backgroundTile
+
     '''
     Draw over display with no transformation
     '''
@@ -11,7 +11,7 @@
 # Licence:     <your licence>
 #------------------------------------------------------------------------------
 
-from PyQt5.QtCore import QRectF, QRect
+from PyQt5.QtCore import QRectF, QRect, QPointF
 from PyQt5.QtWidgets import QGraphicsItem
 
 
@@ -28,10 +28,11 @@ class DisplaySpriteObject(QGraphicsItem):
 
         self._boundingRect = QRectF()
 
-        self._backgroundPixmap = None
-
         self._enableOnionSkin = True
 
+        # Makes option.exposedRect hold the area actually being repainted
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+
     @property
     def sprite(self):
         return self._sprite
@@ -40,6 +41,10 @@ class DisplaySpriteObject(QGraphicsItem):
     def active_surface(self):
         return self._sprite.active_surface
 
+    @property
+    def current_surface(self):
+        return self._sprite.current_surface
+
     @property
     def active_surface_pixel_data(self):
         return self._sprite.active_surface_pixel_data
@@ -52,18 +57,10 @@ class DisplaySpriteObject(QGraphicsItem):
     def display_frame_index(self, value):
         self._displayFrameIndex = value
 
-    @property
-    def background_pixmap(self):
-        return self._backgroundPixmap
-
     @property
     def is_empty(self):
         return self._sprite is None
 
-    @background_pixmap.setter
-    def background_pixmap(self, value):
-        self._backgroundPixmap = value
-
     def boundingRect(self):
         return self._boundingRect
 
@@ -107,6 +104,13 @@ class DisplaySpriteObject(QGraphicsItem):
             self._boundingRect = QRectF(-self._sprite.width / 2, -self._sprite.height / 2,
                                         self._sprite.width, self._sprite.height)
 
+    def update_sprite_rect(self, rect):
+        """
+        Schedules a repaint of rect, given in sprite pixels.
+        """
+
+        self.update(QRectF(rect).translated(self._boundingRect.topLeft()))
+
     def unload_sprite(self):
 
         self._sprite = None
@@ -118,8 +122,18 @@ class DisplaySpriteObject(QGraphicsItem):
 
         painter.setClipRect(option.exposedRect)
 
-        if self._backgroundPixmap is not None:
-            painter.drawTiledPixmap(option.rect, self._backgroundPixmap)
+        # Only the exposed sprite pixels are drawn, so repainting the few pixels under a
+        # stroke doesn't scale the whole frame again. Frames only composite their layers
+        # again over the area changed since they were last drawn
+        origin = self._boundingRect.topLeft()
+
+        source_rect = option.exposedRect.translated(-origin).intersected(
+            QRectF(QPointF(), self._boundingRect.size())).toAlignedRect()
+
+        if source_rect.isEmpty():
+            return
+
+        target_rect = QRectF(source_rect).translated(origin)
 
         if self._sprite is not None:
 
@@ -133,17 +147,13 @@ class DisplaySpriteObject(QGraphicsItem):
 
                 if last_frame_index >= 0:
 
-                    last_frame_layers = self._sprite.current_animation. \
-                        frame_at(last_frame_index).surfaces
-
                     painter.setOpacity(0.2)
 
-                    for layer in last_frame_layers:
-                        painter.drawImage(option.rect, layer.image)
+                    painter.drawImage(target_rect, self._sprite.current_animation.
+                                      frame_at(last_frame_index).flatten(), QRectF(source_rect))
 
                     painter.setOpacity(1.0)
 
-            layers = self._sprite.current_animation.frame_at(frame_index).surfaces
-
-            for layer in layers:
-                painter.drawImage(option.rect, layer.image)
+            painter.drawImage(target_rect,
+                              self._sprite.current_animation.frame_at(frame_index).flatten(),
+                              QRectF(source_rect))
@@ -22,7 +22,7 @@ class LayerListItem(ListItem):
     def __init__(self, parent, layer):
         super().__init__(parent, layer.name)
 
-        self._layerImage = layer.image
+        self._layerImage = layer.const_image
 
         self._layer = layer
 
@@ -31,7 +31,7 @@ class LayerListItem(ListItem):
 
         painter.drawText(20, self._top + 20, self._label)
 
-        icon = self._layer.image
+        icon = self._layer.const_image
 
         # Draw Icon
 
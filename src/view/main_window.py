@@ -11,7 +11,8 @@
 
 from PyQt5.QtCore import Qt, QEvent, pyqtSignal
 from PyQt5.QtGui import QPixmap, QPainter
-from PyQt5.QtWidgets import QMainWindow, QVBoxLayout, QDockWidget, QHBoxLayout
+from PyQt5.QtWidgets import QMainWindow, QVBoxLayout, QDockWidget, QHBoxLayout, QProgressBar, \
+    QPushButton
 from src.view.options_bar_widget import OptionsBar
 
 from src.view.pixel_size_widget import PixelSizeWidget
@@ -33,6 +34,7 @@ import src.model.appdata as app_data
 class MainWindow(QMainWindow, Ui_MainWindow):
 
     closed = pyqtSignal()
+    progressCancelled = pyqtSignal()
 
     def __init__(self):
 
@@ -72,6 +74,13 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self._newSpriteDialog = NewSpriteDialog()
         self._newSpriteDialog.setWindowFlags(Qt.WindowTitleHint | Qt.WindowCloseButtonHint)
 
+        self._progressBar = QProgressBar()
+        self._progressBar.setMaximumWidth(200)
+        self._progressBar.setVisible(False)
+
+        self._progressCancelButton = QPushButton('Cancel')
+        self._progressCancelButton.setVisible(False)
+
         # -----------------------------------------------------------------------------------------
 
         self._init_components()
@@ -124,6 +133,26 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.centralWidget().setVisible(False)
         self._workspaceVisible = False
 
+    def show_progress(self, label, done, total, cancellable=False):
+
+        self.statusBar().showMessage(label)
+
+        self._progressBar.setRange(0, total)
+        self._progressBar.setValue(done)
+        self._progressBar.setVisible(True)
+
+        self._progressCancelButton.setVisible(cancellable)
+
+    def hide_progress(self, message=None, timeout=3000):
+
+        self._progressBar.setVisible(False)
+        self._progressCancelButton.setVisible(False)
+
+        if message:
+            self.statusBar().showMessage(message, timeout)
+        else:
+            self.statusBar().clearMessage()
+
     def paintEvent(self, e):
 
         if not self._workspaceVisible:
@@ -182,6 +211,9 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
         self._init_toolbox()
 
+        self.statusBar().addPermanentWidget(self._progressBar)
+        self.statusBar().addPermanentWidget(self._progressCancelButton)
+
     def _init_layout(self):
 
         # -----------------------------------------------------------------------------------------
@@ -232,6 +264,8 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
     def _init_events(self):
 
+        self._progressCancelButton.clicked.connect(self.progressCancelled)
+
         self._pixelSizeWidget.pixelSizeChanged.connect(self._on_pixel_size_changed)
 
         self._colorPicker.primaryColorChanged.connect(self._on_primary_color_changed)
@@ -266,6 +300,9 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self._toolbar.register_ink(self._canvas.find_ink_by_name('Solid'), slot=0)
         self._toolbar.register_ink(self._canvas.find_ink_by_name('Eraser'), slot=1)
 
+        for ink_name in ('Dither', 'Lighten', 'Darken', 'Replace Color'):
+            self._toolbar.register_ink(self._canvas.find_ink_by_name(ink_name), slot=0)
+
     # =================== Event Handlers ==============================
 
     # ------- Pixel Size Widget ---------------------------------------
@@ -289,9 +326,9 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self._animationManager.update()
         self._layerManager.update()
 
-    def _on_canvas_surface_changing(self):
+    def _on_canvas_surface_changing(self, rect):
 
-        self._animationDisplay.update()
+        self._animationDisplay.update_sprite_rect(rect)
 
     def _on_canvas_viewport_changed(self):
 
@@ -0,0 +1,20 @@
+# --------------------------------------------------------------------------------------------------
+# Name:        Test configuration
+# Purpose:     Runs the tests against an offscreen Qt application. Run from the repository root:
+#
+#                  python -m pytest tests
+#--------------------------------------------------------------------------------------------------
+
+import os
+
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtGui import QGuiApplication
+
+
+@pytest.fixture(scope='session', autouse=True)
+def application():
+
+    return QGuiApplication.instance() or QGuiApplication([])
@@ -0,0 +1,179 @@
+# --------------------------------------------------------------------------------------------------
+# Name:        Drawing tests
+# Purpose:     Checks the vectorised stroke rasterizers against a Bresenham line of stamps drawn one
+#              at a time, and that pixel perfect strokes come out the same in batches
+#--------------------------------------------------------------------------------------------------
+
+import numpy as np
+import pytest
+
+import src.helpers.drawing as drawing
+
+
+def _bresenham(x1, y1, x2, y2, step):
+
+    dx = abs(x2 - x1)
+    dy = abs(y2 - y1)
+
+    sx = step if x1 < x2 else -step
+    sy = step if y1 < y2 else -step
+
+    error = dx - dy
+
+    positions = []
+
+    while True:
+
+        positions.append((x1, y1))
+
+        if x1 == x2 and y1 == y2:
+            return positions
+
+        double_error = error * 2
+
+        if double_error >= -dy:
+            error -= dy
+            x1 += sx
+
+        if double_error <= dx:
+            error += dx
+            y1 += sy
+
+
+def _reference_stroke(points, step):
+
+    positions = [tuple(points[0])]
+
+    for start, end in zip(points[:-1], points[1:]):
+        positions.extend(_bresenham(start[0], start[1], end[0], end[1], step)[1:])
+
+    return positions
+
+
+def _reference_corners(positions):
+
+    # Drops L corners one at a time while walking the line
+    kept = [positions[0]]
+
+    for index in range(1, len(positions) - 1):
+
+        before = kept[-1]
+        position = positions[index]
+        after = positions[index + 1]
+
+        corner = (abs(position[0] - before[0]) + abs(position[1] - before[1]) == 1 and
+                  abs(after[0] - position[0]) + abs(after[1] - position[1]) == 1 and
+                  abs(after[0] - before[0]) == 1 and abs(after[1] - before[1]) == 1)
+
+        if not corner:
+            kept.append(position)
+
+    if len(positions) > 1:
+        kept.append(positions[-1])
+
+    return kept
+
+
+def _stamps(rect, mask, size):
+
+    ys, xs = np.nonzero(mask)
+
+    return set(zip((rect.x() + xs * size).tolist(), (rect.y() + ys * size).tolist()))
+
+
+def _random_points(random, count, size):
+
+    return [tuple(int(v) for v in random.randint(-20, 20, 2) * size) for _ in range(count)]
+
+
+@pytest.mark.parametrize('size', [1, 3])
+def test_stroke_matches_bresenham(size):
+
+    random = np.random.RandomState(size)
+
+    for _ in range(500):
+
+        points = _random_points(random, random.randint(1, 5), size)
+
+        rect, mask = drawing.rasterize_stroke(points, size)
+
+        assert (rect.width(), rect.height()) == (mask.shape[1] * size, mask.shape[0] * size)
+        assert _stamps(rect, mask, size) == set(_reference_stroke(points, size))
+
+
+def test_stroke_skip_first():
+
+    rect, mask = drawing.rasterize_stroke([(0, 0), (5, 2)], 1, skip_first=True)
+
+    assert _stamps(rect, mask, 1) == set(_bresenham(0, 0, 5, 2, 1)[1:])
+
+    assert drawing.rasterize_stroke([(0, 0)], 1, skip_first=True) == (drawing.QRect(), None)
+
+
+def test_dabs_match_bresenham():
+
+    random = np.random.RandomState(7)
+
+    dab = np.array([[0, 1, 0],
+                    [1, 1, 1],
+                    [0, 1, 0]], np.bool_)
+
+    for _ in range(300):
+
+        points = _random_points(random, random.randint(1, 4), 1)
+
+        rect, mask = drawing.rasterize_dabs(points, dab, 1)
+
+        expected = set()
+
+        for x, y in _reference_stroke(points, 1):
+            expected.update((x + dx, y + dy) for dy, dx in zip(*np.nonzero(dab)))
+
+        assert _stamps(rect, mask, 1) == expected
+
+
+def test_corner_filter_matches_one_pass():
+
+    random = np.random.RandomState(11)
+
+    for _ in range(300):
+
+        points = _random_points(random, random.randint(2, 8), 1)
+
+        corners = drawing.CornerFilter()
+
+        whole = set()
+
+        for batch in (points, []):
+
+            rect, mask = drawing.rasterize_stroke(batch, 1, corners=corners)
+
+            if mask is not None:
+                whole |= _stamps(rect, mask, 1)
+
+        assert whole == set(_reference_corners(_reference_stroke(points, 1)))
+
+        # The same stroke split over the batches of mouse moves a Pen draws it in
+        corners = drawing.CornerFilter()
+
+        batched = set()
+
+        cuts = sorted(random.choice(range(1, len(points)), random.randint(0, len(points) - 1),
+                                    replace=False).tolist())
+
+        starts = [0] + cuts
+        ends = cuts + [len(points) - 1]
+
+        for index, (start, end) in enumerate(zip(starts, ends)):
+
+            rect, mask = drawing.rasterize_stroke(points[start:end + 1], 1, index > 0, corners)
+
+            if mask is not None:
+                batched |= _stamps(rect, mask, 1)
+
+        rect, mask = drawing.rasterize_stroke([], 1, corners=corners)
+
+        if mask is not None:
+            batched |= _stamps(rect, mask, 1)
+
+        assert batched == whole
@@ -0,0 +1,145 @@
+# --------------------------------------------------------------------------------------------------
+# Name:        History tests
+# Purpose:     Checks that undoing and redoing revisions brings surfaces back to every state they
+#              went through
+#--------------------------------------------------------------------------------------------------
+
+import numpy as np
+
+from src.model.history import History
+from src.model.sprite import Surface
+
+
+TILE_SIZE = 16
+
+
+def _edit(history, random, surfaces, track_whole=False):
+
+    # Writes a random rect of random pixels to one of surfaces as a revision
+    surface = surfaces[random.randint(len(surfaces))]
+
+    x, y = random.randint(-8, surface.width), random.randint(-8, surface.height)
+    w, h = random.randint(1, 40, 2)
+
+    history.begin('Edit')
+    history.track(surface, None if track_whole else (x, y, w, h))
+
+    left, top = max(x, 0), max(y, 0)
+
+    region = surface.pixel_array[top:max(y + h, 0), left:max(x + w, 0)]
+    region[:] = random.randint(0, 2 ** 32, region.shape, np.uint64).astype(np.uint32)
+
+    surface.mark_dirty((x, y, w, h))
+
+    return history.commit()
+
+
+def _state(surfaces):
+
+    return [surface.const_pixel_array.copy() for surface in surfaces]
+
+
+def _assert_state(surfaces, state):
+
+    for surface, pixels in zip(surfaces, state):
+        assert np.array_equal(surface.const_pixel_array, pixels)
+
+
+def test_undo_redo_round_trip():
+
+    random = np.random.RandomState(0)
+
+    # Sizes that are not a multiple of the tile size
+    surfaces = [Surface('a', 100, 70), Surface('b', 33, 47)]
+
+    history = History(tile_size=TILE_SIZE)
+
+    states = [_state(surfaces)]
+
+    for index in range(30):
+        if _edit(history, random, surfaces, track_whole=index % 3 == 0) is not None:
+            states.append(_state(surfaces))
+
+    for state in reversed(states[:-1]):
+        assert history.undo() is not None
+        _assert_state(surfaces, state)
+
+    assert not history.can_undo and history.undo() is None
+
+    for state in states[1:]:
+        assert history.redo() is not None
+        _assert_state(surfaces, state)
+
+    assert not history.can_redo and history.redo() is None
+
+
+def test_edit_after_undo_drops_redo():
+
+    random = np.random.RandomState(1)
+
+    surfaces = [Surface('a', 64, 64)]
+
+    history = History(tile_size=TILE_SIZE)
+
+    _edit(history, random, surfaces)
+    before = _state(surfaces)
+
+    _edit(history, random, surfaces)
+    history.undo()
+
+    _edit(history, random, surfaces)
+    after = _state(surfaces)
+
+    assert not history.can_redo
+
+    history.undo()
+    _assert_state(surfaces, before)
+
+    history.redo()
+    _assert_state(surfaces, after)
+
+
+def test_unchanged_pixels_record_nothing():
+
+    surface = Surface('a', 32, 32)
+
+    history = History(tile_size=TILE_SIZE)
+
+    history.begin('Nothing')
+    history.track(surface, (0, 0, 32, 32))
+
+    assert history.commit() is None
+    assert not history.can_undo
+    assert history.byte_size == 0
+
+
+def test_budget_evicts_oldest_revisions():
+
+    random = np.random.RandomState(2)
+
+    surfaces = [Surface('a', 128, 128)]
+
+    budget = 6 * TILE_SIZE * TILE_SIZE * 4
+
+    history = History(byte_budget=budget, tile_size=TILE_SIZE)
+
+    states = [_state(surfaces)]
+
+    for _ in range(40):
+        if _edit(history, random, surfaces) is not None:
+            states.append(_state(surfaces))
+
+    undone = 0
+
+    while history.undo() is not None:
+
+        undone += 1
+
+        _assert_state(surfaces, states[-1 - undone])
+
+    assert 0 < undone < len(states) - 1
+    assert history.byte_size <= budget or undone == 1
+
+    history.clear()
+
+    assert history.byte_size == 0 and not history.can_redo
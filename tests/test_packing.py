@@ -0,0 +1,107 @@
+# --------------------------------------------------------------------------------------------------
+# Name:        Packing tests
+# Purpose:     Checks that every packer keeps its rectangles inside the sheet, apart by the padding,
+#              and the size they were asked for
+#--------------------------------------------------------------------------------------------------
+
+import itertools
+
+import numpy as np
+import pytest
+
+import src.helpers.packing as packing
+
+
+OPTIONS = [dict(allow_rotation=False, padding=0, extrude=0, power_of_two=False),
+           dict(allow_rotation=True, padding=2, extrude=0, power_of_two=False),
+           dict(allow_rotation=True, padding=1, extrude=1, power_of_two=True)]
+
+
+def _random_sizes(random, count):
+
+    return [(int(w), int(h)) for w, h in random.randint(1, 40, (count, 2))]
+
+
+def _check_placements(packer, sizes, placements, padding, extrude, power_of_two):
+
+    assert len(placements) == len(sizes)
+
+    padded = []
+
+    for (width, height), placement in zip(sizes, placements):
+
+        if placement.rotated:
+            assert (placement.width, placement.height) == (height, width)
+        else:
+            assert (placement.width, placement.height) == (width, height)
+
+        left = placement.x - extrude
+        top = placement.y - extrude
+        right = placement.x + placement.width + extrude
+        bottom = placement.y + placement.height + extrude
+
+        assert left >= 0 and top >= 0
+        assert right <= packer.width and bottom <= packer.height
+
+        padded.append((left, top, right + padding, bottom + padding))
+
+    for a, b in itertools.combinations(padded, 2):
+        assert a[2] <= b[0] or b[2] <= a[0] or a[3] <= b[1] or b[3] <= a[1]
+
+    if power_of_two:
+        assert packer.width & (packer.width - 1) == 0
+        assert packer.height & (packer.height - 1) == 0
+
+
+@pytest.mark.parametrize('options', OPTIONS)
+@pytest.mark.parametrize('name', sorted(packing.PACKERS))
+def test_placements_in_bounds_without_overlap(name, options):
+
+    random = np.random.RandomState(3)
+
+    for _ in range(20):
+
+        sizes = _random_sizes(random, random.randint(1, 60))
+
+        packer = packing.create_packer(name, 1024, 1024, **options)
+
+        placements = packer.pack_all(sizes)
+
+        assert placements is not None
+
+        _check_placements(packer, sizes, placements, options['padding'], options['extrude'],
+                          options['power_of_two'])
+
+        assert packer.width <= 1024 and packer.height <= 1024
+        assert 0.0 < packer.occupancy <= 1.0
+
+
+@pytest.mark.parametrize('name', sorted(packing.PACKERS))
+def test_full_sheet(name):
+
+    # Sixteen 16x16 rectangles tile a 64x64 sheet exactly, and a seventeenth doesn't fit
+    packer = packing.create_packer(name, 64, 64)
+
+    placements = packer.pack_all([(16, 16)] * 16)
+
+    _check_placements(packer, [(16, 16)] * 16, placements, 0, 0, False)
+
+    assert packer.occupancy == 1.0
+    assert packer.pack(16, 16) is None
+
+
+@pytest.mark.parametrize('name', sorted(packing.PACKERS))
+def test_oversize(name):
+
+    packer = packing.create_packer(name, 64, 32, allow_rotation=True)
+
+    assert packer.pack(65, 10) is None
+    assert packer.pack(40, 40) is None
+
+    # Only fits turned on its side
+    placement = packer.pack(20, 60)
+
+    assert placement.rotated and (placement.width, placement.height) == (60, 20)
+
+    assert packing.create_packer(name, 64, 64, padding=1, extrude=1).pack_all(
+        [(8, 8), (63, 8)]) is None
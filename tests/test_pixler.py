@@ -0,0 +1,148 @@
+# --------------------------------------------------------------------------------------------------
+# Name:        Pixler tests
+# Purpose:     Checks fill against a breadth first search over the pixels it should reach
+#--------------------------------------------------------------------------------------------------
+
+from collections import deque
+
+import numpy as np
+import pytest
+
+import src.helpers.pixler as pixler
+
+
+COLOR = (10, 200, 30, 128)
+
+
+def _noise(random, width, height, colors=3):
+
+    palette = np.array([0xFF000000, 0xFF0000FF, 0x80400000, 0x00000000, 0xFF0101FF][:colors],
+                       np.uint32)
+
+    return palette[random.randint(0, colors, (height, width))]
+
+
+def _matches(pixels, target, tolerance):
+
+    channels = pixels.view(np.uint8).reshape(pixels.shape + (4,)).astype(np.int32)
+    reference = np.frombuffer(np.uint32(target).tobytes(), np.uint8).astype(np.int32)
+
+    return (np.abs(channels - reference) <= tolerance).all(axis=2)
+
+
+def _reference_fill(pixels, x, y, tolerance, diagonals, contiguous):
+
+    # Pixels a fill from (x, y) should reach, one at a time
+    matching = _matches(pixels, pixels[y, x], tolerance)
+
+    if not contiguous:
+        return matching
+
+    height, width = pixels.shape
+
+    steps = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+
+    if diagonals:
+        steps += [(1, 1), (1, -1), (-1, 1), (-1, -1)]
+
+    reached = np.zeros_like(matching)
+    reached[y, x] = True
+
+    queue = deque([(x, y)])
+
+    while queue:
+
+        px, py = queue.popleft()
+
+        for dx, dy in steps:
+
+            nx, ny = px + dx, py + dy
+
+            if 0 <= nx < width and 0 <= ny < height and matching[ny, nx] and \
+                    not reached[ny, nx]:
+                reached[ny, nx] = True
+                queue.append((nx, ny))
+
+    return reached
+
+
+def _fill(pixels, x, y, tolerance, diagonals, contiguous):
+
+    height, width = pixels.shape
+
+    return pixler.fill(pixels, x, y, width, height, COLOR, tolerance, diagonals, contiguous)
+
+
+@pytest.mark.parametrize('diagonals', [False, True])
+@pytest.mark.parametrize('contiguous', [True, False])
+@pytest.mark.parametrize('tolerance', [0, 1, 70])
+def test_fill_matches_reference(diagonals, contiguous, tolerance):
+
+    random = np.random.RandomState(tolerance)
+
+    for _ in range(40):
+
+        width, height = random.randint(1, 40, 2)
+
+        pixels = _noise(random, width, height, random.randint(1, 6))
+        original = pixels.copy()
+
+        x, y = random.randint(0, width), random.randint(0, height)
+
+        reached = _reference_fill(original, x, y, tolerance, diagonals, contiguous)
+
+        rect = _fill(pixels, x, y, tolerance, diagonals, contiguous)
+
+        expected = np.where(reached, pixler.premultiply(*COLOR), original)
+
+        assert np.array_equal(pixels, expected)
+
+        if rect is not None:
+
+            rows, columns = np.nonzero(reached)
+
+            assert rect == (columns.min(), rows.min(), columns.max() - columns.min() + 1,
+                            rows.max() - rows.min() + 1)
+
+
+def test_fill_past_grown_run_limit(monkeypatch):
+
+    # Regions with many runs are labelled all at once instead of grown run by run
+    monkeypatch.setattr(pixler.Spans, 'MAX_GROWN_RUNS', 0)
+
+    random = np.random.RandomState(1)
+
+    for diagonals in (False, True):
+
+        pixels = _noise(random, 64, 48, 2)
+        original = pixels.copy()
+
+        reached = _reference_fill(original, 5, 7, 0, diagonals, True)
+
+        _fill(pixels, 5, 7, 0, diagonals, True)
+
+        assert np.array_equal(pixels, np.where(reached, pixler.premultiply(*COLOR), original))
+
+
+def test_fill_with_seed_color_changes_nothing():
+
+    pixels = np.full((8, 8), pixler.premultiply(*COLOR), np.uint32)
+
+    assert _fill(pixels, 3, 3, 0, False, True) is None
+    assert _fill(pixels, 8, 3, 0, False, True) is None
+
+
+def test_fill_region_leaves_pixels_until_painted():
+
+    pixels = np.zeros((16, 16), np.uint32)
+    pixels[:, 8] = 0xFF000000
+
+    region = pixler.fill_region(pixels, 2, 2, 16, 16, COLOR)
+
+    assert region.rect == (0, 0, 8, 16)
+    assert not pixels[:, :8].any()
+
+    region.paint()
+
+    assert (pixels[:, :8] == pixler.premultiply(*COLOR)).all()
+    assert (pixels[:, 8:9] == 0xFF000000).all() and not pixels[:, 9:].any()
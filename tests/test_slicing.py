@@ -0,0 +1,188 @@
+# --------------------------------------------------------------------------------------------------
+# Name:        Slicing tests
+# Purpose:     Checks the run based region labelling against labelling the pixels one at a time,
+#              and the grid cells against walking the grid
+#--------------------------------------------------------------------------------------------------
+
+from collections import deque
+
+import numpy as np
+import pytest
+
+import src.helpers.slicing as slicing
+
+
+def _neighbours(diagonals):
+
+    if diagonals:
+        return [(dx, dy) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dx or dy]
+
+    return [(1, 0), (-1, 0), (0, 1), (0, -1)]
+
+
+def _reference_region(mask, x, y, diagonals):
+
+    height, width = mask.shape
+
+    region = {(x, y)}
+    queue = deque(region)
+
+    while queue:
+
+        x, y = queue.popleft()
+
+        for dx, dy in _neighbours(diagonals):
+
+            nx, ny = x + dx, y + dy
+
+            if 0 <= nx < width and 0 <= ny < height and mask[ny, nx] and (nx, ny) not in region:
+                region.add((nx, ny))
+                queue.append((nx, ny))
+
+    return region
+
+
+def _reference_regions(mask):
+
+    seen = set()
+    boxes = []
+
+    for y, x in zip(*np.nonzero(mask)):
+
+        if (x, y) in seen:
+            continue
+
+        region = _reference_region(mask, x, y, True)
+        seen |= region
+
+        xs = [p[0] for p in region]
+        ys = [p[1] for p in region]
+
+        boxes.append([min(xs), min(ys), max(xs) + 1, max(ys) + 1])
+
+    # Merges any two overlapping boxes until none overlap
+    merged = True
+
+    while merged:
+
+        merged = False
+
+        for a in range(len(boxes)):
+            for b in range(a + 1, len(boxes)):
+
+                first, second = boxes[a], boxes[b]
+
+                if (first[0] < second[2] and second[0] < first[2] and first[1] < second[3] and
+                        second[1] < first[3]):
+
+                    boxes[a] = [min(first[0], second[0]), min(first[1], second[1]),
+                                max(first[2], second[2]), max(first[3], second[3])]
+                    del boxes[b]
+
+                    merged = True
+                    break
+
+            if merged:
+                break
+
+    return slicing.reading_order([(int(left), int(top), int(right - left), int(bottom - top))
+                                  for left, top, right, bottom in boxes])
+
+
+def _random_mask(random, height, width, density):
+
+    return random.rand(height, width) < density
+
+
+@pytest.mark.parametrize('density', [0.02, 0.1, 0.3, 0.6])
+def test_regions_match_labelling(density):
+
+    random = np.random.RandomState(int(density * 100))
+
+    for _ in range(40):
+
+        mask = _random_mask(random, random.randint(1, 40), random.randint(1, 40), density)
+
+        assert slicing.find_regions(mask) == _reference_regions(mask)
+
+
+def test_no_regions():
+
+    assert slicing.find_regions(np.zeros((8, 8), bool)) == []
+
+
+@pytest.mark.parametrize('diagonals', [True, False])
+def test_connected_runs_match_labelling(diagonals):
+
+    random = np.random.RandomState(5)
+
+    for _ in range(100):
+
+        mask = _random_mask(random, random.randint(1, 30), random.randint(1, 30), 0.5)
+
+        y = random.randint(mask.shape[0])
+        x = random.randint(mask.shape[1])
+
+        runs = slicing.connected_runs(mask, x, y, diagonals)
+
+        if not mask[y, x]:
+            assert runs is None
+            continue
+
+        pixels = {(column, row) for row, start, end in zip(*runs) for column in range(start, end)}
+
+        assert pixels == _reference_region(mask, x, y, diagonals)
+
+
+def _reference_cells(width, height, cell_width, cell_height, margin, spacing):
+
+    cells = []
+
+    y = margin
+
+    while y + cell_height <= height - margin:
+
+        x = margin
+
+        while x + cell_width <= width - margin:
+            cells.append((x, y, cell_width, cell_height))
+            x += cell_width + spacing
+
+        y += cell_height + spacing
+
+    return cells
+
+
+def test_grid_cells():
+
+    random = np.random.RandomState(9)
+
+    for _ in range(300):
+
+        width, height = random.randint(1, 80, 2).tolist()
+        cell_width, cell_height = random.randint(1, 30, 2).tolist()
+        margin, spacing = random.randint(0, 4, 2).tolist()
+
+        assert (slicing.grid_cells(width, height, cell_width, cell_height, margin, spacing) ==
+                _reference_cells(width, height, cell_width, cell_height, margin, spacing))
+
+    with pytest.raises(ValueError):
+        slicing.grid_cells(16, 16, 0, 4)
+
+
+def test_occupied_cells():
+
+    random = np.random.RandomState(13)
+
+    for _ in range(300):
+
+        width, height = random.randint(1, 80, 2).tolist()
+        cell_width, cell_height = random.randint(1, 30, 2).tolist()
+        margin, spacing = random.randint(0, 4, 2).tolist()
+
+        mask = _random_mask(random, height, width, 0.01)
+
+        cells = slicing.grid_cells(width, height, cell_width, cell_height, margin, spacing)
+
+        assert slicing.occupied_cells(mask, cells) == [bool(mask[y:y + h, x:x + w].any())
+                                                       for x, y, w, h in cells]
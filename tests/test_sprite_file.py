@@ -0,0 +1,143 @@
+# --------------------------------------------------------------------------------------------------
+# Name:        SpriteFile tests
+# Purpose:     Checks that .spr containers and the sprites saved in them read back as written, after
+#              a full write and after incremental saves appended to the file
+#--------------------------------------------------------------------------------------------------
+
+import os
+
+import numpy as np
+import pytest
+
+import src.helpers.utils as utils
+import src.model.compositor as compositor
+import src.model.sprite_file as sprite_file
+from src.model.sprite import Sprite
+from src.model.sprite_file import Chunk, SpriteFile, SpriteFileError
+
+
+CODECS = [sprite_file.CODEC_RAW, sprite_file.CODEC_ZLIB,
+          pytest.param(sprite_file.CODEC_LZ4,
+                       marks=pytest.mark.skipif(sprite_file.lz4 is None,
+                                                reason='lz4 is not installed'))]
+
+
+def _pixels(random, size):
+
+    return random.randint(0, 4, size).astype(np.uint8).tobytes()
+
+
+@pytest.mark.parametrize('codec', CODECS)
+def test_write_and_reload(tmp_path, codec):
+
+    random = np.random.RandomState(0)
+
+    path = str(tmp_path / 'sprite.spr')
+
+    data = [_pixels(random, size) for size in (0, 1, 4096, 70000)]
+    index = {'width': 8, 'animations': [{'name': 'Walk', 'frames': [0, 1, 2, 3]}]}
+
+    written = SpriteFile.write(path, dict(index), [Chunk.from_pixels(d, codec) for d in data])
+
+    assert written.path == path
+
+    reloaded = SpriteFile.open(path)
+
+    assert reloaded.index == index
+    assert [reloaded.read_chunk(chunk) for chunk in reloaded.chunks] == data
+
+
+def test_incremental_save_appends(tmp_path):
+
+    random = np.random.RandomState(1)
+
+    path = str(tmp_path / 'sprite.spr')
+
+    dropped, kept, added = _pixels(random, 64), _pixels(random, 8192), _pixels(random, 4096)
+
+    base = SpriteFile.write(path, {'version': 1},
+                            [Chunk.from_pixels(dropped), Chunk.from_pixels(kept)])
+
+    base_size = os.path.getsize(path)
+    kept_offset = base.chunks[1].offset
+
+    SpriteFile.write(path, {'version': 2}, [base.chunks[1], Chunk.from_pixels(added)], base)
+
+    reloaded = SpriteFile.open(path)
+
+    # The kept chunk stays where it was, a rewrite would have moved it to the front
+    assert reloaded.chunks[0].offset == kept_offset
+    assert os.path.getsize(path) > base_size
+
+    assert reloaded.index == {'version': 2}
+    assert [reloaded.read_chunk(chunk) for chunk in reloaded.chunks] == [kept, added]
+
+
+def test_not_a_sprite_file(tmp_path):
+
+    path = str(tmp_path / 'image.png')
+
+    with open(path, 'wb') as file:
+        file.write(b'\x89PNG\r\n\x1a\n' + bytes(64))
+
+    assert not sprite_file.is_sprite_file(path)
+
+    with pytest.raises(SpriteFileError):
+        SpriteFile.open(path)
+
+
+def _surfaces(sprite):
+
+    return [surface for animation in sprite.animations for frame in animation.frames
+            for surface in frame.surfaces]
+
+
+def _assert_same_sprite(sprite, reloaded):
+
+    assert (reloaded.width, reloaded.height) == (sprite.width, sprite.height)
+    assert [a.name for a in reloaded.animations] == [a.name for a in sprite.animations]
+
+    for surface, reloaded_surface in zip(_surfaces(sprite), _surfaces(reloaded)):
+
+        assert reloaded_surface.name == surface.name
+        assert reloaded_surface.opacity == surface.opacity
+        assert reloaded_surface.blend_mode == surface.blend_mode
+        assert np.array_equal(reloaded_surface.const_pixel_array, surface.const_pixel_array)
+
+
+def test_sprite_save_append_and_reload(tmp_path):
+
+    random = np.random.RandomState(2)
+
+    path = str(tmp_path / 'sprite.spr')
+
+    sprite = Sprite.create(48, 32)
+
+    animation = sprite.current_animation
+    animation.add_empty_frame()
+    animation.frame_at(1).add_surface(utils.create_image(48, 32))
+
+    for surface in _surfaces(sprite):
+        surface.pixel_array[:] = random.randint(0, 2 ** 32, (32, 48), np.uint64)
+        surface.mark_dirty()
+
+    last = _surfaces(sprite)[-1]
+    last.opacity = 0.5
+    last.blend_mode = compositor.BLEND_SCREEN
+
+    Sprite.save(sprite, path)
+
+    _assert_same_sprite(sprite, Sprite.load_from_file(path))
+
+    saved_size = os.path.getsize(path)
+
+    # Only the edited surface is encoded again and appended
+    edited = _surfaces(sprite)[0]
+    edited.pixel_array[4:8, 4:8] = 0xFF00FF00
+    edited.mark_dirty((4, 4, 4, 4))
+
+    Sprite.save(sprite, path)
+
+    assert saved_size < os.path.getsize(path) < 2 * saved_size
+
+    _assert_same_sprite(sprite, Sprite.load_from_file(path))